@@ -1,172 +1,130 @@
 import streamlit as st
-import numpy as np
-import random
-from collections import deque, defaultdict
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
+import time
 import os
 
+# plotly e pandas só são importados quando há resultados para mostrar
+from src.models import find_model
+from src.runs import RunManager, model_fingerprint
+from src.utils import DEFAULT_PARAMS
+
 # Configuração da página
 st.set_page_config(page_title="Simulação de Tráfego", layout="wide")
 
-# Classes da simulação
-class Vehicle:
-    def __init__(self, id, is_bus=False):
-        self.id = id
-        self.is_bus = is_bus
-        self.pos = -random.uniform(5, 25)
-        self.wait_time = 0.0
-
-class Lane:
-    def __init__(self, name):
-        self.name = name
-        self.vehicles = deque()
-        self.passed = 0
-
-    def add_vehicles(self, n, start_id, bus_prob=0.0):
-        for i in range(n):
-            is_bus = random.random() < bus_prob
-            v = Vehicle(start_id + i, is_bus=is_bus)
-            self.vehicles.append(v)
-        return n
-
-    def queue_length(self):
-        return len(self.vehicles)
-
-    def step_logic(self, is_green, dt, discharge_rate):
-        passed_now = 0
-        waited_sum = 0.0
-        
-        if is_green:
-            expected = discharge_rate * dt
-            base = int(np.floor(expected))
-            extra = 1 if random.random() < (expected - base) else 0
-            capacity = base + extra
-
-            for _ in range(capacity):
-                if not self.vehicles:
-                    break
-                if self.vehicles[0].pos > -2: 
-                    v = self.vehicles.popleft()
-                    waited_sum += v.wait_time
-                    self.passed += 1
-                    passed_now += 1
-        
-        for i, veh in enumerate(self.vehicles):
-            dist_to_next = 100
-            if i > 0:
-                dist_to_next = self.vehicles[i-1].pos - veh.pos - 2
-
-            if is_green:
-                move = min(1.5 * dt, 5.0)
-            else:
-                target = 0 if i == 0 else (self.vehicles[i-1].pos - 2)
-                dist = target - veh.pos
-                move = max(0, min(dist, 1.5 * dt))
-            
-            if i > 0 and move > dist_to_next:
-                move = max(0, dist_to_next)
-                
-            veh.pos += move
-            
-            if move < 0.1:
-                veh.wait_time += dt
-
-        return passed_now, waited_sum
-
-# Funções auxiliares
-def ruido_sensor(valor_real, erro_max=0.15):
-    if valor_real <= 0:
-        return 0
-    fator = 1 + random.uniform(-erro_max, erro_max)
-    return max(0, int(valor_real * fator))
+# Pool de processos e cache de resultados compartilhados por todas as sessões
+@st.cache_resource
+def obter_runner():
+    return RunManager(workers=2)
 
-def gerar_fluxo_carros(taxa_media_minuto, tempo_decorrido_sec):
-    lambda_poisson = (taxa_media_minuto / 60) * tempo_decorrido_sec
-    return np.random.poisson(lambda_poisson)
+# Pool da comparação em várias sementes (um processo por núcleo), compartilhado pelas sessões
+@st.cache_resource
+def obter_pool_mc():
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=mp.get_context("spawn"))
 
-def detectar_prioridade(probabilidade):
-    return random.random() < probabilidade
+# Impressão digital do modelo; o mtime na chave refaz o hash se o arquivo mudar
+@st.cache_data(show_spinner=False)
+def impressao_modelo(path, mtime_ns):
+    return model_fingerprint(path)
 
-def detectar_pedestre(probabilidade):
-    return random.random() < probabilidade
-
-# Importa apenas Atuado e Q-Learning
-from src.controllers import ActuatedController, QLearningController
-
-# Função de simulação
-def run_simulation(controller_cls, params, run_seed):
-    random.seed(run_seed)
-    np.random.seed(run_seed)
-
-    laneA = Lane("A")
-    laneB = Lane("B")
-    controller = controller_cls(laneA, laneB, params)
-
-    t = 0
-    vehicle_id = 0
-    snapshots = []
-    total_passed = 0
-    total_wait_passed = 0.0
-    max_wait_seen = 0.0
-    priority_events = 0
-
-    while t < params['duracao_sec']:
-        chegA = gerar_fluxo_carros(params['media_a'], params['dt'])
-        chegB = gerar_fluxo_carros(params['media_b'], params['dt'])
-        laneA.add_vehicles(chegA, vehicle_id, bus_prob=params['prob_prioridade'])
-        vehicle_id += chegA
-        laneB.add_vehicles(chegB, vehicle_id, bus_prob=params['prob_prioridade'])
-        vehicle_id += chegB
-
-        ped_A = detectar_pedestre(params['prob_pedestre'] * params['dt'])
-        ped_B = detectar_pedestre(params['prob_pedestre'] * params['dt'])
-        v2i_A = detectar_prioridade(params['prob_prioridade'] * params['dt'])
-        v2i_B = detectar_prioridade(params['prob_prioridade'] * params['dt'])
-        if v2i_A or v2i_B:
-            priority_events += 1
-
-        # chamada compatível com todos os controladores
-        current_phase = controller.step(
-            params['dt'],
-            ped_A=ped_A,
-            ped_B=ped_B,
-            v2i_A=v2i_A,
-            v2i_B=v2i_B,
-            training=False,  # ignorado por Actuated/FixedTime
-        )
+# Recebe `Snapshots` (colunas NumPy), que o plotly usa sem conversão
+def grafico_filas(snaps_act, snaps_qlearn):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
 
-        green_A = current_phase == "A"
-        green_B = current_phase == "B"
-
-        pA, wA = laneA.step_logic(green_A, params['dt'], params['taxa_escoamento'])
-        pB, wB = laneB.step_logic(green_B, params['dt'], params['taxa_escoamento'])
-
-        total_passed += pA + pB
-        total_wait_passed += wA + wB
-        
-        wait_times = [v.wait_time for v in laneA.vehicles] + [v.wait_time for v in laneB.vehicles]
-        if wait_times:
-            max_wait_seen = max(max_wait_seen, max(wait_times))
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=("Controlador Atuado", "Q-Learning"),
+        shared_xaxes=True
+    )
+    
+    # Atuado
+    times_act = snaps_act.t
+    qA_act = snaps_act.qA
+    qB_act = snaps_act.qB
+    fig.add_trace(
+        go.Scatter(
+            x=times_act,
+            y=qA_act,
+            name="Via A (atuado)",
+            line=dict(color="#1f77b4")
+        ),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=times_act,
+            y=qB_act,
+            name="Via B (atuado)",
+            line=dict(color="#ff7f0e")
+        ),
+        row=1, col=1
+    )
+    
+    # Q-Learning
+    times_qlearn = snaps_qlearn.t
+    qA_qlearn = snaps_qlearn.qA
+    qB_qlearn = snaps_qlearn.qB
+    fig.add_trace(
+        go.Scatter(
+            x=times_qlearn,
+            y=qA_qlearn,
+            name="Via A (Q-Learning)",
+            line=dict(color="#2ca02c", dash="dot")  # verde
+        ),
+        row=2, col=1
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=times_qlearn,
+            y=qB_qlearn,
+            name="Via B (Q-Learning)",
+            line=dict(color="#9467bd", dash="dot")  # roxo
+        ),
+        row=2, col=1
+    )
+    
+    fig.update_xaxes(title_text="Tempo (s)", row=2, col=1)
+    fig.update_yaxes(title_text="Fila (veículos)", row=1, col=1)
+    fig.update_yaxes(title_text="Fila (veículos)", row=2, col=1)
+    fig.update_layout(height=700, showlegend=True)
+    return fig
 
-        if t % params['sample_rate'] == 0:
-            snapshots.append({
-                "t": t,
-                "qA": laneA.queue_length(),
-                "qB": laneB.queue_length(),
-                "phase": current_phase,
-            })
-        t += params['dt']
+# Média ± meia largura do IC de cada controlador e das diferenças pareadas
+def tabela_mc(resumo):
+    import pandas as pd
 
-    return {
-        "total_passed": total_passed,
-        "avg_wait": total_wait_passed / max(1, total_passed),
-        "max_wait": max_wait_seen,
-        "priority_events": priority_events,
-        "snapshots": snapshots,
-        "green_log": controller.green_times_log,
+    colunas = {
+        'total_passed': 'Veículos Atendidos',
+        'avg_wait': 'Espera Média (s)',
+        'max_wait': 'Espera Máxima (s)',
     }
+    nomes = {'actuated': 'Atuado', 'qlearning': 'Q-Learning', 'qlearning - actuated': 'Q-Learning − Atuado'}
+    grupos = list(resumo['controllers'].items()) + list(resumo['differences'].items())
+    linhas = []
+    for nome, metricas in grupos:
+        linha = {'Método': nomes.get(nome, nome)}
+        for m, titulo in colunas.items():
+            c = metricas[m]
+            linha[titulo] = f"{c['mean']:.1f} ± {c['half_width']:.1f}"
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+# Intervalo da diferença de espera média a cada semente incorporada
+def grafico_ic(historico):
+    import plotly.graph_objects as go
+
+    n = [h['n'] for h in historico]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=n, y=[h['ci_high'] for h in historico], line=dict(width=0),
+                             showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=n, y=[h['ci_low'] for h in historico], line=dict(width=0),
+                             fill="tonexty", fillcolor="rgba(31,119,180,0.25)", name="IC"))
+    fig.add_trace(go.Scatter(x=n, y=[h['mean'] for h in historico], name="Média",
+                             line=dict(color="#1f77b4")))
+    fig.add_hline(y=0, line_dash="dot", line_color="gray")
+    fig.update_layout(height=350, xaxis_title="Sementes", yaxis_title="Q-Learning − Atuado: espera média (s)")
+    return fig
 
 # Interface Streamlit
 
@@ -183,6 +141,14 @@ prob_pedestre = st.sidebar.slider("Prob. Pedestre", 0.0, 1.0, 0.3)
 prob_prioridade = st.sidebar.slider("Prob. Veículo Prioritário", 0.0, 0.2, 0.05)
 seed = st.sidebar.number_input("Semente (seed)", 0, 10000, 42)
 
+# Comparação em várias sementes: média ± IC e diferenças pareadas
+monte_carlo = st.sidebar.checkbox("Comparar em várias sementes (Monte Carlo)")
+if monte_carlo:
+    n_seeds = st.sidebar.slider("Sementes (máximo)", 5, 200, 30)
+    alvo_ic = st.sidebar.number_input(
+        "Parar quando o IC 95% da diferença de espera média for ± (s)", 0.0, 10.0, 0.5, step=0.1,
+        help="0 roda todas as sementes")
+
 # Parâmetros avançados
 with st.sidebar.expander("Parâmetros Avançados"):
     g_min = st.slider("Verde Mínimo (s)", 10, 60, 16)
@@ -191,45 +157,21 @@ with st.sidebar.expander("Parâmetros Avançados"):
     taxa_escoamento = st.slider("Taxa Escoamento (veíc/s)", 0.3, 1.5, 0.6)
 
 params = {
+    **DEFAULT_PARAMS,
     'duracao_sec': duracao_min * 60,
     'media_a': media_a,
     'media_b': media_b,
     'prob_pedestre': prob_pedestre,
     'prob_prioridade': prob_prioridade,
-    'dt': 1,
-    'sample_rate': 1,
     'g_min': g_min,
     'g_max': g_max,
     'ciclo': ciclo,
-    'yellow_time': 3,
     'taxa_escoamento': taxa_escoamento,
 }
 
-# Caminho do modelo Q-Learning pré-treinado (commitado no repo)
-# raiz do projeto = diretório pai de app.py
-PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(PROJECT_ROOT, "models")
-
-# Nome do modelo *padrão* que você quer usar
-DEFAULT_MODEL_NAME = "qlearning_agent_20251202_103052_10k.pkl"
-default_model_path = os.path.join(MODELS_DIR, DEFAULT_MODEL_NAME)
-
-pretrained_path = None
-
-# Tenta usar o modelo padrão fixo
-if os.path.exists(default_model_path):
-    pretrained_path = default_model_path
-else:
-    # Se o padrão não existir, tenta achar o último modelo qlearning_agent_*.pkl
-    if os.path.isdir(MODELS_DIR):
-        candidate_files = [
-            f for f in os.listdir(MODELS_DIR)
-            if f.startswith("qlearning_agent_") and f.endswith(".pkl")
-        ]
-        if candidate_files:
-            candidate_files.sort()  # assumindo timestamp no nome, o último é o mais recente
-            latest_model = candidate_files[-1]
-            pretrained_path = os.path.join(MODELS_DIR, latest_model)
+# Modelo Q-Learning pré-treinado (commitado em `models/`): o padrão da
+# entrega ou, na falta dele, o `qlearning_agent_*` mais recente
+pretrained_path = find_model()
 
 # Monta params_q dependendo do que foi encontrado
 if pretrained_path and os.path.exists(pretrained_path):
@@ -243,18 +185,98 @@ else:
     )
 
 # Botão para rodar simulação
-if st.sidebar.button("▶️ Rodar Simulação", type="primary"):
-    with st.spinner("Simulando..."):
-        metrics_act = run_simulation(ActuatedController, params, seed)
-        metrics_qlearn = run_simulation(QLearningController, params_q, seed)
-        
-        st.session_state['metrics_act'] = metrics_act
-        st.session_state['metrics_qlearn'] = metrics_qlearn
-        st.session_state['simulated'] = True
+rodar = st.sidebar.button("▶️ Rodar Simulação", type="primary")
+if rodar and monte_carlo:
+    from src.controllers import ActuatedController, QLearningController
+    from src.montecarlo import MonteCarlo
+
+    anterior = st.session_state.get('mc')
+    if anterior:
+        anterior.cancel()
+    # a semente da barra lateral é a base das replicações; cada semente roda os dois controladores
+    st.session_state['mc'] = MonteCarlo(
+        {'actuated': (ActuatedController, params), 'qlearning': (QLearningController, params_q)},
+        seeds=n_seeds, base_seed=seed, ci_target=alvo_ic or None,
+        executor=obter_pool_mc(), workers=os.cpu_count(),
+    ).start()
+    st.session_state.pop('runs', None)
+    st.session_state['simulated'] = False
+elif rodar:
+    runner = obter_runner()
+    fingerprint = None
+    if params_q.get("pretrained_path"):
+        path = params_q["pretrained_path"]
+        fingerprint = impressao_modelo(path, os.stat(path).st_mtime_ns)
+    # as duas execuções rodam em paralelo; consultas repetidas vêm do cache
+    st.session_state['runs'] = (
+        runner.submit('actuated', params, seed),
+        runner.submit('qlearning', params_q, seed, fingerprint),
+    )
+    st.session_state['simulated'] = False
+    anterior = st.session_state.pop('mc', None)
+    if anterior:
+        anterior.cancel()
+
+runs = st.session_state.get('runs')
+if runs and not st.session_state.get('simulated'):
+    run_act, run_qlearn = runs
+    if not (run_act.done() and run_qlearn.done()):
+        # desenha as filas à medida que os snapshots chegam
+        progresso = st.progress(0.0, text="Simulando...")
+        parcial = st.empty()
+        total = params['duracao_sec'] / params['sample_rate']
+        quadro = 0
+        while not (run_act.done() and run_qlearn.done()):
+            feitos = min(len(run_act.parcial), len(run_qlearn.parcial))
+            progresso.progress(min(1.0, feitos / total), text="Simulando...")
+            parcial.plotly_chart(grafico_filas(run_act.parcial, run_qlearn.parcial),
+                                 use_container_width=True, key=f"filas_parcial_{quadro}")
+            quadro += 1
+            time.sleep(0.5)
+        progresso.empty()
+        parcial.empty()
+    st.session_state['metrics_act'] = run_act.result()
+    st.session_state['metrics_qlearn'] = run_qlearn.result()
+    st.session_state['simulated'] = True
     st.success("✅ Simulação concluída!")
 
+mc = st.session_state.get('mc')
+if mc:
+    st.subheader("🎲 Comparação em Várias Sementes")
+    if not mc.done:
+        # a tabela e o intervalo são atualizados a cada semente concluída
+        progresso = st.progress(0.0, text="Simulando sementes...")
+        tabela = st.empty()
+        grafico = st.empty()
+        quadro = 0
+        visto = -1
+        while not mc.poll(timeout=0.5):
+            if mc.n == visto:
+                continue
+            visto = mc.n
+            progresso.progress(mc.n / mc.seeds, text=f"{mc.n}/{mc.seeds} sementes")
+            if mc.n:
+                tabela.dataframe(tabela_mc(mc.summary()), use_container_width=True)
+                grafico.plotly_chart(grafico_ic(mc.history), use_container_width=True, key=f"ic_parcial_{quadro}")
+                quadro += 1
+        progresso.empty()
+        tabela.empty()
+        grafico.empty()
+    resumo = mc.summary()
+    if resumo['stopped_early']:
+        st.success(f"✅ Intervalo abaixo do alvo com {resumo['n']} de {resumo['seeds']} sementes")
+    else:
+        st.success(f"✅ {resumo['n']} sementes concluídas")
+    st.caption("Média ± meia largura do intervalo de confiança de 95%. As diferenças são pareadas: "
+               "em cada semente os dois controladores veem as mesmas chegadas.")
+    st.dataframe(tabela_mc(resumo), use_container_width=True)
+    st.plotly_chart(grafico_ic(mc.history), use_container_width=True)
+
 # Mostrar resultados
 if st.session_state.get('simulated'):
+    import plotly.graph_objects as go
+    import pandas as pd
+
     metrics_act = st.session_state['metrics_act']
     metrics_qlearn = st.session_state['metrics_qlearn']
     
@@ -278,62 +300,7 @@ if st.session_state.get('simulated'):
     # Gráfico de filas
     st.subheader("📈 Evolução das Filas ao Longo do Tempo")
     
-    fig = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=("Controlador Atuado", "Q-Learning"),
-        shared_xaxes=True
-    )
-    
-    # Atuado
-    times_act = [s['t'] for s in metrics_act['snapshots']]
-    qA_act = [s['qA'] for s in metrics_act['snapshots']]
-    qB_act = [s['qB'] for s in metrics_act['snapshots']]
-    fig.add_trace(
-        go.Scatter(
-            x=times_act,
-            y=qA_act,
-            name="Via A (atuado)",
-            line=dict(color="#1f77b4")
-        ),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=times_act,
-            y=qB_act,
-            name="Via B (atuado)",
-            line=dict(color="#ff7f0e")
-        ),
-        row=1, col=1
-    )
-    
-    # Q-Learning
-    times_qlearn = [s['t'] for s in metrics_qlearn['snapshots']]
-    qA_qlearn = [s['qA'] for s in metrics_qlearn['snapshots']]
-    qB_qlearn = [s['qB'] for s in metrics_qlearn['snapshots']]
-    fig.add_trace(
-        go.Scatter(
-            x=times_qlearn,
-            y=qA_qlearn,
-            name="Via A (Q-Learning)",
-            line=dict(color="#2ca02c", dash="dot")  # verde
-        ),
-        row=2, col=1
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=times_qlearn,
-            y=qB_qlearn,
-            name="Via B (Q-Learning)",
-            line=dict(color="#9467bd", dash="dot")  # roxo
-        ),
-        row=2, col=1
-    )
-    
-    fig.update_xaxes(title_text="Tempo (s)", row=2, col=1)
-    fig.update_yaxes(title_text="Fila (veículos)", row=1, col=1)
-    fig.update_yaxes(title_text="Fila (veículos)", row=2, col=1)
-    fig.update_layout(height=700, showlegend=True)
+    fig = grafico_filas(metrics_act['snapshots'], metrics_qlearn['snapshots'])
     st.plotly_chart(fig, use_container_width=True)
     
     # Histograma de tempos de verde
@@ -415,12 +382,16 @@ if st.session_state.get('simulated'):
         'Espera Máxima (s)': [
             round(metrics_act['max_wait'], 1),
             round(metrics_qlearn['max_wait'], 1)
+        ],
+        'Espera P95 (s)': [
+            round(metrics_act['p95_wait'], 1),
+            round(metrics_qlearn['p95_wait'], 1)
         ]
     })
 
     st.dataframe(comparison_df, use_container_width=True)
 
-else:
+elif not mc:
     st.info("👈 Configure os parâmetros na barra lateral e clique em 'Rodar Simulação'")
     st.markdown("### Como funciona?")
     st.markdown("""
@@ -0,0 +1,3 @@
+"""
+Benchmarks do projeto (rodar da raiz do repositório).
+"""
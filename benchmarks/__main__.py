@@ -0,0 +1,73 @@
+"""
+Benchmark dos caminhos quentes: `python -m benchmarks run|compare`.
+
+Uso:
+    python -m benchmarks run --out bench/base.json
+    python -m benchmarks run --cases lane_step run_simulation --quick
+    python -m benchmarks compare bench/base.json bench/novo.json --threshold 0.1
+
+`compare` termina com código 1 se algum caso piorar além do limiar.
+"""
+import argparse
+import json
+import sys
+
+from .suite import CASES, DEFAULT_CASES, compare, run_suite
+
+
+def _cmd_run(args):
+    def progresso(nome, segundos):
+        print(f"[bench] {nome}: {segundos:.1f}s", file=sys.stderr)
+
+    resultado = run_suite(args.cases, repeats=args.repeats, quick=args.quick, progress=progresso)
+    texto = json.dumps(resultado, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+    for nome, r in resultado["results"].items():
+        print(f"{nome:<42} {r['value']:>14.2f} {r['unit']}", file=sys.stderr)
+
+
+def _cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.novo) as f:
+        novo = json.load(f)
+    for chave in ("commit", "platform", "python", "numpy"):
+        if base["meta"].get(chave) != novo["meta"].get(chave):
+            print(f"{chave}: {base['meta'].get(chave)} -> {novo['meta'].get(chave)}")
+    regressoes = 0
+    for nome, b, n, variacao, regrediu in compare(base, novo, args.threshold):
+        marca = "REGRESSÃO" if regrediu else ""
+        regressoes += regrediu
+        print(f"{nome:<42} {b['value']:>12.2f} -> {n['value']:>12.2f} {b['unit']:<10} {variacao:+7.1%} {marca}")
+    if regressoes:
+        print(f"{regressoes} caso(s) pioraram mais de {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0].strip())
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="roda a suíte e grava o JSON")
+    p_run.add_argument("--cases", nargs="+", choices=list(CASES), default=DEFAULT_CASES)
+    p_run.add_argument("--repeats", type=int, default=5)
+    p_run.add_argument("--quick", action="store_true", help="cargas menores, para checagens rápidas")
+    p_run.add_argument("--out", help="arquivo JSON de saída (padrão: stdout)")
+    p_cmp = sub.add_parser("compare", help="compara dois resultados e aponta regressões")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("novo")
+    p_cmp.add_argument("--threshold", type=float, default=0.10, help="piora relativa tolerada (padrão 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "run":
+        _cmd_run(args)
+    else:
+        sys.exit(_cmd_compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tempo de partida a frio: `python -m src` contra o app Streamlit.
+
+Cada alvo roda num processo novo, N vezes; o relatório mostra a mediana.
+- `cli`: `python -m src` com uma simulação de duração zero (só a partida);
+- `app`: primeira renderização do `app.py` pelo `AppTest` do Streamlit
+  (importa o Streamlit e executa o script, sem simular).
+
+Uso:
+    python -m benchmarks.startup -n 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_APP = (
+    "from streamlit.testing.v1 import AppTest;"
+    "at = AppTest.from_file('app.py', default_timeout=60); at.run();"
+    "assert not at.exception, at.exception"
+)
+
+ALVOS = {
+    "cli": [sys.executable, "-m", "src", "--set", "duracao_sec=0", "--controllers", "actuated"],
+    "app": [sys.executable, "-c", _APP],
+}
+
+
+def medir(cmd, n=5):
+    """Tempos de parede (s) de `n` execuções de `cmd` num processo novo"""
+    tempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        subprocess.run(cmd, cwd=RAIZ, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def run_startup(n=5, alvos=None):
+    """Mediana (s) da partida de cada alvo; alvos que falham ficam de fora"""
+    resultado = {}
+    for nome in alvos or ALVOS:
+        try:
+            resultado[nome] = statistics.median(medir(ALVOS[nome], n))
+        except (subprocess.CalledProcessError, OSError):
+            continue
+    return resultado
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("-n", type=int, default=5)
+    parser.add_argument("--alvos", nargs="+", choices=list(ALVOS))
+    args = parser.parse_args(argv)
+
+    resultado = run_startup(args.n, args.alvos)
+    for nome, t in resultado.items():
+        print(f"{nome:>4}: {t * 1000:7.1f} ms")
+    if "cli" in resultado and "app" in resultado:
+        print(f"cli/app: {resultado['cli'] / resultado['app']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
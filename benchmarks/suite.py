@@ -0,0 +1,381 @@
+"""
+Casos do benchmark dos caminhos quentes da simulação.
+
+Cada caso monta uma carga fixa (sementes fixas, mesma carga em toda
+execução), mede `repeats` vezes e devolve a melhor amostra (a menos
+afetada por ruído da máquina) numa unidade em que
+"maior é melhor" (ticks/s, simulações/s, episódios/s) ou "menor é melhor"
+(tempo de carga).
+"""
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELO = os.path.join(RAIZ, "models", "qlearning_agent_default.npz")
+
+# Demanda (veíc/min) das vias A e B: da faixa de TRAINING_SCENARIOS até
+# filas saturadas com centenas de veículos
+DEMANDAS = {
+    "baixa": (3, 2),
+    "media": (10, 8),
+    "alta": (20, 5),
+    "saturada": (60, 45),
+}
+TAMANHOS_FILA = (10, 100, 500, 1000)
+
+
+def _medir(fn, repeats):
+    """Executa `fn` `repeats` vezes (após uma rodada de aquecimento); devolve os tempos de parede (s)"""
+    fn()
+    tempos = []
+    for _ in range(repeats):
+        inicio = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def _resultado(trabalho, tempos, unidade):
+    taxas = [trabalho / t for t in tempos]
+    return {"value": max(taxas), "unit": unidade, "higher_is_better": True,
+            "samples": taxas}
+
+
+def bench_lane_step(repeats, quick=False):
+    """Ticks/s de `step_logic` com a fila mantida num tamanho fixo (metade verde, metade vermelho)"""
+    from src.simulation import ArrayLane, Lane
+    resultados = {}
+    ticks = 200 if quick else 1000
+    for lane_cls in (Lane, ArrayLane):
+        for n in TAMANHOS_FILA:
+            def rodar():
+                random.seed(0)
+                lane = lane_cls("A")
+                lane.add_vehicles(n, 0)
+                for i in range(ticks):
+                    passed, _ = lane.step_logic(i % 60 < 30, 1, 0.6)
+                    if passed:
+                        lane.add_vehicles(passed, 0)
+            resultados[f"lane_step.{lane_cls.__name__}.q{n}"] = _resultado(ticks, _medir(rodar, repeats), "ticks/s")
+    return resultados
+
+
+def bench_controller_step(repeats, quick=False):
+    """Ticks/s de `step` dos controladores com filas paradas"""
+    from src.controllers import ActuatedController, QLearningController
+    from src.simulation import Lane
+    from src.utils import DEFAULT_PARAMS
+    resultados = {}
+    ticks = 2000 if quick else 20000
+    casos = {
+        "ActuatedController": (ActuatedController, DEFAULT_PARAMS),
+        "QLearningController": (QLearningController, {**DEFAULT_PARAMS, "pretrained_path": MODELO}),
+        "QLearningController.compiled": (QLearningController, {**DEFAULT_PARAMS, "pretrained_path": MODELO,
+                                                               "compiled_policy": True}),
+    }
+    for nome, (cls, params) in casos.items():
+        def rodar():
+            random.seed(0)
+            laneA, laneB = Lane("A"), Lane("B")
+            laneA.add_vehicles(12, 0)
+            laneB.add_vehicles(4, 12)
+            c = cls(laneA, laneB, params)
+            for _ in range(ticks):
+                c.step(1)
+        resultados[f"controller_step.{nome}"] = _resultado(ticks, _medir(rodar, repeats), "ticks/s")
+    return resultados
+
+
+def bench_policy(repeats, quick=False):
+    """Decisões/s da política gulosa: estado discretizado + `select_action` contra `CompiledPolicy.action`"""
+    from src.controllers import CompiledPolicy, QLearningController
+    from src.utils import DEFAULT_PARAMS
+
+    class _Fila:
+        n = 0
+
+        def queue_length(self):
+            return self.n
+
+    laneA, laneB = _Fila(), _Fila()
+    c = QLearningController(laneA, laneB, {**DEFAULT_PARAMS, "pretrained_path": MODELO})
+    rng = np.random.default_rng(0)
+    n = 2000 if quick else 20000
+    estados = list(zip(rng.integers(0, 40, n).tolist(), rng.integers(0, 40, n).tolist(),
+                       rng.choice(["A", "B"], n).tolist(), rng.integers(0, 100, n).tolist()))
+
+    def tabela():
+        for qA, qB, fase, t in estados:
+            laneA.n, laneB.n, c.phase, c.phase_time = qA, qB, fase, t
+            c.select_action(c.discretize_state())
+
+    def compilada(politica):
+        def rodar():
+            for qA, qB, fase, t in estados:
+                laneA.n, laneB.n, c.phase, c.phase_time = qA, qB, fase, t
+                politica.action(laneA.queue_length(), laneB.queue_length(), c.phase, c.phase_time)
+        return rodar
+
+    return {
+        "policy.q_table": _resultado(n, _medir(tabela, repeats), "decisions/s"),
+        "policy.compiled": _resultado(n, _medir(compilada(c.compile()), repeats), "decisions/s"),
+        "policy.compiled_actuated": _resultado(
+            n, _medir(compilada(CompiledPolicy.from_actuated(DEFAULT_PARAMS)), repeats), "decisions/s"),
+    }
+
+
+def bench_run_simulation(repeats, quick=False):
+    """Ticks/s de `run_simulation` por nível de demanda, e simulações/s do cenário do app"""
+    from src.controllers import ActuatedController, QLearningController
+    from src.utils import DEFAULT_PARAMS, run_simulation
+    resultados = {}
+    duracao = 300 if quick else 1800
+    for nivel, (media_a, media_b) in DEMANDAS.items():
+        params = {**DEFAULT_PARAMS, "duracao_sec": duracao, "media_a": media_a, "media_b": media_b}
+        tempos = _medir(lambda: run_simulation(ActuatedController, params, seed=42), repeats)
+        resultados[f"run_simulation.ticks.{nivel}"] = _resultado(duracao, tempos, "ticks/s")
+    for nome, cls, extra in (("actuated", ActuatedController, {}),
+                             ("qlearning", QLearningController, {"pretrained_path": MODELO})):
+        params = {**DEFAULT_PARAMS, **extra}
+        tempos = _medir(lambda: run_simulation(cls, params, seed=42), repeats)
+        resultados[f"run_simulation.sims.{nome}"] = _resultado(1, tempos, "sims/s")
+    return resultados
+
+
+def bench_network(repeats, quick=False):
+    """Ticks/s da rede (`src.network`) em corredor e grades de até 400 cruzamentos"""
+    from src.network import Network, corridor, grid, run_network
+    duracao = 120 if quick else 600
+    params = {"duracao_sec": duracao}
+    redes = {
+        "corridor10": corridor(10, params=params),
+        "grid10x10": grid(10, 10, params=params),
+        "grid20x20": grid(20, 20, params=params),
+    }
+    resultados = {}
+    for nome, config in redes.items():
+        rede = Network(config)
+        tempos = _medir(lambda: run_network(rede, seed=42), repeats)
+        resultados[f"network.{nome}"] = _resultado(rede.n_ticks, tempos, "ticks/s")
+    return resultados
+
+
+def bench_arrivals(repeats, quick=False):
+    """Ticks/s de `run_simulation` com perfil de demanda e com replay de um log Parquet"""
+    import tempfile
+
+    from src.arrivals import DemandProfile, PROFILES, ProfileArrivals, TraceArrivals, write_trace
+    from src.controllers import ActuatedController
+    from src.utils import DEFAULT_PARAMS, run_simulation
+    duracao = 3600 if quick else 6 * 3600
+    # demanda abaixo da saturação mesmo no pico, para medir as chegadas e não filas enormes
+    params = {**DEFAULT_PARAMS, "duracao_sec": duracao, "media_a": 6, "media_b": 5}
+    resultados = {}
+    tempos = _medir(lambda: run_simulation(ActuatedController, params, seed=42,
+                                           arrivals=ProfileArrivals.from_params(params, start=6 * 3600)),
+                    repeats)
+    resultados["arrivals.profile"] = _resultado(duracao, tempos, "ticks/s")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "chegadas.parquet")
+        perfil_a = DemandProfile.hourly(params["media_a"], PROFILES["weekday"])
+        perfil_b = DemandProfile.hourly(params["media_b"], PROFILES["weekday"])
+        write_trace(log, 6 * 3600 + duracao, perfil_a, perfil_b, seed=42)
+        tempos = _medir(lambda: run_simulation(ActuatedController, params, seed=42,
+                                               arrivals=TraceArrivals(log, start=6 * 3600)), repeats)
+        resultados["arrivals.trace"] = _resultado(duracao, tempos, "ticks/s")
+    return resultados
+
+
+def bench_training(repeats, quick=False):
+    """Episódios/s do treinamento sequencial, com atualização por tick e com replay"""
+    from src.replay import ReplayBuffer
+    from src.training import train
+    episodios = 20 if quick else 100
+    tempos = _medir(lambda: train(n_episodes=episodios, seed=0, verbose=False), repeats)
+    resultados = {"training.episodes": _resultado(episodios, tempos, "episodes/s")}
+    tempos = _medir(lambda: train(n_episodes=episodios, seed=0, verbose=False,
+                                  replay=ReplayBuffer(seed=0)), repeats)
+    resultados["training.episodes_replay"] = _resultado(episodios, tempos, "episodes/s")
+    return resultados
+
+
+def bench_model_load(repeats, quick=False):
+    """Tempo de carga do modelo: leitura do `.npz`, mmap e acerto do cache"""
+    from src.models import ModelCache, load_q_model
+    n = 50 if quick else 200
+    resultados = {}
+    for nome, fn in (("npz", lambda: load_q_model(MODELO)),
+                     ("mmap", lambda: load_q_model(MODELO, mmap=True))):
+        tempos = _medir(lambda: [fn() for _ in range(n)], repeats)
+        amostras = [t / n * 1e3 for t in tempos]
+        resultados[f"model_load.{nome}"] = {"value": min(amostras), "unit": "ms",
+                                            "higher_is_better": False, "samples": amostras}
+    cache = ModelCache()
+    cache.get(MODELO)
+    tempos = _medir(lambda: [cache.get(MODELO) for _ in range(n)], repeats)
+    amostras = [t / n * 1e3 for t in tempos]
+    resultados["model_load.cached"] = {"value": min(amostras), "unit": "ms",
+                                       "higher_is_better": False, "samples": amostras}
+    return resultados
+
+
+def bench_qstore(repeats, quick=False):
+    """Consultas/s e memória da Q-table (densa e hash) por espaço de estados"""
+    from src.controllers import STATE_SPACES
+    from src.qstore import medir
+    entradas = 20_000 if quick else 100_000
+    resultados = {}
+    for nome, space in STATE_SPACES.items():
+        for storage in ("dense", "hash"):
+            medidas = [medir(space, storage, entradas, seed=i) for i in range(repeats)]
+            if medidas[0]["ns_per_lookup"] is None:
+                continue  # densa não cabe
+            chave = f"qstore.{nome}.{storage}"
+            for sufixo, taxas in (("", [1e9 / m["ns_per_lookup"] for m in medidas]),
+                                  (".batch", [m["lookups_per_sec"] for m in medidas])):
+                resultados[chave + sufixo] = {"value": max(taxas), "unit": "lookups/s",
+                                              "higher_is_better": True, "samples": taxas}
+            resultados[chave + ".memory"] = {"value": medidas[0]["bytes"] / 2**20, "unit": "MB",
+                                             "higher_is_better": False}
+    return resultados
+
+
+def bench_rollout(repeats, quick=False):
+    """Custo do fork do cruzamento (µs) e rodadas/s do `RolloutController` com filas típicas"""
+    from src.controllers import ActuatedController
+    from src.rollout import IntersectionState, rollout
+    from src.simulation import ArrayLane, Lane
+    from src.utils import DEFAULT_PARAMS
+    resultados = {}
+    n = 2000 if quick else 20000
+    for lane_cls in (Lane, ArrayLane):
+        rng = random.Random(0)
+        laneA, laneB = lane_cls("A", rng=rng), lane_cls("B", rng=rng)
+        laneA.add_vehicles(15, 0)
+        laneB.add_vehicles(8, 15)
+        c = ActuatedController(laneA, laneB, DEFAULT_PARAMS, rng=rng)
+        state = IntersectionState.capture(laneA, laneB, c, rng=rng)
+        etapas = {
+            # como no controlador: sem copiar o estado do gerador (~15 µs a mais)
+            "capture": lambda: IntersectionState.capture(laneA, laneB, c),
+            "fork": state.fork,
+            "restore": lambda: state.restore(rng=rng, lane_cls=lane_cls),
+        }
+        for etapa, fn in etapas.items():
+            def rodar():
+                for _ in range(n):
+                    fn()
+            tempos = _medir(rodar, repeats)
+            resultados[f"rollout.{etapa}.{lane_cls.__name__}"] = {
+                "value": min(tempos) / n * 1e6, "unit": "us", "higher_is_better": False,
+                "samples": [t / n * 1e6 for t in tempos]}
+        rodadas = 10 if quick else 50
+
+        def rodar():
+            for s in range(rodadas):
+                rollout(state, ("hold", "switch"), DEFAULT_PARAMS, 30, seed=s, lane_cls=lane_cls)
+        resultados[f"rollout.rounds.{lane_cls.__name__}"] = _resultado(rodadas, _medir(rodar, repeats), "rounds/s")
+    return resultados
+
+
+def bench_env(repeats, quick=False):
+    """Passos de ambiente/s de `TrafficEnv` e dos ambientes vetorizados com 1, 8 e 64 cópias"""
+    from src.env import medir
+    passos = 4000 if quick else 20000
+    resultados = {}
+    for n, modos in ((1, ("single", "sync", "async")), (8, ("sync", "async")), (64, ("sync", "async"))):
+        for modo in modos:
+            taxas = [medir(n, modo, passos, seed=i) for i in range(repeats)]
+            resultados[f"env.{modo}.n{n}"] = {"value": max(taxas), "unit": "steps/s",
+                                              "higher_is_better": True, "samples": taxas}
+    return resultados
+
+
+def bench_startup(repeats, quick=False):
+    """Partida a frio (ver `benchmarks.startup`)"""
+    from .startup import run_startup
+    return {f"startup.{nome}": {"value": t * 1e3, "unit": "ms", "higher_is_better": False}
+            for nome, t in run_startup(repeats).items()}
+
+
+CASES = {
+    "lane_step": bench_lane_step,
+    "controller_step": bench_controller_step,
+    "policy": bench_policy,
+    "run_simulation": bench_run_simulation,
+    "network": bench_network,
+    "arrivals": bench_arrivals,
+    "training": bench_training,
+    "qstore": bench_qstore,
+    "rollout": bench_rollout,
+    "env": bench_env,
+    "model_load": bench_model_load,
+    "startup": bench_startup,
+}
+# `startup` abre processos novos e depende do Streamlit: só roda se pedido
+DEFAULT_CASES = [c for c in CASES if c != "startup"]
+
+
+def _git_commit():
+    try:
+        saida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                               capture_output=True, text=True, check=True)
+        sujo = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True)
+        return saida.stdout.strip() + ("-dirty" if sujo.stdout.strip() else "")
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def machine_metadata():
+    """Ambiente da execução, gravado junto dos resultados"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "executable": sys.executable,
+    }
+
+
+def run_suite(cases=None, repeats=5, quick=False, progress=None):
+    """Roda os casos pedidos e devolve `{"meta": ..., "results": {nome: medida}}`"""
+    resultados = {}
+    for nome in cases or DEFAULT_CASES:
+        inicio = time.perf_counter()
+        resultados.update(CASES[nome](repeats, quick=quick))
+        if progress:
+            progress(nome, time.perf_counter() - inicio)
+    meta = machine_metadata()
+    meta.update({"repeats": repeats, "quick": quick})
+    return {"meta": meta, "results": resultados}
+
+
+def compare(base, novo, threshold=0.10):
+    """Compara dois resultados; devolve linhas `(nome, base, novo, variação, regrediu)`
+
+    A variação é relativa e já orientada: negativa significa pior, seja
+    queda de vazão ou aumento de tempo.
+    """
+    linhas = []
+    for nome, b in base["results"].items():
+        n = novo["results"].get(nome)
+        if n is None or not b["value"]:
+            continue
+        variacao = (n["value"] - b["value"]) / b["value"]
+        if not b.get("higher_is_better", True):
+            variacao = -variacao
+        linhas.append((nome, b, n, variacao, variacao < -threshold))
+    return linhas
@@ -0,0 +1,162 @@
+"""
+Simulação sem interface: `python -m src`.
+
+Roda os controladores com os mesmos parâmetros e sementes do app e imprime
+as métricas. Só importa o núcleo da simulação (NumPy incluso); nada de
+Streamlit, plotly ou pandas.
+
+Uso:
+    python -m src --set duracao_sec=3600 --set media_a=30 --seed 7
+    python -m src --controllers actuated --engine event --json
+    python -m src --controllers actuated --instrument --metrics-out run.prom
+    python -m src --controllers qlearning --profile run.folded
+    python -m src --controllers actuated rollout --set rollouts=16 --set rollout_budget=0.05
+    python -m src --set duracao_sec=86400 --snapshots-out filas.parquet
+    python -m src --set duracao_sec=86400 --demand-profile weekday
+    python -m src --set duracao_sec=604800 --arrivals chegadas.parquet
+"""
+import argparse
+import json
+import os
+import sys
+
+from .utils import DEFAULT_PARAMS, converter_valor, run_simulation
+
+ENGINES = ("object", "array", "event")
+
+
+def _por_controlador(path, nome, controllers):
+    """`path` com o nome do controlador antes da extensão quando há mais de um"""
+    if len(controllers) == 1:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{nome}{ext}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--controllers", nargs="+", default=["actuated", "qlearning"],
+                        choices=["actuated", "qlearning", "rollout"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALOR",
+                        help="sobrescreve um parâmetro de DEFAULT_PARAMS")
+    parser.add_argument("--model", help="modelo Q-Learning (padrão: o mesmo do app)")
+    parser.add_argument("--compiled-policy", action="store_true",
+                        help="Q-Learning decide pela política gulosa compilada (tabela de ações)")
+    parser.add_argument("--engine", default="object", choices=ENGINES)
+    parser.add_argument("--no-detectors", action="store_true",
+                        help="não sorteia pedestres/V2I (trajetória de `run_simulation` sem eventos)")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    parser.add_argument("--instrument", action="store_true",
+                        help="mede o tempo de cada etapa do tick (motores object/array)")
+    parser.add_argument("--trace-memory", action="store_true", help="com --instrument, mede alocações (lento)")
+    parser.add_argument("--metrics-out", metavar="ARQ",
+                        help="grava a instrumentação em .json ou em texto do Prometheus (.prom)")
+    parser.add_argument("--profile", metavar="ARQ",
+                        help="perfil de cada execução: .prof (cProfile) ou .folded (flamegraph)")
+    parser.add_argument("--snapshots-out", metavar="ARQ",
+                        help="grava as filas em blocos: diretório de .npy ou arquivo .parquet")
+    parser.add_argument("--arrivals", metavar="ARQ",
+                        help="replay das chegadas de um log gravado (.csv ou .parquet)")
+    parser.add_argument("--demand-profile", metavar="NOME|ARQ.json",
+                        help="demanda variando no dia: weekday, weekend, flat ou um perfil em JSON")
+    parser.add_argument("--start-hour", type=float, default=0.0,
+                        help="com --demand-profile, hora do dia em que a simulação começa")
+    args = parser.parse_args(argv)
+    if args.engine == "event" and (args.instrument or args.metrics_out or args.snapshots_out
+                                   or args.arrivals or args.demand_profile):
+        parser.error("--instrument, --snapshots-out, --arrivals e --demand-profile "
+                     "só valem para os motores object e array")
+    if args.engine == "event" and "rollout" in args.controllers:
+        parser.error("o controlador rollout faz fork das vias: use os motores object ou array")
+    if args.arrivals and args.demand_profile:
+        parser.error("use --arrivals ou --demand-profile, não os dois")
+
+    from .controllers import ActuatedController, QLearningController
+    from .models import find_model
+
+    params = dict(DEFAULT_PARAMS)
+    params.update({k: converter_valor(v) for k, v in (item.split("=", 1) for item in args.set)})
+    model = args.model or find_model()
+
+    from .rollout import RolloutController
+
+    controllers = {'actuated': (ActuatedController, params), 'rollout': (RolloutController, params)}
+    params_q = {**params, "compiled_policy": True} if args.compiled_policy else params
+    if model:
+        controllers['qlearning'] = (QLearningController, {**params_q, "pretrained_path": model, "epsilon": 0.0})
+    else:
+        controllers['qlearning'] = (QLearningController, params_q)
+
+    chegadas = None
+    if args.arrivals:
+        from .arrivals import TraceArrivals
+
+        def chegadas():
+            return TraceArrivals(args.arrivals)
+    elif args.demand_profile:
+        from .arrivals import PROFILES, DemandProfile, ProfileArrivals
+        inicio = args.start_hour * 3600
+
+        def chegadas():
+            if args.demand_profile in PROFILES:
+                return ProfileArrivals.from_params(params, args.demand_profile, inicio)
+            perfil = DemandProfile.load(args.demand_profile)
+            return ProfileArrivals(perfil, perfil, inicio)
+
+    instrument = None
+    if args.instrument or args.metrics_out:
+        from .profiling import Instrumentation
+        instrument = Instrumentation(trace_memory=args.trace_memory)
+
+    resultados = {}
+    for nome in args.controllers:
+        cls, p = controllers[nome]
+        if args.engine == "event":
+            from .events import run_event_simulation
+            fn, fn_args, fn_kwargs = run_event_simulation, (cls, p, args.seed), {"record_snapshots": False}
+        else:
+            lane_cls = None
+            if args.engine == "array":
+                from .simulation import ArrayLane
+                lane_cls = ArrayLane
+            fn, fn_args = run_simulation, (cls, p, args.seed)
+            fn_kwargs = {"lane_cls": lane_cls, "detectors": not args.no_detectors, "instrument": instrument}
+            if chegadas:
+                fn_kwargs["arrivals"] = chegadas()
+            if args.snapshots_out:
+                from .snapshots import open_sink
+                fn_kwargs["snapshot_sink"] = open_sink(_por_controlador(args.snapshots_out, nome, args.controllers))
+        if args.profile:
+            from .profiling import profile_run
+            out = _por_controlador(args.profile, nome, args.controllers)
+            r = profile_run(fn, *fn_args, out=out, **fn_kwargs)
+            print(f"perfil gravado em {out}", file=sys.stderr)
+        else:
+            r = fn(*fn_args, **fn_kwargs)
+        r.pop("snapshots", None)
+        r["n_green"] = len(r.pop("green_log"))
+        resultados[nome] = r
+
+    if instrument:
+        if args.metrics_out:
+            if args.metrics_out.endswith(".json"):
+                instrument.to_json(args.metrics_out)
+            else:
+                with open(args.metrics_out, "w") as f:
+                    f.write(instrument.to_prometheus())
+        if args.instrument:
+            print(instrument.report(), file=sys.stderr)
+
+    if args.json:
+        json.dump({"params": params, "seed": args.seed, "model": model, "results": resultados},
+                  sys.stdout, indent=2, default=str)
+        print()
+        return
+    for nome, r in resultados.items():
+        print(f"{nome:>10}: atendidos {r['total_passed']:5d} | espera média {r['avg_wait']:6.1f}s | "
+              f"p95 {r['p95_wait']:6.1f}s | máxima {r['max_wait']:6.1f}s | verdes {r['n_green']}")
+
+
+if __name__ == "__main__":
+    main()
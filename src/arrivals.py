@@ -0,0 +1,305 @@
+"""
+Fontes de chegadas para `run_simulation(..., arrivals=...)`.
+
+Uma fonte tem `counts(t, dt)`, chamado uma vez por tick em ordem, que
+devolve os veículos que chegam às vias A e B nesse tick, e `bind(rng)`,
+com que `run_simulation` entrega o `src.rng.Stream` dos sorteios:
+- `PoissonArrivals`: taxa constante (`media_a`/`media_b`), o padrão;
+- `ProfileArrivals`: Poisson com taxa variando ao longo do dia
+  (`DemandProfile`, p.ex. o perfil de dia útil `PROFILES["weekday"]`);
+- `TraceArrivals`: replay de um log de chegadas gravado (CSV ou Parquet),
+  lido em blocos de `chunk_rows` linhas, com memória constante.
+
+Formato do log, ordenado no tempo:
+- tempo: coluna `t` (segundos desde o início) ou `timestamp` (data/hora);
+- uma linha por detecção com `lane` ('A'/'B' ou 0/1) e `count` opcional
+  (padrão 1), ou contagens agregadas nas colunas `A` e `B`.
+"""
+import json
+
+import numpy as np
+
+from .rng import SimRNG
+
+DIA = 86400
+
+# Multiplicadores horários da demanda média (0h a 23h)
+PROFILES = {
+    "flat": [1.0] * 24,
+    "weekday": [0.2, 0.15, 0.1, 0.1, 0.15, 0.4, 1.0, 1.7, 1.8, 1.2, 0.9, 1.0,
+                1.1, 1.0, 0.9, 1.0, 1.3, 1.9, 2.0, 1.4, 0.9, 0.7, 0.5, 0.3],
+    "weekend": [0.4, 0.3, 0.2, 0.15, 0.15, 0.2, 0.3, 0.5, 0.7, 0.9, 1.1, 1.2,
+                1.3, 1.3, 1.2, 1.2, 1.2, 1.2, 1.1, 1.0, 0.9, 0.8, 0.7, 0.5],
+}
+
+
+def _stream(rng):
+    # sem `bind`, um gerador próprio com semente do sistema
+    return rng or SimRNG().stream("arrivals")
+
+
+class PoissonArrivals:
+    """Chegadas de Poisson com taxa constante (veíc/min), sorteadas em blocos por via"""
+    def __init__(self, media_a, media_b, rng=None):
+        self.media_a = media_a
+        self.media_b = media_b
+        self.bind(rng)
+
+    def bind(self, rng):
+        self.rng = rng
+        self._dt = None
+        return self
+
+    def _preparar(self, dt):
+        rng = self.rng = _stream(self.rng)
+        self._a = rng.sampler("poisson", self.media_a / 60 * dt)
+        self._b = rng.sampler("poisson", self.media_b / 60 * dt)
+        self._dt = dt
+
+    def counts(self, t, dt):
+        if dt != self._dt:
+            self._preparar(dt)
+        return self._a(), self._b()
+
+
+class DemandProfile:
+    """Taxa (veíc/min) ao longo de um período: pontos `(segundo, taxa)`
+    interpolados linearmente e repetidos a cada `period` segundos"""
+    def __init__(self, points, period=DIA):
+        pontos = sorted(points)
+        self.seconds = np.array([p[0] for p in pontos], dtype=float)
+        self.rates = np.array([p[1] for p in pontos], dtype=float)
+        self.period = period
+
+    def rate(self, t):
+        return np.interp(np.asarray(t) % self.period, self.seconds, self.rates, period=self.period)
+
+    @classmethod
+    def hourly(cls, media, multiplicadores):
+        """Perfil diário com `media * multiplicadores[h]` no meio de cada hora h"""
+        passo = DIA / len(multiplicadores)
+        return cls([((h + 0.5) * passo, media * m) for h, m in enumerate(multiplicadores)], DIA)
+
+    @classmethod
+    def load(cls, path):
+        """JSON `{"period": 86400, "points": [[segundo, taxa], ...]}`"""
+        with open(path) as f:
+            dados = json.load(f)
+        return cls(dados["points"], dados.get("period", DIA))
+
+
+class ProfileArrivals:
+    """Poisson com a taxa de cada via dada por um `DemandProfile`
+
+    `start` é o segundo do período em que a simulação começa (p.ex.
+    `6 * 3600` para começar às 6h).
+    """
+    def __init__(self, profile_a, profile_b, start=0, rng=None):
+        self.profile_a = profile_a
+        self.profile_b = profile_b
+        self.start = start
+        self._tabela = None
+        self.bind(rng)
+
+    def bind(self, rng):
+        self.rng = rng
+        self._k0 = 0
+        self._a = self._b = []
+        return self
+
+    @classmethod
+    def from_params(cls, params, profile="weekday", start=0):
+        """Perfil horário nomeado (`PROFILES`) em torno de `media_a`/`media_b`"""
+        multiplicadores = PROFILES[profile] if isinstance(profile, str) else profile
+        return cls(DemandProfile.hourly(params['media_a'], multiplicadores),
+                   DemandProfile.hourly(params['media_b'], multiplicadores), start)
+
+    def _taxas(self, dt):
+        # média de chegadas por tick ao longo do período de cada perfil, calculada uma vez
+        def tabela(perfil):
+            return perfil.rate(self.start + np.arange(0, perfil.period, dt)) / 60 * dt
+        self._tabela = (dt, tabela(self.profile_a), tabela(self.profile_b))
+        self._a = self._b = []
+
+    def _sortear(self, k):
+        # sorteia o bloco de ticks a partir de `k` de uma vez
+        rng = self.rng = _stream(self.rng)
+        _, ta, tb = self._tabela
+        ticks = np.arange(k, k + rng.block)
+        self._a = rng.generator.poisson(ta[ticks % len(ta)]).tolist()
+        self._b = rng.generator.poisson(tb[ticks % len(tb)]).tolist()
+        self._k0 = k
+
+    def counts(self, t, dt):
+        if self._tabela is None or self._tabela[0] != dt:
+            self._taxas(dt)
+        k = int(round(t / dt))
+        i = k - self._k0
+        if not 0 <= i < len(self._a):
+            self._sortear(k)
+            i = 0
+        return self._a[i], self._b[i]
+
+
+def _blocos(path, chunk_rows):
+    """Colunas do log em blocos de até `chunk_rows` linhas"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        arquivo = pq.ParquetFile(path, memory_map=True)
+        for lote in arquivo.iter_batches(batch_size=chunk_rows):
+            yield {nome: lote.column(nome).to_numpy(zero_copy_only=False) for nome in lote.schema.names}
+    else:
+        import pandas as pd
+        with pd.read_csv(path, chunksize=chunk_rows) as leitor:
+            for df in leitor:
+                yield {c: df[c].to_numpy() for c in df.columns}
+
+
+class TraceArrivals:
+    """
+    Replay de um log de chegadas, lido em blocos.
+
+    Cada bloco vira a lista de ticks com chegadas e as contagens de cada
+    via; a linha do último tick de um bloco só é entregue junto com o bloco
+    seguinte, porque o mesmo tick pode continuar nele. A memória fica em
+    poucos blocos, qualquer que seja o tamanho do log.
+
+    `start` é o instante do log que corresponde a `t = 0` (segundos, ou
+    data/hora para logs com `timestamp`; padrão: 0 ou o primeiro timestamp).
+    Depois do fim do log as chegadas são zero e `exhausted` fica verdadeiro.
+    """
+    def __init__(self, path, start=None, chunk_rows=65536):
+        self.path = path
+        self.start = start
+        self.chunk_rows = chunk_rows
+        self.dt = None
+        self.rows = 0
+        self.exhausted = False
+        self._leitor = None
+        self._ticks, self._a, self._b = [], [], []
+        self._i = 0
+        self._resto = None
+        self._ultimo_tick = None
+
+    def bind(self, rng):
+        # o replay é determinístico
+        return self
+
+    def _tempos(self, cols):
+        if "t" in cols:
+            segundos = np.asarray(cols["t"], dtype=float)
+            return segundos - (self.start or 0)
+        instantes = np.asarray(cols["timestamp"], dtype="datetime64[ns]")
+        if self.start is None:
+            self.start = instantes[0]
+        origem = np.datetime64(self.start, "ns")
+        return (instantes - origem).astype(np.int64) / 1e9
+
+    def _contagens(self, cols):
+        if "A" in cols and "B" in cols:
+            return np.asarray(cols["A"], dtype=np.int64), np.asarray(cols["B"], dtype=np.int64)
+        via = cols["lane"]
+        n = np.asarray(cols["count"], dtype=np.int64) if "count" in cols else np.ones(len(via), dtype=np.int64)
+        if via.dtype.kind in "iu":
+            em_a = via == 0
+        else:
+            em_a = np.asarray(via).astype(str) == "A"
+        return np.where(em_a, n, 0), np.where(em_a, 0, n)
+
+    def _carregar(self):
+        if self._leitor is None:
+            self._leitor = _blocos(self.path, self.chunk_rows)
+        cols = next(self._leitor, None)
+        if cols is None:
+            fim = True
+            ticks = np.empty(0, dtype=np.int64)
+            ca = cb = np.empty(0, dtype=np.int64)
+        else:
+            fim = False
+            self.rows += len(next(iter(cols.values())))
+            ticks = np.floor(self._tempos(cols) / self.dt).astype(np.int64)
+            ca, cb = self._contagens(cols)
+            if len(ticks) and (np.any(np.diff(ticks) < 0) or
+                               (self._ultimo_tick is not None and ticks[0] < self._ultimo_tick)):
+                raise ValueError(f"{self.path}: log fora de ordem no tempo")
+            if len(ticks):
+                self._ultimo_tick = int(ticks[-1])
+            antes = ticks >= 0
+            ticks, ca, cb = ticks[antes], ca[antes], cb[antes]
+        if self._resto is not None:
+            ticks = np.concatenate([self._resto[0], ticks])
+            ca = np.concatenate([self._resto[1], ca])
+            cb = np.concatenate([self._resto[2], cb])
+            self._resto = None
+        if len(ticks):
+            inicios = np.concatenate([[0], np.flatnonzero(np.diff(ticks)) + 1])
+            unicos = ticks[inicios]
+            soma_a = np.add.reduceat(ca, inicios)
+            soma_b = np.add.reduceat(cb, inicios)
+            if not fim:
+                # o último tick pode continuar no próximo bloco
+                self._resto = (unicos[-1:], soma_a[-1:], soma_b[-1:])
+                unicos, soma_a, soma_b = unicos[:-1], soma_a[:-1], soma_b[:-1]
+            self._ticks, self._a, self._b = unicos.tolist(), soma_a.tolist(), soma_b.tolist()
+        else:
+            self._ticks, self._a, self._b = [], [], []
+        self._i = 0
+        self.exhausted = fim and self._resto is None and not self._ticks
+
+    def counts(self, t, dt):
+        if self.dt is None:
+            self.dt = dt
+        k = int(round(t / dt))
+        while True:
+            while self._i < len(self._ticks) and self._ticks[self._i] < k:
+                self._i += 1
+            if self._i < len(self._ticks) or self.exhausted:
+                break
+            self._carregar()
+        if self._i < len(self._ticks) and self._ticks[self._i] == k:
+            i = self._i
+            self._i += 1
+            return self._a[i], self._b[i]
+        return 0, 0
+
+
+def write_trace(path, duration, profile_a, profile_b, seed=0, chunk_seconds=3600):
+    """Grava um log sintético `(t, lane, count)` com a demanda dos perfis
+
+    Gerado e gravado de hora em hora (`chunk_seconds`), para testar o replay
+    de logs longos sem montá-los em memória. Devolve o número de linhas.
+    """
+    rng = np.random.default_rng(seed)
+    parquet = path.endswith(".parquet")
+    escritor = None
+    linhas = 0
+    try:
+        for inicio in range(0, int(duration), chunk_seconds):
+            ts = np.arange(inicio, min(inicio + chunk_seconds, int(duration)))
+            partes = []
+            for via, perfil in (("A", profile_a), ("B", profile_b)):
+                n = rng.poisson(perfil.rate(ts) / 60)
+                tem = n > 0
+                partes.append((ts[tem], np.full(tem.sum(), via), n[tem]))
+            t = np.concatenate([p[0] for p in partes])
+            ordem = np.argsort(t, kind="stable")
+            bloco = {
+                "t": t[ordem],
+                "lane": np.concatenate([p[1] for p in partes])[ordem],
+                "count": np.concatenate([p[2] for p in partes])[ordem],
+            }
+            linhas += len(ordem)
+            if parquet:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                tabela = pa.table(bloco)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(path, tabela.schema)
+                escritor.write_table(tabela)
+            else:
+                import pandas as pd
+                pd.DataFrame(bloco).to_csv(path, mode="a" if inicio else "w", header=not inicio, index=False)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return linhas
@@ -0,0 +1,266 @@
+"""
+Simulação em lote: N cruzamentos independentes avançando juntos.
+
+Cada réplica é o cruzamento de duas vias de `run_simulation`, mas o estado
+de todas fica em arrays (N, ...) e cada tick é um punhado de operações
+vetorizadas, sem laço Python por réplica. As réplicas compartilham um único
+`numpy.random.Generator`, então os resultados são estatisticamente
+equivalentes aos de `run_simulation` (não idênticos semente a semente).
+"""
+import numpy as np
+
+from .controllers import ActuatedController, CompiledPolicy, QLearningController
+from .simulation import _car_following
+from .utils import gerar_fluxo_carros
+
+# Códigos de fase usados pelos controladores vetorizados
+PHASE_A, PHASE_B, YELLOW_A, YELLOW_B = 0, 1, 2, 3
+
+
+def ruido_sensor_vetorizado(q, rng, erro_max=0.15):
+    """Versão vetorizada de `ruido_sensor`"""
+    fator = 1 + rng.uniform(-erro_max, erro_max, np.shape(q))
+    lido = np.floor(q * fator).astype(int)
+    return np.where(q > 0, np.maximum(0, lido), 0)
+
+
+class LaneBatch:
+    """
+    M vias em arrays (M, C) preenchidos da esquerda (o líder na coluna 0).
+
+    `counts[i]` diz quantas colunas da linha i são veículos reais; o resto é
+    espaço livre e nunca influencia os veículos válidos, pois cada um só
+    depende dos que estão à sua frente.
+    """
+    def __init__(self, n_lanes, capacity=64):
+        self.pos = np.zeros((n_lanes, capacity))
+        self.wait = np.zeros((n_lanes, capacity))
+        self.counts = np.zeros(n_lanes, dtype=int)
+        self.passed = np.zeros(n_lanes, dtype=int)
+
+    def _grow(self, need):
+        cap = self.pos.shape[1]
+        if need <= cap:
+            return
+        cap = max(2 * cap, need)
+        for attr in ("pos", "wait"):
+            old = getattr(self, attr)
+            new = np.zeros((old.shape[0], cap))
+            new[:, :old.shape[1]] = old
+            setattr(self, attr, new)
+
+    def add_vehicles(self, n, rng=None, u=None):
+        """Acrescenta n[i] veículos ao fim de cada via i
+
+        `u`, se dado, traz um sorteio uniforme em [0, 1) por veículo novo (na
+        ordem das vias) e substitui `rng` na posição de chegada.
+        """
+        total = int(n.sum())
+        if not total:
+            return
+        self._grow(int((self.counts + n).max()))
+        rows = np.repeat(np.arange(n.shape[0]), n)
+        first = np.cumsum(n) - n
+        cols = self.counts[rows] + np.arange(total) - np.repeat(first, n)
+        self.pos[rows, cols] = -rng.uniform(5, 25, total) if u is None else -(5 + 20 * u)
+        self.wait[rows, cols] = 0.0
+        self.counts += n
+
+    def step_logic(self, is_green, dt, discharge_rate, rng):
+        """Mesmo passo de `Lane.step_logic` para todas as vias; devolve (passaram, espera somada)"""
+        n_lanes = self.counts.shape[0]
+        expected = discharge_rate * dt
+        base = int(np.floor(expected))
+        capacity = base + (rng.random(n_lanes) < (expected - base))
+        capacity = np.where(is_green, np.minimum(capacity, self.counts), 0)
+
+        passed = np.zeros(n_lanes, dtype=int)
+        waited = np.zeros(n_lanes)
+        cap_max = int(capacity.max())
+        if cap_max:
+            cols = np.arange(cap_max)
+            ok = (cols < capacity[:, None]) & (self.pos[:, :cap_max] > -2)
+            # só sai o prefixo contíguo de veículos na linha de retenção
+            passed = np.cumprod(ok, axis=1).sum(axis=1)
+            waited = np.where(cols < passed[:, None], self.wait[:, :cap_max], 0.0).sum(axis=1)
+            if passed.any():
+                width = self.pos.shape[1]
+                idx = np.minimum(np.arange(width) + passed[:, None], width - 1)
+                self.pos = np.take_along_axis(self.pos, idx, axis=1)
+                self.wait = np.take_along_axis(self.wait, idx, axis=1)
+                self.counts -= passed
+                self.passed += passed
+
+        width = int(self.counts.max())
+        if width:
+            # dispensa o refinamento exato: as réplicas já não reproduzem
+            # `Lane` sorteio a sorteio
+            pos, move = _car_following(self.pos[:, :width], is_green, dt, exact=False)
+            valid = np.arange(width) < self.counts[:, None]
+            self.pos[:, :width] = np.where(valid, pos, 0.0)
+            self.wait[:, :width] += np.where(valid & (move < 0.1), dt, 0)
+        return passed, waited
+
+    def max_wait(self):
+        """Maior espera entre os veículos presentes em cada via"""
+        width = int(self.counts.max())
+        if not width:
+            return np.zeros(self.counts.shape[0])
+        valid = np.arange(width) < self.counts[:, None]
+        return np.where(valid, self.wait[:, :width], 0.0).max(axis=1)
+
+
+class VectorActuatedController:
+    """Regra de `ActuatedController` aplicada a N cruzamentos de uma vez"""
+    def __init__(self, params, n):
+        self.params = params
+        self.phase = np.full(n, PHASE_A)
+        self.phase_time = np.zeros(n)
+        self.green_limit = np.full(n, params.get('g_max', 90))
+        self.switches = np.zeros(n, dtype=int)
+
+    def step(self, dt, qA, qB, rng):
+        """Avança um tick; devolve as máscaras de verde (A, B)"""
+        p = self.params
+        detA = ruido_sensor_vetorizado(qA, rng)
+        detB = ruido_sensor_vetorizado(qB, rng)
+
+        yellow = self.phase >= YELLOW_A
+        next_green = yellow & (self.phase_time >= p.get('yellow_time', 3))
+        in_a = self.phase == PHASE_A
+        current_q = np.where(in_a, detA, detB)
+        other_q = np.where(in_a, detB, detA)
+        switch = ~yellow & (
+            ((current_q <= 1) & (self.phase_time >= p.get('g_min', 16)) & (other_q > 0))
+            | (self.phase_time >= self.green_limit)
+        )
+        hold = ~(next_green | switch)
+
+        self.phase_time = np.where(hold, self.phase_time + dt, 0)
+        self.switches += switch
+        self.phase = np.where(switch, self.phase + 2, self.phase)
+
+        if next_green.any():
+            self.phase = np.where(next_green, np.where(self.phase == YELLOW_A, PHASE_B, PHASE_A), self.phase)
+            qa = np.maximum(1, qA)
+            qb = np.maximum(1, qB)
+            ratio = np.where(self.phase == PHASE_A, qa, qb) / (qa + qb)
+            limit = np.clip(p['ciclo'] * ratio, p['g_min'], p['g_max']).astype(int)
+            self.green_limit = np.where(next_green, limit, self.green_limit)
+
+        return self.phase == PHASE_A, self.phase == PHASE_B
+
+
+class VectorQLearningController:
+    """
+    Política gulosa de `QLearningController` para N cruzamentos.
+
+    A Q-table é reduzida de antemão à ação gulosa de cada estado
+    (`CompiledPolicy`), então cada decisão é uma indexação no array de
+    política. `params["compiled_policy"]` aceita uma política pronta, como
+    em `QLearningController`.
+    """
+    def __init__(self, params, n, q_array=None):
+        if isinstance(params.get("compiled_policy"), CompiledPolicy):
+            self.policy = params["compiled_policy"]
+        else:
+            if q_array is None:
+                self.policy = QLearningController(None, None, params).compile()
+            else:
+                self.policy = CompiledPolicy.from_q_table(q_array)
+        self.g_min = params.get('g_min', 16)
+        self.g_max = params.get('g_max', 90)
+        self.yellow_time = params.get('yellow_time', 3)
+        self.phase = np.full(n, PHASE_A)
+        self.phase_time = np.zeros(n)
+        self.in_yellow = np.zeros(n, dtype=bool)
+        self.yellow_timer = np.zeros(n)
+        self.switches = np.zeros(n, dtype=int)
+
+    def step(self, dt, qA, qB, rng=None):
+        """Avança um tick; devolve as máscaras de verde (A, B)"""
+        y = self.in_yellow
+        self.yellow_timer = np.where(y, self.yellow_timer + dt, self.yellow_timer)
+        done = y & (self.yellow_timer >= self.yellow_time)
+
+        action = self.policy.actions_for(qA, qB, self.phase, self.phase_time)
+        start_yellow = ~y & (((action == 1) & (self.phase_time >= self.g_min)) | (self.phase_time >= self.g_max))
+        hold = ~y & ~start_yellow
+
+        self.phase_time = np.where(hold, self.phase_time + dt, np.where(done, 0, self.phase_time))
+        self.phase = np.where(done, 1 - self.phase, self.phase)
+        self.switches += done
+        self.in_yellow = (y & ~done) | start_yellow
+        self.yellow_timer = np.where(done | start_yellow, 0, self.yellow_timer)
+
+        return self.phase == PHASE_A, self.phase == PHASE_B
+
+
+VECTOR_CONTROLLERS = {
+    ActuatedController: VectorActuatedController,
+    QLearningController: VectorQLearningController,
+}
+
+
+def _resumo(valores):
+    n = valores.shape[0]
+    std = float(valores.std(ddof=1)) if n > 1 else 0.0
+    return {
+        "mean": float(valores.mean()),
+        "std": std,
+        "ci95": 1.96 * std / np.sqrt(n),
+        "min": float(valores.min()),
+        "p50": float(np.percentile(valores, 50)),
+        "p95": float(np.percentile(valores, 95)),
+        "max": float(valores.max()),
+    }
+
+
+def run_batch(controller_cls, params, n_replicas=100, seed=42):
+    """Executa `n_replicas` simulações independentes em lockstep
+
+    `controller_cls` pode ser `ActuatedController`/`QLearningController`
+    (mapeados para a versão vetorizada) ou diretamente uma classe vetorizada.
+    Devolve arrays por réplica e estatísticas agregadas em `stats`.
+    """
+    controller_cls = VECTOR_CONTROLLERS.get(controller_cls, controller_cls)
+    rng = np.random.default_rng(seed)
+    n = n_replicas
+    dt = params['dt']
+
+    lanes = LaneBatch(2 * n)
+    controller = controller_cls(params, n)
+
+    t = 0
+    total_passed = np.zeros(n, dtype=int)
+    total_wait_passed = np.zeros(n)
+    max_wait_seen = np.zeros(n)
+
+    while t < params['duracao_sec']:
+        chegA = gerar_fluxo_carros(params['media_a'], dt, size=n, rng=rng)
+        chegB = gerar_fluxo_carros(params['media_b'], dt, size=n, rng=rng)
+        lanes.add_vehicles(np.concatenate([chegA, chegB]), rng)
+
+        green_A, green_B = controller.step(dt, lanes.counts[:n], lanes.counts[n:], rng)
+
+        passed, waited = lanes.step_logic(np.concatenate([green_A, green_B]), dt, params['taxa_escoamento'], rng)
+        total_passed += passed[:n] + passed[n:]
+        total_wait_passed += waited[:n] + waited[n:]
+        lane_max = lanes.max_wait()
+        max_wait_seen = np.maximum(max_wait_seen, np.maximum(lane_max[:n], lane_max[n:]))
+        t += dt
+
+    avg_wait = total_wait_passed / np.maximum(1, total_passed)
+    return {
+        "total_passed": total_passed,
+        "avg_wait": avg_wait,
+        "max_wait": max_wait_seen,
+        "switches": controller.switches,
+        "stats": {
+            "total_passed": _resumo(total_passed),
+            "avg_wait": _resumo(avg_wait),
+            "max_wait": _resumo(max_wait_seen),
+        },
+        "n_replicas": n,
+        "seed": seed,
+    }
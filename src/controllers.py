@@ -1,14 +1,16 @@
+import bisect
+import math
 import numpy as np
 import random
-from collections import defaultdict
-import pickle
+from .qstore import DenseQ, as_q_store, make_q_store
 from .utils import ruido_sensor
 
 class ActuatedController:
     """Controlador atuado (heurística inteligente)"""
-    def __init__(self, laneA, laneB, params):
+    def __init__(self, laneA, laneB, params, rng=random):
         self.laneA = laneA
         self.laneB = laneB
+        self.rng = rng  # ruído do sensor
         self.phase = 'A'
         self.phase_time = 0
         self.params = params
@@ -16,7 +18,8 @@ class ActuatedController:
         self.green_times_log = []
 
     def sense(self):
-        return ruido_sensor(self.laneA.queue_length()), ruido_sensor(self.laneB.queue_length())
+        return (ruido_sensor(self.laneA.queue_length(), rng=self.rng),
+                ruido_sensor(self.laneB.queue_length(), rng=self.rng))
 
     def decide(self, **kwargs):
         detA, detB = self.sense()
@@ -37,8 +40,10 @@ class ActuatedController:
         return 'hold'
 
     def step(self, dt, **kwargs):
-        action = self.decide(**kwargs)
-        
+        return self.apply(self.decide(**kwargs), dt)
+
+    def apply(self, action, dt):
+        """Executa uma ação de `decide` ('hold', 'switch' ou 'next_green')"""
         if action == 'hold':
             self.phase_time += dt
         elif action == 'switch':
@@ -56,11 +61,148 @@ class ActuatedController:
 
         return self.phase
 
+# Formato da tabela densa do espaço de estados padrão: (bin fila A, bin fila B, fase, bin tempo de fase)
+STATE_SHAPE = (5, 5, 2, 4)
+N_ACTIONS = 2
+# Limites superiores (inclusivos) dos bins padrão de `discretize_state`
+QUEUE_BIN_EDGES = (2, 5, 10, 20)
+TIME_BIN_EDGES = (15, 30, 60)
+
+def tabela_bins(edges):
+    """Bin de cada valor inteiro de 0 a `edges[-1] + 1`; a última posição vale para os maiores
+
+    Para um tempo não inteiro `t`, o bin é o de `ceil(t)` (limites inteiros).
+    """
+    if not edges:
+        return [0]
+    return [bisect.bisect_left(edges, v) for v in range(edges[-1] + 2)]
+
+# Features opcionais do estado, nesta ordem depois de (fila A, fila B, fase, tempo)
+FEATURES = ("trend", "max_wait", "v2i", "ped")
+# Limites superiores (inclusivos, em segundos) dos bins da maior espera de cada via
+WAIT_BIN_EDGES = (15, 30, 60, 120, 300)
+
+def _tendencia(atual, anterior):
+    """0 fila diminuiu, 1 estável, 2 aumentou desde a decisão anterior"""
+    return 1 if atual == anterior else (2 if atual > anterior else 0)
+
+class StateSpace:
+    """
+    Espaço de estados do `QLearningController`.
+
+    O estado é `(bin fila A, bin fila B, fase, bin tempo de fase)` com os bins
+    dados pelos limites inclusivos `queue_edges`/`time_edges`, seguido de
+    duas componentes (uma por via) para cada feature de `features`:
+    - `trend`: fila diminuiu, estável ou aumentou desde a decisão anterior;
+    - `max_wait`: bin (`wait_edges`) da maior espera entre os parados;
+    - `v2i`/`ped`: detecção de veículo prioritário/pedestre no tick
+      (os kwargs `v2i_A`, `ped_A`... que o app passa para `step`).
+    """
+    def __init__(self, queue_edges=QUEUE_BIN_EDGES, time_edges=TIME_BIN_EDGES, features=(),
+                 wait_edges=WAIT_BIN_EDGES):
+        desconhecidas = set(features) - set(FEATURES)
+        if desconhecidas:
+            raise ValueError(f"features desconhecidas: {sorted(desconhecidas)} (use {FEATURES})")
+        for nome, edges in (("queue_edges", queue_edges), ("time_edges", time_edges), ("wait_edges", wait_edges)):
+            if list(edges) != sorted(set(edges)):
+                raise ValueError(f"{nome} precisa ser crescente e sem repetições: {edges}")
+        self.queue_edges = tuple(int(e) for e in queue_edges)
+        self.time_edges = tuple(int(e) for e in time_edges)
+        self.wait_edges = tuple(int(e) for e in wait_edges)
+        self.features = tuple(f for f in FEATURES if f in features)
+        nq, nt = len(self.queue_edges) + 1, len(self.time_edges) + 1
+        tamanhos = {"trend": 3, "max_wait": len(self.wait_edges) + 1, "v2i": 2, "ped": 2}
+        self.shape = (nq, nq, 2, nt) + sum(((tamanhos[f],) * 2 for f in self.features), ())
+        self.n_states = math.prod(self.shape)
+        self._pesos = tuple(math.prod(self.shape[i + 1:]) for i in range(len(self.shape)))
+        self.queue_bins = tabela_bins(self.queue_edges)
+        self.time_bins = tabela_bins(self.time_edges)
+        self.wait_bins = tabela_bins(self.wait_edges)
+
+    @classmethod
+    def from_params(cls, params):
+        """`params["state_space"]`: um `StateSpace`, o nome de um preset de `STATE_SPACES` ou um dict"""
+        spec = params.get("state_space")
+        if spec is None:
+            return STATE_SPACES["default"]
+        if isinstance(spec, StateSpace):
+            return spec
+        if isinstance(spec, str):
+            try:
+                return STATE_SPACES[spec]
+            except KeyError:
+                raise ValueError(f"espaço de estados desconhecido: {spec} (use {list(STATE_SPACES)})") from None
+        return cls.from_meta(spec)
+
+    @classmethod
+    def from_meta(cls, meta):
+        return cls(meta.get("queue", QUEUE_BIN_EDGES), meta.get("phase_time", TIME_BIN_EDGES),
+                   meta.get("features", ()), meta.get("max_wait", WAIT_BIN_EDGES))
+
+    def to_meta(self):
+        """Descrição em JSON (o formato de `bins` nos metadados dos modelos)"""
+        meta = {"queue": list(self.queue_edges), "phase_time": list(self.time_edges)}
+        if self.features:
+            meta["features"] = list(self.features)
+        if "max_wait" in self.features:
+            meta["max_wait"] = list(self.wait_edges)
+        return meta
+
+    def __eq__(self, other):
+        return isinstance(other, StateSpace) and self.to_meta() == other.to_meta()
+
+    def __hash__(self):
+        return hash(self.shape)
+
+    def __repr__(self):
+        return f"StateSpace({self.n_states} estados, shape={self.shape})"
+
+    @property
+    def standard(self):
+        """Mesmos bins de `STATE_SHAPE` e nenhuma feature extra"""
+        return not self.features and self.queue_edges == QUEUE_BIN_EDGES and self.time_edges == TIME_BIN_EDGES
+
+    def index(self, state):
+        """Índice achatado de uma tupla de estado"""
+        return sum(s * p for s, p in zip(state, self._pesos))
+
+    def extras(self, c, qA, qB):
+        """Componentes das features do controlador `c` (filas atuais `qA`/`qB`)"""
+        out = ()
+        for f in self.features:
+            if f == "trend":
+                antA, antB = c.previous_queues
+                out += (_tendencia(qA, antA), _tendencia(qB, antB))
+            elif f == "max_wait":
+                wb = self.wait_bins
+                wA = math.ceil(c.laneA.max_wait())
+                wB = math.ceil(c.laneB.max_wait())
+                out += (wb[wA] if wA < len(wb) else wb[-1], wb[wB] if wB < len(wb) else wb[-1])
+            else:
+                sinais = c.signals
+                out += (int(bool(sinais.get(f + "_A"))), int(bool(sinais.get(f + "_B"))))
+        return out
+
+# Bins finos: filas até 1000 veículos e tempo de fase de 5 em 5 s no início do verde
+FINE_QUEUE_EDGES = (0, 1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 40, 50, 60, 80, 100,
+                    130, 170, 220, 300, 400, 500, 700, 1000)
+FINE_TIME_EDGES = (5, 10, 15, 20, 25, 30, 40, 50, 60, 75, 90, 120)
+
+STATE_SPACES = {
+    # 200 estados: o do notebook e dos modelos em `models/`
+    "default": StateSpace(),
+    # ~20 mil estados
+    "fine": StateSpace(FINE_QUEUE_EDGES, FINE_TIME_EDGES),
+    # ~100 milhões de estados: `fine` com todas as features (só cabe em hash)
+    "full": StateSpace(FINE_QUEUE_EDGES, FINE_TIME_EDGES, FEATURES),
+}
+
 class QLearningController:
     """Controlador Q-Learning (RL)"""
-    def __init__(self, laneA, laneB, params):
+    def __init__(self, laneA, laneB, params, rng=random):
         self.laneA = laneA
         self.laneB = laneB
+        self.rng = rng  # exploração epsilon-greedy
         self.phase = 'A'
         self.phase_time = 0
         
@@ -69,9 +211,15 @@ class QLearningController:
         self.gamma = params.get('gamma', 0.95)
         self.epsilon = params.get('epsilon', 0.01)  # Baixo para modo teste
         
-        # Q-Table
-        self.q_table = defaultdict(lambda: np.zeros(2))
+        # Espaço de estados e Q-table indexada pela tupla de estado (estados
+        # não visitados = 0): densa quando cabe, hash quando não cabe
+        self.state_space = StateSpace.from_params(params)
+        self.q = make_q_store(self.state_space.shape, N_ACTIONS, params.get("q_storage", "auto"))
         
+        # Política gulosa compilada, usada fora do treino: True compila a
+        # Q-table (após carregar o modelo) ou uma `CompiledPolicy` pronta
+        compilada = params.get("compiled_policy")
+
         # Parâmetros de controle
         self.g_min = params.get('g_min', 16)
         self.g_max = params.get('g_max', 90)
@@ -79,59 +227,119 @@ class QLearningController:
         self.in_yellow = False
         self.yellow_timer = 0
         self.green_times_log = []
+        # Última decisão tomada (None durante o amarelo), usada no treino
+        self.last_state = None
+        self.last_action = None
+        # Entradas das features extras: filas na decisão anterior e os kwargs de `step`
+        self.previous_queues = (0, 0)
+        self.signals = {}
 
         # Carrega modelo pré-treinado se fornecido
+        self.model_meta = None
         pretrained_path = params.get("pretrained_path")
         if pretrained_path:
             try:
-                with open(pretrained_path, "rb") as f:
-                    loaded = pickle.load(f)
-                if hasattr(loaded, "q_table"):
-                    q_src = loaded.q_table
-                else:
-                    q_src = loaded
-                if isinstance(q_src, defaultdict):
-                    self.q_table = q_src
-                else:
-                    self.q_table = defaultdict(lambda: np.zeros(2))
-                    self.q_table.update(q_src)
+                from .models import get_model
+                # tabela somente leitura compartilhada pelo cache do processo;
+                # `update_q` copia antes da primeira escrita
+                q, self.model_meta = get_model(pretrained_path)
+                # o modelo foi treinado no seu próprio espaço de estados
+                self.state_space = StateSpace.from_meta(self.model_meta.get("bins", {}))
+                self.q = as_q_store(q)
                 # exploração desligada porque o modelo já está treinado
                 self.epsilon = params.get("epsilon", 0.0)
             except Exception as e:
                 # Falha silenciosa mas controlada: usa Q-table vazia
                 print(f"[QLearningController] Falha ao carregar modelo pré-treinado ({pretrained_path}): {e}")
+
+        qbins, tbins = self.state_space.queue_bins, self.state_space.time_bins
+        self._bins = (qbins, len(qbins), tbins, len(tbins))
+        self._extras = self.state_space.extras if self.state_space.features else None
+        self._tendencia = "trend" in self.state_space.features
+
+        self.policy = None
+        if isinstance(compilada, CompiledPolicy):
+            self.policy = compilada
+        elif compilada:
+            self.compile()
         
+    def reset(self, laneA, laneB, rng=None):
+        """Recomeça um episódio em novas vias mantendo a Q-table
+
+        `rng`, se dado, passa a ser o gerador da exploração epsilon-greedy.
+        """
+        self.laneA = laneA
+        self.laneB = laneB
+        if rng is not None:
+            self.rng = rng
+        self.phase = 'A'
+        self.phase_time = 0
+        self.in_yellow = False
+        self.yellow_timer = 0
+        self.green_times_log = []
+        self.last_state = None
+        self.last_action = None
+        self.previous_queues = (0, 0)
+        self.signals = {}
+
+    @property
+    def q_table(self):
+        """Q-table densa `state_space.shape + (N_ACTIONS,)` (só no armazenamento denso)"""
+        if not isinstance(self.q, DenseQ):
+            raise TypeError("Q-table em hash: use `q` ou `q_array()`")
+        return self.q.array
+
+    @q_table.setter
+    def q_table(self, array):
+        self.q = DenseQ(array)
+
     def discretize_state(self):
         qA = self.laneA.queue_length()
         qB = self.laneB.queue_length()
-        
-        def bin_queue(q):
-            if q <= 2: return 0
-            elif q <= 5: return 1
-            elif q <= 10: return 2
-            elif q <= 20: return 3
-            else: return 4
-        
-        def bin_time(t):
-            if t <= 15: return 0
-            elif t <= 30: return 1
-            elif t <= 60: return 2
-            else: return 3
-        
-        qA_bin = bin_queue(qA)
-        qB_bin = bin_queue(qB)
-        phase_id = 0 if self.phase == 'A' else 1
-        time_bin = bin_time(self.phase_time)
-        
-        return (qA_bin, qB_bin, phase_id, time_bin)
+        t = math.ceil(self.phase_time)
+        # bins por tabela indexada pelos valores brutos (ver `tabela_bins`)
+        qbins, nq, tbins, nt = self._bins
+        estado = (
+            qbins[qA] if qA < nq else qbins[-1],
+            qbins[qB] if qB < nq else qbins[-1],
+            0 if self.phase == 'A' else 1,
+            tbins[t] if t < nt else tbins[-1],
+        )
+        if self._extras is not None:
+            return estado + self._extras(self, qA, qB)
+        return estado
+
+    def compile(self):
+        """Compila a Q-table atual numa `CompiledPolicy` (refazer após treinar)"""
+        space = self.state_space
+        if space.features:
+            raise ValueError(f"política compilada só usa fila e tempo de fase; o estado tem {space.features}")
+        self.policy = CompiledPolicy.from_q_table(self.q_array(), space.queue_edges, space.time_edges)
+        return self.policy
+
+    def q_array(self):
+        """Q-table como array denso `state_space.shape + (N_ACTIONS,)` (estados não visitados = 0)"""
+        return self.q.to_dense()
 
     def select_action(self, state, training=False):
-        if training and random.random() < self.epsilon:
-            return random.randint(0, 1)
+        if training and self.rng.random() < self.epsilon:
+            return self.rng.randint(0, 1)
         else:
-            return np.argmax(self.q_table[state])
+            return np.argmax(self.q.row(state))
+
+    def update_q(self, state, action, reward, next_state):
+        """Atualiza Q-table (Bellman)"""
+        max_next_q = np.max(self.q.row(next_state))
+        # linha gravável: copia a tabela somente leitura / cria o estado no hash
+        linha = self.q.row_mut(state)
+        current_q = linha[action]
+
+        # Q(s,a) ← Q(s,a) + α [r + γ max Q(s',a') - Q(s,a)]
+        linha[action] = current_q + self.alpha * (reward + self.gamma * max_next_q - current_q)
 
     def step(self, dt, training=False, **kwargs):
+        if self._extras is not None:
+            self.signals = kwargs
         if self.in_yellow:
             self.yellow_timer += dt
             if self.yellow_timer >= self.yellow_time:
@@ -140,10 +348,20 @@ class QLearningController:
                 self.phase_time = 0
                 self.in_yellow = False
                 self.yellow_timer = 0
+            self.last_state = None
             return self.phase
         
-        state = self.discretize_state()
-        action = self.select_action(state, training=training)
+        if self.policy is not None and not training:
+            action = self.policy.action(self.laneA.queue_length(), self.laneB.queue_length(),
+                                        self.phase, self.phase_time)
+            self.last_state = None
+        else:
+            state = self.discretize_state()
+            action = self.select_action(state, training=training)
+            self.last_state = state
+        self.last_action = action
+        if self._tendencia:
+            self.previous_queues = (self.laneA.queue_length(), self.laneB.queue_length())
         
         should_switch = (action == 1)
         
@@ -156,4 +374,86 @@ class QLearningController:
         else:
             self.phase_time += dt
         
-        return self.phase
\ No newline at end of file
+        return self.phase
+
+class CompiledPolicy:
+    """
+    Política gulosa compilada: a ação de cada estado num array de inteiros.
+
+    `actions` tem forma `(bins fila A, bins fila B, 2 fases, bins tempo)`,
+    com os bins dados pelos limites inclusivos `queue_edges`/`time_edges`.
+    As tabelas de bins são indexadas pela fila e pelo tempo de fase brutos e
+    já guardam o deslocamento de cada bin no array achatado, então `action`
+    soma quatro deslocamentos e lê uma posição.
+    """
+    def __init__(self, actions, queue_edges=QUEUE_BIN_EDGES, time_edges=TIME_BIN_EDGES):
+        self.queue_edges = tuple(queue_edges)
+        self.time_edges = tuple(time_edges)
+        nq = len(self.queue_edges) + 1
+        nt = len(self.time_edges) + 1
+        self.actions = np.ascontiguousarray(actions, dtype=np.int8)
+        if self.actions.shape != (nq, nq, 2, nt):
+            raise ValueError(f"actions com forma {self.actions.shape}, esperada {(nq, nq, 2, nt)}")
+        passo_a, passo_b, passo_fase, _ = (s // self.actions.itemsize for s in self.actions.strides)
+        bins_fila = tabela_bins(self.queue_edges)
+        self._fila_a = [b * passo_a for b in bins_fila]
+        self._fila_b = [b * passo_b for b in bins_fila]
+        self._fase = {'A': 0, 'B': passo_fase}
+        self._tempo = tabela_bins(self.time_edges)
+        self._acoes = self.actions.ravel().tolist()
+        self._bins_fila = np.asarray(bins_fila)
+        self._bins_tempo = np.asarray(self._tempo)
+
+    @property
+    def standard_bins(self):
+        """Mesmos bins de `QLearningController.discretize_state`"""
+        return self.queue_edges == QUEUE_BIN_EDGES and self.time_edges == TIME_BIN_EDGES
+
+    def action(self, qA, qB, phase, phase_time):
+        """Ação gulosa (0 manter, 1 trocar) com a fase verde `phase` ('A'/'B')"""
+        fila_a, fila_b, tempo = self._fila_a, self._fila_b, self._tempo
+        t = math.ceil(phase_time)
+        return self._acoes[
+            (fila_a[qA] if qA < len(fila_a) else fila_a[-1])
+            + (fila_b[qB] if qB < len(fila_b) else fila_b[-1])
+            + self._fase[phase]
+            + (tempo[t] if t < len(tempo) else tempo[-1])
+        ]
+
+    def actions_for(self, qA, qB, phase_id, phase_time):
+        """Versão vetorizada de `action` (arrays; `phase_id` 0 para A, 1 para B)"""
+        bins_fila, bins_tempo = self._bins_fila, self._bins_tempo
+        t = np.ceil(phase_time).astype(np.int64)
+        return self.actions[
+            bins_fila[np.minimum(qA, len(bins_fila) - 1)],
+            bins_fila[np.minimum(qB, len(bins_fila) - 1)],
+            phase_id,
+            bins_tempo[np.minimum(t, len(bins_tempo) - 1)],
+        ]
+
+    @classmethod
+    def from_q_table(cls, q_table, queue_edges=QUEUE_BIN_EDGES, time_edges=TIME_BIN_EDGES):
+        """Ação de maior valor de cada estado (empates ficam com manter, como `select_action`)"""
+        return cls(np.argmax(q_table, axis=-1), queue_edges, time_edges)
+
+    @classmethod
+    def from_actuated(cls, params):
+        """
+        Regra de `ActuatedController` sem ruído e com verde máximo fixo: trocar
+        quando a via verde tem no máximo 1 veículo, a outra tem demanda e o
+        verde já passou de `g_min`, ou quando chega a `g_max`.
+        """
+        g_min = params.get('g_min', 16)
+        g_max = params.get('g_max', 90)
+        # fila: 0, 1, 2+; tempo: antes de g_min, até g_max, a partir de g_max
+        queue_edges = (0, 1)
+        time_edges = (g_min - 1, g_max - 1)
+        actions = np.zeros((3, 3, 2, 3), dtype=np.int8)
+        for qa in range(3):
+            for qb in range(3):
+                for fase in range(2):
+                    atual, outra = (qa, qb) if fase == 0 else (qb, qa)
+                    actions[qa, qb, fase, 1] = atual <= 1 and outra >= 1
+                    actions[qa, qb, fase, 2] = 1
+        return cls(actions, queue_edges, time_edges)
+
@@ -0,0 +1,403 @@
+"""
+Ambiente no estilo Gymnasium do cruzamento de duas vias: `python -m src.env`.
+
+`TrafficEnv` embrulha as duas vias e a máquina de fases do
+`QLearningController` (amarelo, `g_min`, `g_max`), com a ação vinda de fora:
+- `reset(seed=None, options=None) -> (obs, info)`;
+- `step(action) -> (obs, reward, terminated, truncated, info)`, ação 0 mantém
+  a fase e 1 pede a troca (ignorada durante o amarelo, como no controlador).
+
+A observação é a tupla de `discretize_state` no espaço de estados de
+`params["state_space"]` (ver `StateSpace`; `StateSpace.index` a achata),
+como array int64. A recompensa é menos a espera acumulada no tick (veículos
+parados x dt); `reward="training"` usa a de `src.training`. O episódio é
+truncado em `duration` segundos (padrão `params["duracao_sec"]`) e nunca
+termina antes. Os sorteios seguem os substreams de `run_simulation`: cada
+`reset` usa um `SimRNG` filho da semente dada no último `reset(seed=...)`.
+
+`VectorEnv(n)` roda `n` ambientes por chamada no processo;
+`AsyncVectorEnv(n, workers)` divide-os entre processos, que leem as ações e
+escrevem observações, recompensas e flags num segmento de memória
+compartilhada (pelo pipe só passa o comando). Os dois reiniciam sozinhos o
+ambiente que acaba: a observação devolvida já é a do episódio novo, e a
+última do episódio e o retorno ficam em `info["final_obs"]` e
+`info["episode_return"]` (válidos onde `terminated | truncated`).
+
+Gymnasium não é dependência: `observation_space`/`action_space` importam
+`gymnasium.spaces` só quando pedidos.
+
+Uso:
+    python -m src.env --envs 1 8 64 --steps 20000 --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .arrivals import PoissonArrivals
+from .controllers import N_ACTIONS, QLearningController
+from .rng import SimRNG
+from .simulation import ArrayLane, Lane
+from .utils import DEFAULT_PARAMS, detectar_pedestre, detectar_prioridade
+
+REWARDS = ("wait", "training")
+ENGINES = {'object': Lane, 'array': ArrayLane}
+
+
+class _Sinal(QLearningController):
+    """`QLearningController` que aplica a ação escolhida pelo agente do ambiente"""
+    action = 0
+
+    def select_action(self, state, training=False):
+        return self.action
+
+
+class TrafficEnv:
+    """Cruzamento de duas vias com a interface `reset`/`step` do Gymnasium"""
+    def __init__(self, params=None, duration=None, lane_cls=Lane, reward="wait"):
+        if reward not in REWARDS:
+            raise ValueError(f"recompensa desconhecida: {reward!r} (use {REWARDS})")
+        self.params = {**DEFAULT_PARAMS, **(params or {})}
+        self.duration = duration if duration is not None else self.params['duracao_sec']
+        self.lane_cls = lane_cls
+        self.reward = reward
+        self.signal = _Sinal(None, None, {k: v for k, v in self.params.items() if k != "pretrained_path"})
+        self.state_space = self.signal.state_space
+        # detectores só são sorteados se a observação os usa
+        self.detectors = bool({"v2i", "ped"} & set(self.state_space.features))
+        self._sementes = None
+        self.options = {}
+        self.t = 0
+
+    @property
+    def observation_space(self):
+        from gymnasium import spaces
+        return spaces.MultiDiscrete(self.state_space.shape)
+
+    @property
+    def action_space(self):
+        from gymnasium import spaces
+        return spaces.Discrete(N_ACTIONS)
+
+    def reset(self, seed=None, options=None):
+        """Começa um episódio
+
+        `options` pode trocar `media_a`/`media_b` (veíc/min); elas valem
+        também para os resets seguintes, inclusive o autoreset dos ambientes
+        vetorizados, até outro `reset` com `options`.
+        """
+        obs = self._reset(seed, options)
+        return np.array(obs, dtype=np.int64), {"t": self.t}
+
+    def step(self, action):
+        obs, reward, truncated, passed = self._step(action)
+        return np.array(obs, dtype=np.int64), reward, False, truncated, {"t": self.t, "passed": passed}
+
+    def _reset(self, seed=None, options=None):
+        if seed is not None or self._sementes is None:
+            self._sementes = np.random.SeedSequence(seed)
+        rng = SimRNG(self._sementes.spawn(1)[0])
+        if options is not None:
+            self.options = options
+        p = {**self.params, **self.options}
+        self.arrivals = PoissonArrivals(p['media_a'], p['media_b'], rng=rng.stream("arrivals"))
+        self._detectores = rng.stream("detectors")
+        self.laneA = self.lane_cls("A", rng=rng.stream("lane_A"))
+        self.laneB = self.lane_cls("B", rng=rng.stream("lane_B"))
+        self.signal.reset(self.laneA, self.laneB, rng=rng.stream("sensor"))
+        self.t = 0
+        self.vehicle_id = 0
+        self.episode_return = 0.0
+        return self._chegadas()
+
+    def _chegadas(self):
+        """Chegadas (e detectores) do tick atual; devolve a observação da decisão"""
+        p = self.params
+        dt = p['dt']
+        chegA, chegB = self.arrivals.counts(self.t, dt)
+        self.laneA.add_vehicles(chegA, self.vehicle_id, bus_prob=p.get('prob_prioridade', 0.0))
+        self.vehicle_id += chegA
+        self.laneB.add_vehicles(chegB, self.vehicle_id, bus_prob=p.get('prob_prioridade', 0.0))
+        self.vehicle_id += chegB
+        self.sinais = {}
+        if self.detectors:
+            d = self._detectores
+            self.sinais = self.signal.signals = {
+                "ped_A": detectar_pedestre(p['prob_pedestre'] * dt, d),
+                "ped_B": detectar_pedestre(p['prob_pedestre'] * dt, d),
+                "v2i_A": detectar_prioridade(p['prob_prioridade'] * dt, d),
+                "v2i_B": detectar_prioridade(p['prob_prioridade'] * dt, d),
+            }
+        return self.signal.discretize_state()
+
+    def _step(self, action):
+        """Um tick: `(obs em tupla, recompensa, truncado, veículos atendidos)`"""
+        p = self.params
+        dt = p['dt']
+        c = self.signal
+        c.action = action
+        phase = c.step(dt, **self.sinais)
+        pA, wA = self.laneA.step_logic(phase == 'A', dt, p['taxa_escoamento'])
+        pB, wB = self.laneB.step_logic(phase == 'B', dt, p['taxa_escoamento'])
+        if self.reward == "wait":
+            reward = float(-(self.laneA.stopped + self.laneB.stopped) * dt)
+        else:
+            reward = -(wA + wB) - (self.laneA.queue_length() + self.laneB.queue_length()) * 0.1
+        self.episode_return += reward
+        self.t += dt
+        truncated = self.t >= self.duration
+        obs = c.discretize_state() if truncated else self._chegadas()
+        return obs, reward, truncated, pA + pB
+
+
+def _layout(n, d):
+    """Arrays trocados pelos ambientes vetorizados: nome -> (shape, dtype)"""
+    return {
+        "obs": ((n, d), np.int64),
+        "final_obs": ((n, d), np.int64),
+        "actions": ((n,), np.int64),
+        "rewards": ((n,), np.float64),
+        "episode_return": ((n,), np.float64),
+        "terminated": ((n,), np.bool_),
+        "truncated": ((n,), np.bool_),
+    }
+
+
+def _buffers(n, d, buf=None):
+    """Arrays de `_layout` em memória própria ou lado a lado em `buf`"""
+    out = {}
+    offset = 0
+    for nome, (shape, dtype) in _layout(n, d).items():
+        if buf is None:
+            out[nome] = np.zeros(shape, dtype=dtype)
+        else:
+            out[nome] = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return out
+
+
+def _nbytes(n, d):
+    return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype in _layout(n, d).values())
+
+
+class VectorEnv:
+    """`n` ambientes avançando juntos no processo, com autoreset
+
+    Devolve arrays `(n, ...)`; com `copy=False` são os próprios buffers,
+    sobrescritos na chamada seguinte.
+    """
+    def __init__(self, n, copy=True, buffers=None, **env_kwargs):
+        self.envs = [TrafficEnv(**env_kwargs) for _ in range(n)]
+        self.n = n
+        self.copy = copy
+        self.state_space = self.envs[0].state_space
+        self.buffers = buffers or _buffers(n, len(self.state_space.shape))
+
+    def _saida(self, *nomes):
+        b = self.buffers
+        return tuple(b[k].copy() if self.copy else b[k] for k in nomes)
+
+    def _info(self):
+        return dict(zip(("final_obs", "episode_return"), self._saida("final_obs", "episode_return")))
+
+    def reset(self, seed=None, options=None):
+        """Reinicia todos; com `seed` o ambiente i usa `seed + i`"""
+        obs = self.buffers["obs"]
+        for i, env in enumerate(self.envs):
+            obs[i] = env._reset(None if seed is None else seed + i, options)
+        self.buffers["terminated"][:] = False
+        self.buffers["truncated"][:] = False
+        return self._saida("obs")[0], {}
+
+    def step(self, actions):
+        b = self.buffers
+        if actions is not b["actions"]:
+            b["actions"][:] = actions
+        self._step()
+        obs, rewards, terminated, truncated = self._saida("obs", "rewards", "terminated", "truncated")
+        return obs, rewards, terminated, truncated, self._info()
+
+    def _step(self):
+        b = self.buffers
+        obs, rewards, truncados = b["obs"], b["rewards"], b["truncated"]
+        for i, (env, action) in enumerate(zip(self.envs, b["actions"].tolist())):
+            o, rewards[i], fim, _ = env._step(action)
+            truncados[i] = fim
+            if fim:
+                b["final_obs"][i] = o
+                b["episode_return"][i] = env.episode_return
+                o = env._reset()
+            obs[i] = o
+
+    def close(self):
+        pass
+
+
+def _worker(lo, hi, env_kwargs, shm_name, n, d, conn):
+    """Processo com os ambientes `lo .. hi - 1`, lendo e escrevendo na memória compartilhada"""
+    shm = SharedMemory(name=shm_name)
+    venv = None
+    try:
+        todos = _buffers(n, d, shm.buf)
+        venv = VectorEnv(hi - lo, copy=False, buffers={k: v[lo:hi] for k, v in todos.items()}, **env_kwargs)
+        todos = None
+        while True:
+            cmd, arg = conn.recv()
+            if cmd == "step":
+                venv._step()
+            elif cmd == "reset":
+                seed, options = arg
+                venv.reset(None if seed is None else seed + lo, options)
+            elif cmd == "close":
+                break
+            conn.send(None)
+    except BaseException as e:
+        conn.send(e)
+    finally:
+        venv = None  # libera as views antes de fechar o segmento
+        shm.close()
+        conn.close()
+
+
+def _fechar(processos, conexoes, shm):
+    for conn in conexoes:
+        try:
+            conn.send(("close", None))
+        except (BrokenPipeError, OSError):
+            pass
+    for p in processos:
+        p.join(timeout=5)
+        if p.is_alive():
+            p.terminate()
+    try:
+        shm.close()
+    except BufferError:
+        pass  # ainda há views (`copy=False`) fora daqui; o segmento some com elas
+    shm.unlink()
+
+
+class AsyncVectorEnv:
+    """`n` ambientes divididos entre `workers` processos, trocando dados por memória compartilhada
+
+    Mesma interface de `VectorEnv`, mais `step_async`/`step_wait` para
+    sobrepor a decisão do agente com a simulação. Feche com `close()` (ou
+    use como gerenciador de contexto).
+    """
+    def __init__(self, n, workers=None, copy=True, **env_kwargs):
+        workers = max(1, min(n, workers or os.cpu_count()))
+        self.n = n
+        self.copy = copy
+        self.state_space = TrafficEnv(**env_kwargs).state_space
+        d = len(self.state_space.shape)
+        self._shm = SharedMemory(create=True, size=_nbytes(n, d))
+        self.buffers = _buffers(n, d, self._shm.buf)
+        cortes = np.linspace(0, n, workers + 1).astype(int)
+        ctx = mp.get_context()
+        self._conexoes = []
+        self._processos = []
+        for lo, hi in zip(cortes[:-1], cortes[1:]):
+            pai, filho = ctx.Pipe()
+            p = ctx.Process(target=_worker, args=(int(lo), int(hi), env_kwargs, self._shm.name, n, d, filho),
+                            daemon=True)
+            p.start()
+            filho.close()
+            self._conexoes.append(pai)
+            self._processos.append(p)
+        self._finalizar = weakref.finalize(self, _fechar, self._processos, self._conexoes, self._shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    _saida = VectorEnv._saida
+    _info = VectorEnv._info
+
+    def _enviar(self, cmd, arg=None):
+        for conn in self._conexoes:
+            conn.send((cmd, arg))
+
+    def _esperar(self):
+        erros = [r for r in (conn.recv() for conn in self._conexoes) if r is not None]
+        if erros:
+            raise erros[0]
+
+    def reset(self, seed=None, options=None):
+        self._enviar("reset", (seed, options))
+        self._esperar()
+        return self._saida("obs")[0], {}
+
+    def step_async(self, actions):
+        self.buffers["actions"][:] = actions
+        self._enviar("step")
+
+    def step_wait(self):
+        self._esperar()
+        obs, rewards, terminated, truncated = self._saida("obs", "rewards", "terminated", "truncated")
+        return obs, rewards, terminated, truncated, self._info()
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self._finalizar.alive:
+            self.buffers = None  # libera as views antes de fechar o segmento
+            self._finalizar()
+
+
+def medir(n_envs, mode="sync", steps=20_000, workers=None, seed=0, **env_kwargs):
+    """Passos de ambiente por segundo com ações aleatórias (`steps` no total)"""
+    if mode == "single":
+        env = TrafficEnv(**env_kwargs)
+        env.reset(seed=seed)
+        acoes = np.random.default_rng(seed).integers(0, N_ACTIONS, steps).tolist()
+        inicio = time.perf_counter()
+        for a in acoes:
+            _, _, _, truncated, _ = env.step(a)
+            if truncated:
+                env.reset()
+        return steps / (time.perf_counter() - inicio)
+    cls = AsyncVectorEnv if mode == "async" else VectorEnv
+    kwargs = {"workers": workers} if mode == "async" else {}
+    venv = cls(n_envs, copy=False, **kwargs, **env_kwargs)
+    try:
+        venv.reset(seed=seed)
+        rng = np.random.default_rng(seed)
+        chamadas = max(1, steps // n_envs)
+        acoes = rng.integers(0, N_ACTIONS, (chamadas, n_envs))
+        inicio = time.perf_counter()
+        for a in acoes:
+            venv.step(a)
+        return chamadas * n_envs / (time.perf_counter() - inicio)
+    finally:
+        venv.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.env",
+                                     description="Vazão (passos de ambiente/s) de TrafficEnv, VectorEnv e AsyncVectorEnv")
+    parser.add_argument("--envs", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--steps", type=int, default=20_000, help="passos de ambiente por medida")
+    parser.add_argument("--workers", type=int, default=None, help="processos do AsyncVectorEnv (padrão: CPUs)")
+    parser.add_argument("--engine", default="object", choices=ENGINES)
+    parser.add_argument("--state-space", default=None, help="preset de STATE_SPACES para a observação")
+    args = parser.parse_args(argv)
+    env_kwargs = {"lane_cls": ENGINES[args.engine]}
+    if args.state_space:
+        env_kwargs["params"] = {"state_space": args.state_space}
+    print(f"{'envs':>5} {'modo':>7} {'passos/s':>12}")
+    for n in args.envs:
+        modos = ("single", "sync", "async") if n == 1 else ("sync", "async")
+        for modo in modos:
+            vazao = medir(n, modo, args.steps, args.workers, **env_kwargs)
+            print(f"{n:>5} {modo:>7} {vazao:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
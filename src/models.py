@@ -0,0 +1,321 @@
+"""
+Formato compacto dos modelos Q-Learning.
+
+Um modelo é um `.npz` sem compressão com dois membros:
+- `q`: a Q-table densa `STATE_SHAPE + (N_ACTIONS,)` em float64;
+- `meta`: JSON com versão do formato, bins de discretização,
+  hiperparâmetros e procedência do treinamento.
+
+Modelos de outros espaços de estados (`StateSpace`) descrevem os bins e as
+features em `meta["bins"]` e têm `q` no formato do espaço; se a Q-table está
+em hash (`meta["q_storage"] == "hash"`), `q` tem só as linhas ocupadas e o
+membro `keys` as chaves da tabela (`VAZIO` nas posições livres).
+
+Como o membro `q` fica armazenado sem compressão, ele pode ser mapeado em
+memória direto do arquivo (`load_q_model(path, mmap=True)`).
+
+Os `.pkl` antigos (o agente inteiro do notebook, com vias e histórico) são
+lidos por um unpickler restrito e convertidos com:
+    python -m src.models convert models/*.pkl
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+import zipfile
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .controllers import N_ACTIONS, STATE_SPACES, StateSpace
+from .qstore import VAZIO, DenseQ, HashQ
+
+FORMAT_VERSION = 1
+MODEL_SUFFIX = ".npz"
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+# Modelo padrão da entrega (commitado em `models/`)
+DEFAULT_MODEL_NAME = "qlearning_agent_20251202_103052_10k.npz"
+HYPERPARAMS = ("alpha", "gamma", "epsilon", "epsilon_decay", "epsilon_min", "g_min", "g_max", "yellow_time")
+
+
+def default_meta(state_space=None, **extra):
+    """Metadados base de um modelo no formato atual"""
+    state_space = state_space or STATE_SPACES["default"]
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "state_shape": list(state_space.shape),
+        "n_actions": N_ACTIONS,
+        "bins": state_space.to_meta(),
+        "hyperparams": {},
+        "provenance": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+    }
+    meta.update(extra)
+    return meta
+
+
+def _espaco(meta):
+    return StateSpace.from_meta(meta.get("bins", {}))
+
+
+def save_q_model(path, q, meta=None):
+    """Grava a Q-table (array, `DenseQ` ou `HashQ`) e os metadados em `path` (.npz sem compressão)"""
+    meta = default_meta() if meta is None else meta
+    shape = tuple(_espaco(meta).shape)
+    membros = {}
+    if isinstance(q, HashQ):
+        ocupadas = q.keys != VAZIO
+        meta = {**meta, "q_storage": "hash", "hash_capacity": q.capacity}
+        membros["keys"] = q.keys
+        membros["q"] = q.values[ocupadas]
+        formato = q.shape
+    else:
+        q = np.asarray(q.array if isinstance(q, DenseQ) else q, dtype=np.float64)
+        membros["q"] = q
+        formato = q.shape[:-1]
+    if tuple(formato) != shape:
+        raise ValueError(f"Q-table com formato {tuple(formato)}, esperado {shape} pelos bins dos metadados")
+    with open(path, "wb") as f:
+        np.savez(f, **membros, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+
+
+def _mmap_member(path, name):
+    """Mapeia em memória um membro `.npy` armazenado sem compressão num `.npz`"""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{path}: membro '{name}' comprimido não pode ser mapeado")
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", local[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran else "C")
+
+
+def load_q_model(path, mmap=False):
+    """Lê um modelo `.npz`; devolve `(q, meta)`
+
+    Com `mmap=True` a Q-table é um `np.memmap` somente leitura.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        q = None if mmap else data["q"]
+        keys = data["keys"] if "keys" in data.files else None
+    if meta.get("format_version", 0) > FORMAT_VERSION:
+        raise ValueError(f"{path}: formato {meta['format_version']} mais novo que o suportado ({FORMAT_VERSION})")
+    shape = _espaco(meta).shape
+    if mmap:
+        q = _mmap_member(path, "q")
+    if meta.get("q_storage") == "hash":
+        # Q em hash: remonta a tabela a partir das linhas ocupadas
+        valores = np.zeros((len(keys), N_ACTIONS))
+        valores[keys != VAZIO] = q
+        return HashQ.from_arrays(shape, keys, valores), meta
+    if q.shape != shape + (N_ACTIONS,):
+        raise ValueError(f"{path}: Q-table com formato {q.shape}, esperado {shape + (N_ACTIONS,)}")
+    return q, meta
+
+
+class _LegacyObject:
+    """Substituto inerte das classes do notebook (`__main__.QLearningController` etc.)"""
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Unpickler que só aceita os tipos presentes nos modelos antigos"""
+    ALLOWED = {
+        ("collections", "deque"): deque,
+        ("collections", "defaultdict"): defaultdict,
+        ("numpy", "dtype"): np.dtype,
+        ("numpy", "ndarray"): np.ndarray,
+    }
+
+    def find_class(self, module, name):
+        if module == "__main__" and name in ("QLearningController", "Lane", "Vehicle"):
+            return _LegacyObject
+        if (module, name) in self.ALLOWED:
+            return self.ALLOWED[(module, name)]
+        if module in ("numpy.core.multiarray", "numpy._core.multiarray") and name in ("_reconstruct", "scalar"):
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"tipo não permitido em modelo legado: {module}.{name}")
+
+
+def load_legacy_pickle(path):
+    """Lê um `.pkl` antigo sem executar código arbitrário; devolve `(q, meta)`"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    loaded = _LegacyUnpickler(io.BytesIO(raw)).load()
+    q_src = getattr(loaded, "q_table", loaded)
+    q = np.zeros(STATE_SPACES["default"].shape + (N_ACTIONS,))
+    for state, values in dict(q_src).items():
+        q[tuple(state)] = values
+
+    meta = default_meta()
+    meta["hyperparams"] = {k: getattr(loaded, k) for k in HYPERPARAMS if hasattr(loaded, k)}
+    meta["provenance"].update({
+        "source": os.path.basename(path),
+        "source_sha256": hashlib.sha256(raw).hexdigest(),
+        "converted_from": "pickle",
+        "states_visited": len(q_src),
+    })
+    return q, meta
+
+
+def load_any(path, mmap=False):
+    """Carrega um modelo no formato atual ou um `.pkl` legado"""
+    if path.endswith(".pkl"):
+        return load_legacy_pickle(path)
+    return load_q_model(path, mmap=mmap)
+
+
+class ModelCache:
+    """
+    Cache de modelos por processo, com despejo LRU.
+
+    A chave é `(caminho real, mtime, tamanho)`: regravar o arquivo invalida
+    a entrada sozinho. A Q-table devolvida é somente leitura e compartilhada
+    entre todos os controladores; quem for treinar faz a própria cópia.
+    """
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(path, mmap):
+        st = os.stat(path)
+        return (os.path.realpath(path), st.st_mtime_ns, st.st_size, mmap)
+
+    def get(self, path, mmap=False):
+        """Devolve `(q, meta)` do modelo em `path`, lendo o arquivo só na primeira vez"""
+        key = self._key(path, mmap)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        q, meta = load_any(path, mmap=mmap)
+        if not isinstance(q, np.memmap):
+            q.setflags(write=False)
+        entry = (q, meta)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+MODEL_CACHE = ModelCache()
+
+
+def get_model(path, mmap=False):
+    """Atalho para `MODEL_CACHE.get`"""
+    return MODEL_CACHE.get(path, mmap=mmap)
+
+
+def find_model(models_dir=MODELS_DIR, name=DEFAULT_MODEL_NAME):
+    """Caminho do modelo padrão ou, sem ele, do `qlearning_agent_*` mais recente (None se não houver)
+
+    Aceita `.npz` e `.pkl` legados (convertidos na carga).
+    """
+    path = os.path.join(models_dir, name)
+    if os.path.exists(path):
+        return path
+    if not os.path.isdir(models_dir):
+        return None
+    candidatos = sorted(
+        f for f in os.listdir(models_dir)
+        if f.startswith("qlearning_agent_") and f.endswith((MODEL_SUFFIX, ".pkl"))
+    )
+    # o timestamp no nome deixa o mais recente por último
+    return os.path.join(models_dir, candidatos[-1]) if candidatos else None
+
+
+def convert_pickle(path, out=None):
+    """Converte um `.pkl` legado para o formato `.npz`; devolve o caminho gerado"""
+    q, meta = load_legacy_pickle(path)
+    out = out or os.path.splitext(path)[0] + MODEL_SUFFIX
+    save_q_model(out, q, meta)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.models", description="Ferramentas de modelos Q-Learning")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_conv = sub.add_parser("convert", help="converte modelos .pkl legados para .npz")
+    p_conv.add_argument("paths", nargs="+")
+    p_info = sub.add_parser("info", help="mostra os metadados de um modelo")
+    p_info.add_argument("path")
+    p_bench = sub.add_parser("bench", help="mede a construção do QLearningController com e sem cache")
+    p_bench.add_argument("path")
+    p_bench.add_argument("-n", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "convert":
+        for path in args.paths:
+            out = convert_pickle(path)
+            print(f"{path} ({os.path.getsize(path)} B) -> {out} ({os.path.getsize(out)} B)")
+    elif args.cmd == "info":
+        q, meta = load_any(args.path)
+        print(json.dumps(meta, indent=2, ensure_ascii=False))
+        n_states = _espaco(meta).n_states
+        if isinstance(q, HashQ):
+            print(f"estados guardados (hash): {len(q)}/{n_states} | {q.nbytes / 2**20:.2f} MB")
+        else:
+            print(f"estados com valores: {int(np.any(q != 0, axis=-1).sum())}/{n_states}")
+    elif args.cmd == "bench":
+        from .controllers import QLearningController
+        # o controlador usa o cache de `src.models`, não o deste `__main__`
+        from .models import MODEL_CACHE as cache
+        params = {"pretrained_path": args.path}
+        inicio = time.perf_counter()
+        for _ in range(args.n):
+            cache.clear()
+            QLearningController(None, None, params)
+        frio = (time.perf_counter() - inicio) / args.n
+        inicio = time.perf_counter()
+        for _ in range(args.n):
+            QLearningController(None, None, params)
+        quente = (time.perf_counter() - inicio) / args.n
+        print(f"construção sem cache: {frio * 1e6:.1f} µs | com cache: {quente * 1e6:.1f} µs "
+              f"({frio / quente:.0f}x) | {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Comparação de controladores em várias sementes, em paralelo.
+
+Cada replicação `i` roda todos os controladores com o mesmo gerador
+(`SimRNG(base_seed).spawn(1, start=i)`), então as chegadas são as mesmas e
+as diferenças entre controladores são pareadas por replicação. As
+replicações rodam num pool de processos e entram nas estatísticas em ordem
+de índice, então o resultado (e o ponto de parada) não depende do número de
+workers.
+
+`MonteCarlo` reporta média ± intervalo de confiança (t de Student) de
+`METRICS` por controlador e das diferenças pareadas em relação ao primeiro
+controlador. Com `ci_target`, para assim que a meia largura do intervalo das
+diferenças de `stop_metric` fica abaixo do alvo (após `min_seeds`
+replicações) e cancela as que ainda não começaram.
+
+Uso:
+    python -m src.montecarlo --seeds 100 --ci-target 0.5 --set media_a=30
+"""
+import argparse
+import math
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from statistics import NormalDist
+
+import numpy as np
+
+from .controllers import ActuatedController, QLearningController
+from .rng import SimRNG
+from .utils import DEFAULT_PARAMS, converter_valor, run_simulation
+
+CONTROLLERS = {
+    'actuated': ActuatedController,
+    'qlearning': QLearningController,
+}
+METRICS = ("total_passed", "avg_wait", "max_wait")
+
+
+def quantil_t(p, gl):
+    """Quantil `p` da t de Student com `gl` graus de liberdade
+
+    Expansão de Cornish-Fisher em torno da normal (erro abaixo de 1% a
+    partir de 3 graus de liberdade), para não depender do scipy.
+    """
+    z = NormalDist().inv_cdf(p)
+    z2 = z * z
+    termos = (
+        (z2 + 1) * z / 4,
+        ((5 * z2 + 16) * z2 + 3) * z / 96,
+        (((3 * z2 + 19) * z2 + 17) * z2 - 15) * z / 384,
+        ((((79 * z2 + 776) * z2 + 1482) * z2 - 1920) * z2 - 945) * z / 92160,
+    )
+    return z + sum(termo / gl ** (k + 1) for k, termo in enumerate(termos))
+
+
+def intervalo(valores, confidence=0.95):
+    """Média, desvio e intervalo de confiança da média de `valores`"""
+    x = np.asarray(valores, dtype=float)
+    n = len(x)
+    media = float(x.mean()) if n else math.nan
+    desvio = float(x.std(ddof=1)) if n > 1 else math.nan
+    meia = quantil_t(0.5 + confidence / 2, n - 1) * desvio / math.sqrt(n) if n > 1 else math.inf
+    return {"mean": media, "std": desvio, "half_width": meia,
+            "ci_low": media - meia, "ci_high": media + meia, "n": n}
+
+
+def _replicacao(controllers, base_seed, i, detectors):
+    """Roda a replicação `i` de todos os controladores num worker"""
+    linha = {}
+    for nome, (cls, params) in controllers.items():
+        rng = SimRNG(base_seed).spawn(1, start=i)[0]
+        r = run_simulation(cls, params, detectors=detectors, rng=rng)
+        linha[nome] = {m: float(r[m]) for m in METRICS}
+    return linha
+
+
+class MonteCarlo:
+    """
+    Replicações de `controllers` (`{nome: (classe, params)}`) até `seeds`.
+
+    `start` submete as primeiras replicações ao `executor` (ou a um pool
+    próprio de `workers` processos); `poll(timeout)` recolhe as que
+    terminaram, submete as próximas e devolve `done`. `summary()` pode ser
+    lido a qualquer momento, e `history` guarda, a cada replicação
+    incorporada, o intervalo das diferenças de `stop_metric`.
+    """
+    def __init__(self, controllers, seeds=30, base_seed=42, confidence=0.95, min_seeds=5,
+                 ci_target=None, stop_metric="avg_wait", detectors=True, executor=None, workers=None):
+        if seeds < 1:
+            raise ValueError(f"seeds deve ser ao menos 1 (recebido {seeds})")
+        self.controllers = dict(controllers)
+        self.nomes = list(self.controllers)
+        self.seeds = seeds
+        self.base_seed = base_seed
+        self.confidence = confidence
+        self.min_seeds = max(4, min_seeds)
+        self.ci_target = ci_target
+        self.stop_metric = stop_metric
+        self.detectors = detectors
+        self.workers = workers or os.cpu_count()
+        self._executor = executor
+        self._proprio = executor is None
+        self.valores = {nome: {m: [] for m in METRICS} for nome in self.nomes}
+        self.history = []
+        self.stopped_early = False
+        self.done = False
+        self._proxima = 0
+        self._em_voo = {}
+        self._prontas = {}
+
+    def _submeter(self):
+        limite = 2 * self.workers
+        while len(self._em_voo) < limite and self._proxima < self.seeds:
+            fut = self._executor.submit(_replicacao, self.controllers, self.base_seed,
+                                        self._proxima, self.detectors)
+            self._em_voo[fut] = self._proxima
+            self._proxima += 1
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._submeter()
+        return self
+
+    @property
+    def n(self):
+        return len(self.valores[self.nomes[0]][METRICS[0]])
+
+    def _incorporar(self):
+        # só a sequência contígua de índices, para não depender da ordem de término
+        while self.n in self._prontas and not self.done:
+            linha = self._prontas.pop(self.n)
+            for nome in self.nomes:
+                for m in METRICS:
+                    self.valores[nome][m].append(linha[nome][m])
+            self._registrar()
+            if self.n >= self.seeds or self._convergiu():
+                self.stopped_early = self.n < self.seeds
+                self._encerrar()
+
+    def _registrar(self):
+        for par, diffs in self.differences().items():
+            ci = diffs[self.stop_metric]
+            self.history.append({"n": self.n, "pair": par, **ci})
+        if len(self.nomes) == 1:
+            ci = self._intervalo(self.valores[self.nomes[0]][self.stop_metric])
+            self.history.append({"n": self.n, "pair": self.nomes[0], **ci})
+
+    def _convergiu(self):
+        if self.ci_target is None or self.n < self.min_seeds:
+            return False
+        larguras = [d[self.stop_metric]["half_width"] for d in self.differences().values()]
+        if len(self.nomes) == 1:
+            larguras = [self._intervalo(self.valores[self.nomes[0]][self.stop_metric])["half_width"]]
+        return max(larguras) <= self.ci_target
+
+    def _encerrar(self):
+        self.done = True
+        for fut in self._em_voo:
+            fut.cancel()
+        self._em_voo = {}
+        self._prontas = {}
+        if self._proprio and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def poll(self, timeout=None):
+        """Espera até `timeout` segundos por replicações; devolve `done`"""
+        if self.done:
+            return True
+        prontos, _ = wait(self._em_voo, timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in prontos:
+            i = self._em_voo.pop(fut)
+            self._prontas[i] = fut.result()
+        self._incorporar()
+        if not self.done:
+            self._submeter()
+        return self.done
+
+    def run(self, progress=None):
+        """Roda até o fim; `progress(self)` é chamado a cada replicação incorporada"""
+        self.start()
+        visto = 0
+        try:
+            while not self.poll():
+                if progress and self.n != visto:
+                    visto = self.n
+                    progress(self)
+        finally:
+            if not self.done:
+                self._encerrar()
+        if progress:
+            progress(self)
+        return self.summary()
+
+    def cancel(self):
+        if not self.done:
+            self._encerrar()
+
+    def _intervalo(self, valores):
+        return intervalo(valores, self.confidence)
+
+    def differences(self):
+        """Diferenças pareadas `outro - referência` (o primeiro controlador)"""
+        ref = self.nomes[0]
+        out = {}
+        for nome in self.nomes[1:]:
+            out[f"{nome} - {ref}"] = {
+                m: self._intervalo(np.subtract(self.valores[nome][m], self.valores[ref][m]))
+                for m in METRICS
+            }
+        return out
+
+    def summary(self):
+        return {
+            "n": self.n,
+            "seeds": self.seeds,
+            "confidence": self.confidence,
+            "done": self.done,
+            "stopped_early": self.stopped_early,
+            "controllers": {nome: {m: self._intervalo(v) for m, v in metricas.items()}
+                            for nome, metricas in self.valores.items()},
+            "differences": self.differences(),
+        }
+
+
+def formatar(summary):
+    """Tabela de texto de `summary()`"""
+    pct = round(100 * summary["confidence"])
+    linhas = [f"{summary['n']} replicações (IC {pct}%)"
+              + (" | parou cedo" if summary["stopped_early"] else "")]
+    grupos = list(summary["controllers"].items()) + list(summary["differences"].items())
+    for nome, metricas in grupos:
+        campos = " | ".join(f"{m} {c['mean']:8.2f} ± {c['half_width']:6.2f}" for m, c in metricas.items())
+        linhas.append(f"{nome:>22}: {campos}")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.montecarlo", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--controllers", nargs="+", default=list(CONTROLLERS), choices=list(CONTROLLERS))
+    parser.add_argument("--seeds", type=int, default=30, help="máximo de replicações")
+    parser.add_argument("--base-seed", type=int, default=42)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--min-seeds", type=int, default=5)
+    parser.add_argument("--ci-target", type=float,
+                        help="para quando a meia largura do IC das diferenças fica abaixo deste valor")
+    parser.add_argument("--stop-metric", default="avg_wait", choices=METRICS)
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALOR")
+    parser.add_argument("--model", help="modelo Q-Learning (padrão: o mesmo do app)")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    if args.seeds < 1:
+        parser.error("--seeds deve ser ao menos 1")
+
+    from .models import find_model
+    params = dict(DEFAULT_PARAMS)
+    params.update({k: converter_valor(v) for k, v in (item.split("=", 1) for item in args.set)})
+    model = args.model or find_model()
+    controllers = {}
+    for nome in args.controllers:
+        p = params
+        if nome == "qlearning" and model:
+            p = {**params, "pretrained_path": os.path.abspath(model), "epsilon": 0.0}
+        controllers[nome] = (CONTROLLERS[nome], p)
+
+    mc = MonteCarlo(controllers, seeds=args.seeds, base_seed=args.base_seed, confidence=args.confidence,
+                    min_seeds=args.min_seeds, ci_target=args.ci_target, stop_metric=args.stop_metric,
+                    workers=args.workers)
+
+    def progresso(mc):
+        if mc.history:
+            h = mc.history[-1]
+            print(f"[montecarlo] {mc.n}/{mc.seeds} | {h['pair']} {args.stop_metric} "
+                  f"{h['mean']:.2f} ± {h['half_width']:.2f}", file=sys.stderr)
+
+    resumo = mc.run(progress=progresso)
+    if args.json:
+        import json
+        json.dump(resumo, sys.stdout, indent=2)
+        print()
+    else:
+        print(formatar(resumo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,599 @@
+"""
+Rede de cruzamentos: corredores e grades com vias acopladas.
+
+Cada cruzamento é o par de vias A/B de `run_simulation`, com um controlador
+atuado ou Q-Learning. Os veículos que saem de uma via podem seguir para a
+via de um cruzamento a jusante (`links`), onde chegam `delay` segundos
+depois; os demais deixam a rede. As vias de todos os cruzamentos ficam num
+único `LaneBatch` e cada tipo de controlador usa a versão vetorizada de
+`src.batch`, então um tick é um punhado de operações em arrays, qualquer que
+seja o número de cruzamentos.
+
+Os sorteios vêm de `CounterRNG`: cada número é função de (semente, tick,
+fluxo, via), e não da ordem em que são consumidos, então o que acontece numa
+via não depende de quais outras são simuladas junto com ela.
+
+Configuração (JSON):
+    {
+      "params": {"duracao_sec": 3600, "taxa_escoamento": 0.6},
+      "intersections": [
+        {"id": "I0", "controller": "actuated", "demand": {"A": 20, "B": 10}},
+        {"id": "I1", "controller": "qlearning", "demand": {"B": 8}}
+      ],
+      "links": [{"from": "I0", "to": "I1", "approach": "A", "delay": 15, "share": 0.8}]
+    }
+`demand` é a chegada externa em veíc/min; `share` é a fração dos veículos
+que seguem pela ligação; `"region": k` opcional em cada cruzamento fixa a
+partição usada por `run_network_parallel`.
+
+Uso:
+    python -m src.network --corridor 10
+    python -m src.network --grid 20x20 --controller qlearning --set duracao_sec=3600
+    python -m src.network --config rede.json --json
+    python -m src.network --grid 40x40 --workers 4
+    python -m src.network --grid 40x40 --scaling 1,2,4
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import sys
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .batch import LaneBatch, VectorActuatedController, VectorQLearningController
+from .utils import DEFAULT_PARAMS, converter_valor
+
+CONTROLLERS = {
+    'actuated': VectorActuatedController,
+    'qlearning': VectorQLearningController,
+}
+APPROACHES = ("A", "B")
+
+# Fluxos de `CounterRNG`: cada uso dos sorteios tem o seu
+FLUXO_CHEGADAS, FLUXO_POSICOES, FLUXO_DESCARGA, FLUXO_ROTAS, FLUXO_CONTROLE = 0, 1, 2, 3, 16
+# A chave de um veículo é (via << BITS_VEICULO) | índice dele no tick
+BITS_VEICULO = 20
+
+_M64 = (1 << 64) - 1
+
+
+def _splitmix(x):
+    x = (x + 0x9E3779B97F4A7C15) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+def _splitmix_array(x):
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class CounterRNG:
+    """Gerador sem estado: `uniform(tick, fluxo, chaves)` depende só desses valores e da semente"""
+    def __init__(self, seed):
+        self.seed = _splitmix(int(seed) & _M64)
+
+    def uniform(self, tick, fluxo, chaves):
+        """Um sorteio em [0, 1) por chave"""
+        base = _splitmix(_splitmix(self.seed ^ int(tick)) ^ int(fluxo))
+        x = _splitmix_array(np.asarray(chaves, dtype=np.uint64) ^ np.uint64(base))
+        return (x >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+    def stream(self, tick, chaves, fluxo=FLUXO_CONTROLE):
+        return _Fluxo(self, tick, chaves, fluxo)
+
+
+class _Fluxo:
+    """
+    `random`/`uniform` no estilo de `numpy.random.Generator` para um
+    conjunto fixo de chaves, usado pelos controladores e por `LaneBatch`.
+    Cada chamada passa ao fluxo seguinte; o tamanho pedido é o das chaves.
+    """
+    def __init__(self, rng, tick, chaves, fluxo):
+        self.rng = rng
+        self.tick = tick
+        self.chaves = chaves
+        self.fluxo = fluxo
+
+    def random(self, size=None):
+        if size is not None and int(np.prod(size)) != len(self.chaves):
+            raise ValueError(f"{size} sorteios pedidos para {len(self.chaves)} chaves")
+        u = self.rng.uniform(self.tick, self.fluxo, self.chaves)
+        self.fluxo += 1
+        return u if size is None else u.reshape(size)
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return low + (high - low) * self.random(size)
+
+
+def _poisson(lam, u):
+    """Poisson pela inversa da CDF: o sorteio de cada via sai do seu `u`"""
+    k = np.zeros(u.shape, dtype=int)
+    p = np.exp(-lam)
+    cdf = p.copy()
+    ativo = u > cdf
+    while ativo.any():
+        k += ativo
+        p = np.where(ativo, p * lam / np.maximum(k, 1), p)
+        cdf = cdf + np.where(ativo, p, 0.0)
+        # o termo some antes de a CDF alcançar u muito perto de 1
+        ativo &= (u > cdf) & (p > 1e-17)
+    return k
+
+
+class Network:
+    """Topologia compilada de uma configuração: demandas e ligações de cada via
+
+    A via A do cruzamento i tem índice global i; a via B, `n + i`.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.params = {**DEFAULT_PARAMS, **config.get("params", {})}
+        cruzamentos = config["intersections"]
+        self.ids = [c["id"] for c in cruzamentos]
+        self.index = {nome: i for i, nome in enumerate(self.ids)}
+        if len(self.index) != len(self.ids):
+            raise ValueError("ids de cruzamento repetidos")
+        n = self.n = len(self.ids)
+        self.controllers = np.array([c.get("controller", "actuated") for c in cruzamentos])
+        for nome in set(self.controllers.tolist()) - set(CONTROLLERS):
+            raise ValueError(f"controlador desconhecido: {nome}")
+
+        self.demand = np.zeros(2 * n)
+        for i, c in enumerate(cruzamentos):
+            for a, taxa in c.get("demand", {}).items():
+                self.demand[self.lane(c["id"], a)] = taxa
+
+        dt = self.params['dt']
+        self.link_dst = np.full(2 * n, -1)
+        self.link_delay = np.zeros(2 * n, dtype=int)  # em ticks
+        self.link_share = np.zeros(2 * n)
+        for link in config.get("links", []):
+            a = link.get("approach", "A")
+            origem = self.lane(link["from"], a)
+            if self.link_dst[origem] >= 0:
+                raise ValueError(f"via {link['from']}/{a} com mais de uma ligação")
+            self.link_dst[origem] = self.lane(link["to"], link.get("to_approach", a))
+            self.link_delay[origem] = max(1, round(link.get("delay", 10) / dt))
+            self.link_share[origem] = link.get("share", 1.0)
+
+    def lane(self, cruzamento, approach):
+        """Índice global da via `approach` ('A' ou 'B') do cruzamento"""
+        if cruzamento not in self.index:
+            raise ValueError(f"cruzamento desconhecido: {cruzamento}")
+        if approach not in APPROACHES:
+            raise ValueError(f"aproximação desconhecida: {approach}")
+        return APPROACHES.index(approach) * self.n + self.index[cruzamento]
+
+    @property
+    def n_ticks(self):
+        return math.ceil(self.params['duracao_sec'] / self.params['dt'])
+
+
+class NetworkSim:
+    """
+    Estado de um conjunto de cruzamentos da rede (todos, por padrão).
+
+    As vias locais seguem o mesmo arranjo da rede (A dos cruzamentos, depois
+    B). Os veículos que seguem para uma via local entram num anel de chegadas
+    indexado por tick; os que vão para vias de fora do conjunto ficam em
+    `outbox` como `(tick de chegada, via global, quantidade)` e entram do
+    outro lado por `receive`.
+    """
+    def __init__(self, network, seed=42, intersections=None):
+        self.net = network
+        self.params = p = network.params
+        n = network.n
+        idx = np.arange(n) if intersections is None else np.sort(np.asarray(intersections, dtype=int))
+        self.intersections = idx
+        m = self.m = len(idx)
+        self.lanes_gid = np.concatenate([idx, n + idx])
+        self._local = np.full(2 * n, -1)
+        self._local[self.lanes_gid] = np.arange(2 * m)
+        self._chave_veiculo = self.lanes_gid.astype(np.uint64) << np.uint64(BITS_VEICULO)
+
+        self.rng = CounterRNG(seed)
+        self.lanes = LaneBatch(2 * m)
+        self.lam = network.demand[self.lanes_gid] / 60 * p['dt']
+
+        dst = network.link_dst[self.lanes_gid]
+        self.com_link = np.flatnonzero(dst >= 0)
+        self.link_dst = dst[self.com_link]
+        self.link_local = self._local[self.link_dst]
+        self.link_delay = network.link_delay[self.lanes_gid][self.com_link]
+        self.link_share = network.link_share[self.lanes_gid][self.com_link]
+
+        self.anel = np.zeros((int(network.link_delay.max(initial=0)) + 1, 2 * m), dtype=int)
+        self.outbox = []
+
+        self.groups = []
+        for nome, cls in CONTROLLERS.items():
+            sel = np.flatnonzero(network.controllers[idx] == nome)
+            if sel.size:
+                self.groups.append((sel, cls(p, sel.size)))
+
+        self.tick = 0
+        self.entered = np.zeros(2 * m, dtype=int)
+        self.sent = np.zeros(2 * m, dtype=int)
+        self.wait_sum = np.zeros(2 * m)
+        self.max_wait = np.zeros(2 * m)
+
+    def receive(self, chegada, vias, quantidades):
+        """Agenda veículos vindos de fora em vias locais (ticks ainda não simulados)"""
+        np.add.at(self.anel, (np.asarray(chegada) % self.anel.shape[0], self._local[vias]), quantidades)
+
+    def step(self):
+        t = self.tick
+        dt = self.params['dt']
+        m = self.m
+        lanes = self.lanes
+
+        slot = t % self.anel.shape[0]
+        vindos = self.anel[slot].copy()
+        self.anel[slot] = 0
+        externos = _poisson(self.lam, self.rng.uniform(t, FLUXO_CHEGADAS, self.lanes_gid))
+        novos = vindos + externos
+        total = int(novos.sum())
+        if total:
+            primeiro = np.cumsum(novos) - novos
+            k = np.arange(total) - np.repeat(primeiro, novos)
+            chaves = np.repeat(self._chave_veiculo, novos) | k.astype(np.uint64)
+            lanes.add_vehicles(novos, u=self.rng.uniform(t, FLUXO_POSICOES, chaves))
+        self.entered += externos
+
+        verde = np.zeros(2 * m, dtype=bool)
+        for sel, controller in self.groups:
+            gA, gB = controller.step(dt, lanes.counts[sel], lanes.counts[m + sel],
+                                     self.rng.stream(t, self.intersections[sel]))
+            verde[sel] = gA
+            verde[m + sel] = gB
+
+        passed, waited = lanes.step_logic(verde, dt, self.params['taxa_escoamento'],
+                                          self.rng.stream(t, self.lanes_gid, FLUXO_DESCARGA))
+        self.wait_sum += waited
+        self.max_wait = np.maximum(self.max_wait, lanes.max_wait())
+
+        saiu = passed[self.com_link]
+        maior = int(saiu.max(initial=0))
+        if maior:
+            j = np.arange(maior)
+            chaves = self._chave_veiculo[self.com_link][:, None] | j.astype(np.uint64)
+            u = self.rng.uniform(t, FLUXO_ROTAS, chaves)
+            seguem = ((j < saiu[:, None]) & (u < self.link_share[:, None])).sum(axis=1)
+            self.sent[self.com_link] += seguem
+            chegada = t + self.link_delay
+            local = self.link_local >= 0
+            np.add.at(self.anel, (chegada[local] % self.anel.shape[0], self.link_local[local]), seguem[local])
+            remoto = ~local & (seguem > 0)
+            if remoto.any():
+                self.outbox.append((chegada[remoto], self.link_dst[remoto], seguem[remoto]))
+        self.tick = t + 1
+
+    def run(self, n_ticks):
+        for _ in range(n_ticks):
+            self.step()
+
+    def state(self):
+        """Contadores por via global e por cruzamento, para montar o resultado"""
+        switches = np.zeros(self.m, dtype=int)
+        for sel, controller in self.groups:
+            switches[sel] = controller.switches
+        return {
+            "lanes": self.lanes_gid,
+            "passed": self.lanes.passed.copy(),
+            "entered": self.entered.copy(),
+            "sent": self.sent.copy(),
+            "queued": self.lanes.counts.copy(),
+            "wait_sum": self.wait_sum.copy(),
+            "max_wait": self.max_wait.copy(),
+            "intersections": self.intersections,
+            "switches": switches,
+            "in_transit": int(self.anel.sum()),
+        }
+
+
+def network_result(network, partes):
+    """Junta os `state()` de uma ou mais partes da rede num resultado único"""
+    n = network.n
+    vias = {k: np.zeros(2 * n, dtype=float if k in ("wait_sum", "max_wait") else int)
+            for k in ("passed", "entered", "sent", "queued", "wait_sum", "max_wait")}
+    switches = np.zeros(n, dtype=int)
+    em_transito = 0
+    for parte in partes:
+        for k, v in vias.items():
+            v[parte["lanes"]] = parte[k]
+        switches[parte["intersections"]] = parte["switches"]
+        em_transito += parte["in_transit"]
+
+    passed = vias["passed"]
+    total_passed = int(passed.sum())
+    por_cruzamento = passed[:n] + passed[n:]
+    espera = vias["wait_sum"][:n] + vias["wait_sum"][n:]
+    return {
+        "total_passed": total_passed,
+        "avg_wait": float(vias["wait_sum"].sum()) / max(1, total_passed),
+        "max_wait": float(vias["max_wait"].max(initial=0.0)),
+        "vehicles_in": int(vias["entered"].sum()),
+        "vehicles_out": total_passed - int(vias["sent"].sum()),
+        "in_network": int(vias["queued"].sum()) + em_transito,
+        "switches": int(switches.sum()),
+        "n_intersections": n,
+        "intersections": {
+            "id": list(network.ids),
+            "controller": network.controllers.tolist(),
+            "passed": por_cruzamento.tolist(),
+            "avg_wait": (espera / np.maximum(1, por_cruzamento)).tolist(),
+            "max_wait": np.maximum(vias["max_wait"][:n], vias["max_wait"][n:]).tolist(),
+            "switches": switches.tolist(),
+        },
+    }
+
+
+def run_network(network, seed=42):
+    """Simula a rede inteira num processo
+
+    `network` é uma `Network` ou o dict de configuração.
+    """
+    if not isinstance(network, Network):
+        network = Network(network)
+    sim = NetworkSim(network, seed)
+    sim.run(network.n_ticks)
+    return network_result(network, [sim.state()])
+
+
+def partition(network, n_regions):
+    """Divide os cruzamentos em regiões: pelo campo `region` da configuração,
+    se todos o tiverem, ou em blocos contíguos de índices (faixas de linhas
+    numa grade de `grid`)"""
+    rotulos = [c.get("region") for c in network.config["intersections"]]
+    if all(r is not None for r in rotulos):
+        rotulos = np.array(rotulos)
+        return [np.flatnonzero(rotulos == r) for r in np.unique(rotulos)]
+    return [r for r in np.array_split(np.arange(network.n), n_regions) if r.size]
+
+
+def _janela(network, regiao_da_via):
+    """Ticks que cada região pode avançar sem ouvir as outras: o menor atraso
+    das ligações entre regiões (toda a simulação se não houver nenhuma)"""
+    origem = np.flatnonzero(network.link_dst >= 0)
+    corte = origem[regiao_da_via[origem] != regiao_da_via[network.link_dst[origem]]]
+    if not corte.size:
+        return network.n_ticks, corte
+    return int(network.link_delay[corte].min()), corte
+
+
+def _regiao(network, seed, regiao, membros, janela, regiao_da_via, shm_name, capacidade, barreira, results):
+    """Processo de uma região: avança `janela` ticks, publica os fluxos que
+    saem dela na memória compartilhada e lê os que chegam das outras"""
+    shm = SharedMemory(name=shm_name)
+    n_regioes = barreira.parties
+    saidas = contagens = None
+    try:
+        saidas = np.ndarray((n_regioes, capacidade, 3), dtype=np.int64, buffer=shm.buf)
+        contagens = np.ndarray(n_regioes, dtype=np.int64, buffer=shm.buf, offset=saidas.nbytes)
+        sim = NetworkSim(network, seed, membros)
+        t, total = 0, network.n_ticks
+        while t < total:
+            sim.run(min(janela, total - t))
+            t = sim.tick
+            # a troca também acontece depois da última janela: os veículos
+            # em trânsito entre regiões entram em `in_network`
+            registros = [np.stack(r, axis=1) for r in sim.outbox]
+            sim.outbox.clear()
+            n = sum(len(r) for r in registros)
+            if n:
+                saidas[regiao, :n] = np.concatenate(registros)
+            contagens[regiao] = n
+            barreira.wait()
+            for origem in range(n_regioes):
+                if origem == regiao or not contagens[origem]:
+                    continue
+                chegam = saidas[origem, :contagens[origem]]
+                chegam = chegam[regiao_da_via[chegam[:, 1]] == regiao]
+                if len(chegam):
+                    sim.receive(chegam[:, 0], chegam[:, 1], chegam[:, 2])
+            barreira.wait()
+        results.put((regiao, sim.state()))
+    except BaseException as e:
+        barreira.abort()
+        results.put((regiao, e))
+    finally:
+        saidas = contagens = None  # libera as views antes de fechar o segmento
+        shm.close()
+
+
+def run_network_parallel(network, seed=42, workers=None, regions=None):
+    """Simula a rede particionada em regiões, um processo por região
+
+    A cada janela as regiões avançam em paralelo e trocam só os fluxos das
+    ligações que cruzam a fronteira, por um segmento de memória
+    compartilhada. A janela é o menor atraso dessas ligações, então nenhum
+    veículo precisa chegar antes da troca seguinte; com os sorteios de
+    `CounterRNG` o resultado é idêntico ao de `run_network`.
+    """
+    if not isinstance(network, Network):
+        network = Network(network)
+    regioes = regions if regions is not None else partition(network, workers or mp.cpu_count())
+    if len(regioes) == 1:
+        return run_network(network, seed)
+    regiao_da_via = np.empty(2 * network.n, dtype=int)
+    for r, membros in enumerate(regioes):
+        regiao_da_via[membros] = r
+        regiao_da_via[network.n + np.asarray(membros)] = r
+    janela, corte = _janela(network, regiao_da_via)
+    # cada ligação de fronteira gera no máximo um registro por tick
+    por_regiao = np.bincount(regiao_da_via[corte], minlength=len(regioes))
+    capacidade = max(1, int(por_regiao.max(initial=0)) * janela)
+
+    ctx = mp.get_context()
+    shm = SharedMemory(create=True, size=len(regioes) * (capacidade * 3 + 1) * 8)
+    barreira = ctx.Barrier(len(regioes))
+    results = ctx.Queue()
+    processos = [
+        ctx.Process(target=_regiao, args=(network, seed, r, membros, janela, regiao_da_via,
+                                          shm.name, capacidade, barreira, results))
+        for r, membros in enumerate(regioes)
+    ]
+    try:
+        for p in processos:
+            p.start()
+        partes = [None] * len(regioes)
+        erros = []
+        for _ in processos:
+            r, parte = results.get()
+            if isinstance(parte, BaseException):
+                erros.append(parte)
+            partes[r] = parte
+        for p in processos:
+            p.join()
+        if erros:
+            # a barreira quebrada nas outras regiões é consequência do primeiro erro
+            raise next((e for e in erros if not isinstance(e, threading.BrokenBarrierError)), erros[0])
+    finally:
+        for p in processos:
+            if p.is_alive():
+                p.terminate()
+        shm.close()
+        shm.unlink()
+    result = network_result(network, partes)
+    result.update({"n_regions": len(regioes), "sync_ticks": janela})
+    return result
+
+
+def load_network(path):
+    with open(path) as f:
+        return Network(json.load(f))
+
+
+def corridor(n, controller="actuated", delay=15, share=0.8, demand_a=20, demand_b=10, params=None):
+    """Corredor de `n` cruzamentos: a via A é a arterial (`C0 -> C1 -> ...`)
+    e só recebe chegadas externas no primeiro; as transversais (B), em todos."""
+    return {
+        "params": dict(params or {}),
+        "intersections": [
+            {"id": f"C{i}", "controller": controller, "demand": {"A": demand_a if i == 0 else 0, "B": demand_b}}
+            for i in range(n)
+        ],
+        "links": [
+            {"from": f"C{i}", "to": f"C{i + 1}", "approach": "A", "delay": delay, "share": share}
+            for i in range(n - 1)
+        ],
+    }
+
+
+def grid(rows, cols, controller="actuated", delay=15, share=0.8, demand_a=20, demand_b=10,
+         demand_interior=0, params=None):
+    """Grade `rows x cols`: a via A segue para leste e a B para o sul
+
+    As chegadas externas entram pela borda oeste (A) e norte (B), mais
+    `demand_interior` em todas as outras vias.
+    """
+    def nome(r, c):
+        return f"G{r}_{c}"
+    cruzamentos, links = [], []
+    for r in range(rows):
+        for c in range(cols):
+            cruzamentos.append({"id": nome(r, c), "controller": controller, "demand": {
+                "A": demand_a if c == 0 else demand_interior,
+                "B": demand_b if r == 0 else demand_interior,
+            }})
+            if c + 1 < cols:
+                links.append({"from": nome(r, c), "to": nome(r, c + 1), "approach": "A",
+                              "delay": delay, "share": share})
+            if r + 1 < rows:
+                links.append({"from": nome(r, c), "to": nome(r + 1, c), "approach": "B",
+                              "delay": delay, "share": share})
+    return {"params": dict(params or {}), "intersections": cruzamentos, "links": links}
+
+
+def _escalonamento(network, seed, workers):
+    """Tabela de tempo e speedup por número de workers, contra um processo"""
+    def rodar(w):
+        inicio = time.perf_counter()
+        r = run_network_parallel(network, seed, workers=w)
+        return r, time.perf_counter() - inicio
+
+    base, t_base = rodar(1)
+    chaves = [k for k in base if k not in ("n_regions", "sync_ticks")]
+    print(f"{network.n} cruzamentos, {network.n_ticks} ticks")
+    print(f"{'workers':>7} {'sync (ticks)':>12} {'tempo (s)':>10} {'ticks/s':>9} {'speedup':>8}  resultado")
+    print(f"{1:>7} {'-':>12} {t_base:>10.2f} {network.n_ticks / t_base:>9.0f} {1.0:>7.2f}x  referência")
+    for w in workers:
+        if w == 1:
+            continue
+        r, t = rodar(w)
+        igual = all(r[k] == base[k] for k in chaves)
+        print(f"{w:>7} {r.get('sync_ticks', '-'):>12} {t:>10.2f} {network.n_ticks / t:>9.0f} {t_base / t:>7.2f}x  "
+              f"{'idêntico' if igual else 'DIFERENTE'}")
+
+
+def _dimensoes(texto):
+    rows, cols = texto.lower().split("x")
+    return int(rows), int(cols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.network", description="Simula uma rede de cruzamentos")
+    topologia = parser.add_mutually_exclusive_group(required=True)
+    topologia.add_argument("--config", help="arquivo JSON da rede")
+    topologia.add_argument("--corridor", type=int, metavar="N", help="corredor de N cruzamentos")
+    topologia.add_argument("--grid", type=_dimensoes, metavar="LxC", help="grade de L linhas e C colunas")
+    parser.add_argument("--controller", default="actuated", choices=list(CONTROLLERS),
+                        help="controlador de todos os cruzamentos (--corridor/--grid)")
+    parser.add_argument("--delay", type=float, default=15, help="tempo de percurso entre cruzamentos (s)")
+    parser.add_argument("--share", type=float, default=0.8, help="fração que segue para o próximo cruzamento")
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALOR",
+                        help="sobrescreve um parâmetro da simulação")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1, help="processos (regiões) da simulação")
+    parser.add_argument("--scaling", metavar="N1,N2,...",
+                        help="mede o tempo com cada número de workers e confere que o resultado não muda")
+    parser.add_argument("--save-config", metavar="ARQ", help="grava a configuração da rede em JSON")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado completo em JSON")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    elif args.corridor:
+        config = corridor(args.corridor, args.controller, args.delay, args.share)
+    else:
+        config = grid(*args.grid, controller=args.controller, delay=args.delay, share=args.share)
+    config.setdefault("params", {}).update(
+        {k: converter_valor(v) for k, v in (item.split("=", 1) for item in args.set)})
+    if any(c.get("controller") == "qlearning" for c in config["intersections"]):
+        from .models import find_model
+        model = find_model()
+        if model:
+            config["params"].setdefault("pretrained_path", model)
+    if args.save_config:
+        with open(args.save_config, "w") as f:
+            json.dump(config, f, indent=2)
+
+    network = Network(config)
+    if args.scaling:
+        _escalonamento(network, args.seed, [int(w) for w in args.scaling.split(",")])
+        return
+    inicio = time.perf_counter()
+    r = run_network_parallel(network, args.seed, workers=args.workers)
+    r["elapsed_sec"] = time.perf_counter() - inicio
+    if args.json:
+        json.dump(r, sys.stdout, indent=2)
+        print()
+        return
+    duracao = network.params['duracao_sec']
+    print(f"{network.n} cruzamentos, {network.n_ticks} ticks em {r['elapsed_sec']:.2f}s "
+          f"({network.n_ticks / r['elapsed_sec']:.0f} ticks/s, {duracao / r['elapsed_sec']:.0f}x tempo real)")
+    print(f"entraram {r['vehicles_in']} | saíram {r['vehicles_out']} | na rede {r['in_network']} | "
+          f"atendimentos {r['total_passed']} | espera média {r['avg_wait']:.1f}s | máxima {r['max_wait']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Instrumentação opcional de `run_simulation` e perfil de uma execução.
+
+`Instrumentation` é passada em `run_simulation(..., instrument=inst)` e
+acumula, por etapa do tick, o tempo total e um histograma das durações:
+- `arrivals`: fonte de chegadas (`src.arrivals`) + `add_vehicles`;
+- `detectors`: sorteio de pedestres/V2I (só com `detectors=True`);
+- `controller`: `controller.step`;
+- `lanes`: `step_logic` das duas vias;
+- `wait_stats`: agregação da espera máxima;
+- `snapshots` e `progress`.
+Também conta ticks, veículos criados, atendidos e percorridos no passo de
+movimento, e snapshots gerados. Com `trace_memory=True` o `tracemalloc`
+mede os blocos alocados e o pico de memória da execução.
+
+Sem `instrument` o laço só paga um teste de `None` por etapa.
+
+`profile_run` roda uma execução sob perfil e grava um `.prof` do cProfile
+(snakeviz, `python -m pstats`) ou, com extensão `.folded`, pilhas colapsadas
+no formato do flamegraph.pl/speedscope.
+"""
+import bisect
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+
+STAGES = ("arrivals", "detectors", "controller", "lanes", "wait_stats", "snapshots", "progress")
+# Limites superiores (s) dos buckets do histograma de duração por tick
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 1e-2, 1e-1)
+COUNTERS = ("ticks", "vehicles_added", "vehicles_passed", "vehicles_moved", "snapshots")
+
+
+class Instrumentation:
+    """Tempos por etapa e contadores de uma ou mais chamadas de `run_simulation`"""
+    def __init__(self, trace_memory=False):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        self.histogram = {s: [0] * (len(BUCKETS) + 1) for s in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.trace_memory = trace_memory
+        self.memory = {}
+        self.wall = 0.0
+        self._inicio = None
+
+    def record(self, stage, dt):
+        self.seconds[stage] += dt
+        self.calls[stage] += 1
+        self.histogram[stage][bisect.bisect_left(BUCKETS, dt)] += 1
+
+    def count(self, counter, n=1):
+        self.counters[counter] += n
+
+    def start(self):
+        if self.trace_memory:
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._mem0 = tracemalloc.take_snapshot()
+        self._inicio = time.perf_counter()
+
+    def stop(self):
+        self.wall += time.perf_counter() - self._inicio
+        if self.trace_memory:
+            atual, pico = tracemalloc.get_traced_memory()
+            diff = tracemalloc.take_snapshot().compare_to(self._mem0, "filename")
+            self.memory = {
+                "allocated_blocks": sum(max(0, d.count_diff) for d in diff),
+                "allocated_bytes": sum(max(0, d.size_diff) for d in diff),
+                "peak_bytes": pico,
+            }
+            if self._tracing:
+                tracemalloc.stop()
+
+    def as_dict(self):
+        medido = sum(self.seconds.values())
+        stages = {}
+        for s in STAGES:
+            if not self.calls[s]:
+                continue
+            stages[s] = {
+                "seconds": self.seconds[s],
+                "calls": self.calls[s],
+                "mean_us": self.seconds[s] / self.calls[s] * 1e6,
+                "share": self.seconds[s] / medido if medido else 0.0,
+                "histogram": dict(zip([*map(str, BUCKETS), "+Inf"], self.histogram[s])),
+            }
+        return {
+            "wall_seconds": self.wall,
+            "stages": stages,
+            "counters": dict(self.counters),
+            "memory": dict(self.memory),
+        }
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def to_prometheus(self, prefix="semaforo_sim"):
+        """Texto no formato de exposição do Prometheus"""
+        linhas = [
+            f"# HELP {prefix}_stage_seconds Duração de cada etapa do tick.",
+            f"# TYPE {prefix}_stage_seconds histogram",
+        ]
+        for s in STAGES:
+            if not self.calls[s]:
+                continue
+            acumulado = 0
+            for le, n in zip([*map(repr, BUCKETS), "+Inf"], self.histogram[s]):
+                acumulado += n
+                linhas.append(f'{prefix}_stage_seconds_bucket{{stage="{s}",le="{le}"}} {acumulado}')
+            linhas.append(f'{prefix}_stage_seconds_sum{{stage="{s}"}} {self.seconds[s]!r}')
+            linhas.append(f'{prefix}_stage_seconds_count{{stage="{s}"}} {self.calls[s]}')
+        linhas += [f"# HELP {prefix}_events_total Contadores da simulação.",
+                   f"# TYPE {prefix}_events_total counter"]
+        for c, n in self.counters.items():
+            linhas.append(f'{prefix}_events_total{{event="{c}"}} {n}')
+        linhas += [f"# TYPE {prefix}_wall_seconds gauge", f"{prefix}_wall_seconds {self.wall!r}"]
+        for k, v in self.memory.items():
+            linhas += [f"# TYPE {prefix}_memory_{k} gauge", f"{prefix}_memory_{k} {v}"]
+        return "\n".join(linhas) + "\n"
+
+    def report(self):
+        """Tabela curta para o terminal"""
+        d = self.as_dict()
+        linhas = [f"{'etapa':<11} {'total (ms)':>11} {'média (µs)':>11} {'fração':>7}"]
+        for s, e in d["stages"].items():
+            linhas.append(f"{s:<11} {e['seconds'] * 1e3:>11.1f} {e['mean_us']:>11.2f} {e['share']:>7.1%}")
+        linhas.append("  ".join(f"{k}={v}" for k, v in d["counters"].items()))
+        if d["memory"]:
+            linhas.append("  ".join(f"{k}={v}" for k, v in d["memory"].items()))
+        return "\n".join(linhas)
+
+
+class FoldedProfiler:
+    """Perfil determinístico que acumula o tempo próprio por pilha de chamadas"""
+    def __init__(self):
+        self.stacks = {}
+        self._pilha = []
+
+    @staticmethod
+    def _nome(frame, event, arg):
+        if event.startswith("c_"):
+            return f"{getattr(arg, '__module__', None) or 'builtins'}.{arg.__qualname__}"
+        code = frame.f_code
+        # `co_qualname` só existe a partir do Python 3.11
+        return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+    def _perfil(self, frame, event, arg):
+        agora = time.perf_counter_ns()
+        if event in ("call", "c_call"):
+            if self._pilha:
+                self._pilha[-1][2] += agora - self._pilha[-1][1]
+            self._pilha.append([self._nome(frame, event, arg), agora, 0])
+        elif event in ("return", "c_return", "c_exception") and self._pilha:
+            nome, inicio, proprio = self._pilha.pop()
+            proprio += agora - inicio
+            chave = ";".join([p[0] for p in self._pilha] + [nome])
+            self.stacks[chave] = self.stacks.get(chave, 0) + proprio
+            if self._pilha:
+                self._pilha[-1][1] = agora
+
+    def __enter__(self):
+        sys.setprofile(self._perfil)
+        return self
+
+    def __exit__(self, *exc):
+        sys.setprofile(None)
+
+    def write(self, path):
+        """Uma linha `pilha;de;chamadas microssegundos` por pilha"""
+        with open(path, "w") as f:
+            for chave, ns in sorted(self.stacks.items()):
+                if ns >= 1000:
+                    f.write(f"{chave} {ns // 1000}\n")
+
+
+def profile_run(fn, *args, out="run.prof", **kwargs):
+    """Executa `fn(*args, **kwargs)` sob perfil e grava em `out`; devolve o resultado
+
+    `.folded` grava pilhas colapsadas (flamegraph); qualquer outra extensão,
+    o dump do cProfile.
+    """
+    if out.endswith(".folded"):
+        with FoldedProfiler() as perfil:
+            resultado = fn(*args, **kwargs)
+        perfil.write(out)
+        return resultado
+    perfil = cProfile.Profile()
+    resultado = perfil.runcall(fn, *args, **kwargs)
+    perfil.dump_stats(out)
+    return resultado
@@ -0,0 +1,346 @@
+"""
+Armazenamento da Q-table do `QLearningController`.
+
+- `DenseQ`: array `shape + (n_actions,)`, uma posição por estado. É o
+  formato de sempre (e o dos modelos `.npz` padrão) e o mais rápido, mas a
+  memória cresce com o produto dos bins.
+- `HashQ`: tabela hash de endereçamento aberto (sondagem linear, hash de
+  Fibonacci) em arrays NumPy, só com os estados visitados. A chave é o
+  índice achatado do estado; o consumo acompanha o número de estados vistos,
+  não o tamanho do espaço, então espaços com milhões de estados cabem.
+
+As duas têm a mesma interface: `row(state)` (valores das ações, tupla de
+estado), `row_mut(state)` (a linha gravável, criada se preciso), `rows(idx)`
+e `add_at(idx, actions, deltas)` vetorizados por índice achatado,
+`to_dense()`, `nbytes` e `len()` (estados guardados). `make_q_store` escolhe
+a densa quando ela cabe em `max_dense_bytes`.
+
+Relatório de memória e custo de consulta por espaço de estados:
+    python -m src.qstore --entries 100000
+"""
+import argparse
+import math
+import operator
+import time
+
+import numpy as np
+
+DENSE_LIMIT = 64 * 2**20  # bytes
+VAZIO = -1
+_FIB = 0x9E3779B97F4A7C15
+_M64 = 2**64 - 1
+
+
+def _pesos(shape):
+    """Multiplicadores de cada componente do estado no índice achatado"""
+    return tuple(int(np.prod(shape[i + 1:], dtype=object)) for i in range(len(shape)))
+
+
+class DenseQ:
+    """Q-table densa (envolve o array `shape + (n_actions,)`, sem copiar)"""
+    def __init__(self, array):
+        self._definir(array)
+
+    @classmethod
+    def zeros(cls, shape, n_actions):
+        return cls(np.zeros(tuple(shape) + (n_actions,)))
+
+    def _definir(self, array):
+        self.array = array
+        self.shape = array.shape[:-1]
+        self.n_actions = array.shape[-1]
+        self.flat = array.reshape(-1, self.n_actions)
+        # leitura de uma linha pela tupla de estado, direto em C
+        self.row = array.__getitem__
+
+    def __len__(self):
+        return self.flat.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    @property
+    def writeable(self):
+        return self.array.flags.writeable
+
+    def setflags(self, write):
+        self.array.setflags(write=write)
+
+    def _gravavel(self):
+        # tabela somente leitura (cache de modelos, mmap): copia na primeira escrita
+        if not self.array.flags.writeable:
+            self._definir(np.array(self.array))
+
+    def row_mut(self, state):
+        self._gravavel()
+        return self.array[state]
+
+    def rows(self, idx):
+        return self.flat[idx]
+
+    def add_at(self, idx, actions, deltas):
+        self._gravavel()
+        np.add.at(self.flat, (idx, actions), deltas)
+
+    def to_dense(self):
+        return self.array
+
+
+class HashQ:
+    """
+    Q-table esparsa: endereçamento aberto sobre `keys` (int64, `VAZIO` nas
+    posições livres) e `values` (`capacidade x n_actions`).
+
+    A capacidade é potência de 2 e dobra quando a ocupação passa de
+    `max_load`. Estados ausentes valem 0 em todas as ações.
+    """
+    def __init__(self, shape, n_actions, capacity=1024, max_load=0.5):
+        self.shape = tuple(shape)
+        self.n_actions = n_actions
+        self.max_load = max_load
+        self._pesos_estado = _pesos(self.shape)
+        self._zeros = np.zeros(n_actions)
+        self._zeros.setflags(write=False)
+        self._alocar(max(8, 1 << (capacity - 1).bit_length()))
+
+    def _alocar(self, capacidade):
+        self.keys = np.full(capacidade, VAZIO, dtype=np.int64)
+        self.values = np.zeros((capacidade, self.n_actions))
+        self.n = 0
+        self._mask = capacidade - 1
+        self._shift = 64 - (capacidade.bit_length() - 1)
+
+    @classmethod
+    def from_arrays(cls, shape, keys, values, max_load=0.5):
+        """Tabela sobre `keys`/`values` já montados (p.ex. lidos de um modelo), sem copiar"""
+        q = cls.__new__(cls)
+        q.shape = tuple(shape)
+        q.n_actions = values.shape[1]
+        q.max_load = max_load
+        q._pesos_estado = _pesos(q.shape)
+        q._zeros = np.zeros(q.n_actions)
+        q._zeros.setflags(write=False)
+        q.keys, q.values = keys, values
+        q.n = int(np.count_nonzero(keys != VAZIO))
+        q._mask = len(keys) - 1
+        q._shift = 64 - (len(keys).bit_length() - 1)
+        return q
+
+    @classmethod
+    def from_dense(cls, array, max_load=0.5):
+        """Só os estados com algum valor diferente de zero"""
+        shape, n_actions = array.shape[:-1], array.shape[-1]
+        plana = array.reshape(-1, n_actions)
+        idx = np.flatnonzero(np.any(plana != 0, axis=1))
+        q = cls(shape, n_actions, capacity=max(8, int(len(idx) / max_load) + 1), max_load=max_load)
+        for a in range(n_actions):
+            q.add_at(idx, np.full(len(idx), a), plana[idx, a])
+        return q
+
+    def view(self):
+        """Outra `HashQ` sobre os mesmos arrays (quem escrever primeiro copia, se forem somente leitura)"""
+        return HashQ.from_arrays(self.shape, self.keys, self.values, self.max_load)
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes
+
+    @property
+    def writeable(self):
+        return self.values.flags.writeable
+
+    def setflags(self, write):
+        self.keys.setflags(write=write)
+        self.values.setflags(write=write)
+
+    def _gravavel(self):
+        if not self.values.flags.writeable:
+            self.keys = np.array(self.keys)
+            self.values = np.array(self.values)
+
+    def index(self, state):
+        return sum(map(operator.mul, state, self._pesos_estado))
+
+    # --- uma chave por vez (laço do controlador) ---
+
+    def _posicao(self, chave):
+        """Posição da chave ou da primeira posição livre da sua sequência de sondagem"""
+        # `item` devolve int do Python: compara sem criar escalares NumPy
+        item, mask = self.keys.item, self._mask
+        i = ((chave * _FIB) & _M64) >> self._shift
+        while True:
+            k = item(i)
+            if k == chave or k == VAZIO:
+                return i
+            i = (i + 1) & mask
+
+    def row(self, state):
+        chave = sum(map(operator.mul, state, self._pesos_estado))
+        item, mask = self.keys.item, self._mask
+        i = ((chave * _FIB) & _M64) >> self._shift
+        while True:
+            k = item(i)
+            if k == chave:
+                return self.values[i]
+            if k == VAZIO:
+                return self._zeros
+            i = (i + 1) & mask
+
+    def row_mut(self, state):
+        self._gravavel()
+        chave = self.index(state)
+        i = self._posicao(chave)
+        if self.keys.item(i) != chave:
+            if self.n + 1 > self.max_load * self.capacity:
+                self._crescer(2 * self.capacity)
+                i = self._posicao(chave)
+            self.keys[i] = chave
+            self.n += 1
+        return self.values[i]
+
+    # --- lotes de chaves (replay, relatórios) ---
+
+    def _hash(self, chaves):
+        return ((chaves.astype(np.uint64) * np.uint64(_FIB)) >> np.uint64(self._shift)).astype(np.int64)
+
+    def _localizar(self, chaves):
+        """`_posicao` vetorizada: todas as chaves avançam juntas na sondagem"""
+        pos = self._hash(chaves)
+        pendentes = np.arange(len(chaves))
+        keys, mask = self.keys, self._mask
+        while len(pendentes):
+            k = keys[pos[pendentes]]
+            fim = (k == chaves[pendentes]) | (k == VAZIO)
+            pendentes = pendentes[~fim]
+            pos[pendentes] = (pos[pendentes] + 1) & mask
+        return pos
+
+    def _inserir(self, chaves):
+        """Insere as chaves ausentes (únicas); chaves que disputam a mesma posição livre tentam de novo"""
+        pendentes = chaves
+        while len(pendentes):
+            pos = self._localizar(pendentes)
+            livres = self.keys[pos] == VAZIO
+            self.keys[pos[livres]] = pendentes[livres]
+            ok = self.keys[pos] == pendentes
+            self.n += int(np.count_nonzero(ok & livres))
+            pendentes = pendentes[~ok]
+
+    def _crescer(self, capacidade):
+        ocupadas = self.keys != VAZIO
+        chaves, valores = self.keys[ocupadas], self.values[ocupadas]
+        self._alocar(capacidade)
+        self._inserir(chaves)
+        self.values[self._localizar(chaves)] = valores
+
+    def rows(self, idx):
+        idx = np.asarray(idx, dtype=np.int64)
+        pos = self._localizar(idx)
+        return np.where((self.keys[pos] == idx)[:, None], self.values[pos], 0.0)
+
+    def add_at(self, idx, actions, deltas):
+        self._gravavel()
+        idx = np.asarray(idx, dtype=np.int64)
+        novas = np.unique(idx)
+        novas = novas[self.keys[self._localizar(novas)] != novas]
+        if len(novas):
+            capacidade = self.capacity
+            while self.n + len(novas) > self.max_load * capacidade:
+                capacidade *= 2
+            if capacidade != self.capacity:
+                self._crescer(capacidade)
+            self._inserir(novas)
+        np.add.at(self.values, (self._localizar(idx), actions), deltas)
+
+    def to_dense(self):
+        plana = np.zeros((int(np.prod(self.shape)), self.n_actions))
+        ocupadas = self.keys != VAZIO
+        plana[self.keys[ocupadas]] = self.values[ocupadas]
+        return plana.reshape(self.shape + (self.n_actions,))
+
+
+def dense_bytes(shape, n_actions):
+    return math.prod(shape) * n_actions * np.dtype(np.float64).itemsize
+
+
+def make_q_store(shape, n_actions, storage="auto", max_dense_bytes=DENSE_LIMIT):
+    """Q-table vazia: densa se couber em `max_dense_bytes` (ou com `storage="dense"`), hash senão"""
+    if storage not in ("auto", "dense", "hash"):
+        raise ValueError(f"armazenamento desconhecido: {storage}")
+    if storage == "dense" or (storage == "auto" and dense_bytes(shape, n_actions) <= max_dense_bytes):
+        return DenseQ.zeros(shape, n_actions)
+    return HashQ(shape, n_actions)
+
+
+def as_q_store(q):
+    """`DenseQ` de um array; uma `HashQ` vira uma vista própria"""
+    if isinstance(q, HashQ):
+        return q.view()
+    if isinstance(q, DenseQ):
+        return q
+    return DenseQ(q)
+
+
+def medir(space, storage, n_entries=100_000, n_lookups=200_000, seed=0):
+    """Memória e custo de consulta de uma Q-table de `space` com `n_entries` estados visitados
+
+    Devolve um dict com `states`, `entries`, `bytes`, `ns_per_lookup` (uma
+    linha por vez, pela tupla de estado) e `lookups_per_sec` (em lote).
+    """
+    from .controllers import N_ACTIONS
+    if storage == "dense" and dense_bytes(space.shape, N_ACTIONS) > 8 * DENSE_LIMIT:
+        return {"states": space.n_states, "entries": None,
+                "bytes": dense_bytes(space.shape, N_ACTIONS), "ns_per_lookup": None, "lookups_per_sec": None}
+    rng = np.random.default_rng(seed)
+    q = make_q_store(space.shape, N_ACTIONS, storage=storage)
+    n = min(n_entries, space.n_states)
+    # estados visitados ao acaso e consultas sobre eles
+    visitados = np.unique(rng.integers(0, space.n_states, n))
+    q.add_at(visitados, np.zeros(len(visitados), dtype=np.int64), rng.normal(size=len(visitados)))
+    consultas = rng.choice(visitados, n_lookups)
+    tuplas = [tuple(int(c) for c in np.unravel_index(k, space.shape)) for k in consultas[:20_000]]
+
+    row = q.row
+    inicio = time.perf_counter()
+    for s in tuplas:
+        row(s)
+    por_consulta = (time.perf_counter() - inicio) / len(tuplas)
+    inicio = time.perf_counter()
+    q.rows(consultas)
+    lote = time.perf_counter() - inicio
+    return {"states": space.n_states, "entries": len(q), "bytes": q.nbytes,
+            "ns_per_lookup": por_consulta * 1e9, "lookups_per_sec": len(consultas) / lote}
+
+
+def main(argv=None):
+    from .controllers import STATE_SPACES
+    parser = argparse.ArgumentParser(prog="python -m src.qstore",
+                                     description="Memória e custo de consulta da Q-table por espaço de estados")
+    parser.add_argument("--spaces", nargs="+", default=list(STATE_SPACES), choices=list(STATE_SPACES))
+    parser.add_argument("--entries", type=int, default=100_000, help="estados visitados simulados")
+    args = parser.parse_args(argv)
+
+    print(f"{'espaço':>8} {'estados':>12} {'armaz.':>6} {'guardados':>10} {'memória':>10} "
+          f"{'ns/consulta':>12} {'consultas/s (lote)':>19}")
+    for nome in args.spaces:
+        space = STATE_SPACES[nome]
+        for storage in ("dense", "hash"):
+            r = medir(space, storage, args.entries)
+            if r["ns_per_lookup"] is None:
+                print(f"{nome:>8} {r['states']:>12,} {storage:>6} {'-':>10} {r['bytes'] / 2**20:>8.0f}MB "
+                      f"{'não cabe':>12} {'-':>19}")
+                continue
+            print(f"{nome:>8} {r['states']:>12,} {storage:>6} {r['entries']:>10,} {r['bytes'] / 2**20:>8.2f}MB "
+                  f"{r['ns_per_lookup']:>12.0f} {r['lookups_per_sec']:>19,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Replay de experiência para o treino do `QLearningController`.
+
+`ReplayBuffer` guarda as transições em arrays NumPy pré-alocados usados como
+anel: índice do estado (a tupla de `discretize_state` achatada por
+`StateSpace.index`), ação, recompensa, índice do próximo estado e fim de
+episódio. Quando enche, as transições mais antigas são sobrescritas.
+
+`td_update` aplica a atualização de Q-learning a um minilote inteiro de uma
+vez: os alvos saem de uma consulta em lote à Q-table (densa ou em hash, ver
+`src.qstore`) e os incrementos são espalhados com `np.add.at`. Um par (estado, ação) que aparece k vezes no lote
+anda `1 - (1 - alpha) ** k` em direção à média dos seus alvos, como k
+atualizações sequenciais, sem passar do alvo.
+
+Com `prioritized=True` o sorteio é proporcional a `|erro TD| ** alpha`
+(replay priorizado), com pesos de importância `(N * P) ** -beta`; as
+prioridades ficam numa árvore de somas, então sortear e atualizar um lote
+custa O(lote · log capacidade) em vez de percorrer o buffer.
+"""
+import numpy as np
+
+from .qstore import DenseQ
+
+
+class ReplayBuffer:
+    """Anel de `capacity` transições em arrays NumPy"""
+    def __init__(self, capacity=100_000, prioritized=False, alpha=0.6, beta=0.4, eps=1e-3, seed=None):
+        self.capacity = capacity
+        self.state = np.zeros(capacity, dtype=np.int64)
+        self.action = np.zeros(capacity, dtype=np.int8)
+        self.reward = np.zeros(capacity, dtype=np.float64)
+        self.next_state = np.zeros(capacity, dtype=np.int64)
+        self.done = np.zeros(capacity, dtype=bool)
+        self.prioritized = prioritized
+        if prioritized:
+            # árvore de somas: folhas em `[folhas, folhas + capacity)`, o nó i soma 2i e 2i + 1
+            self._folhas = 1 << max(0, capacity - 1).bit_length()
+            self._arvore = np.zeros(2 * self._folhas, dtype=np.float64)
+            self.priority = self._arvore[self._folhas:self._folhas + capacity]
+        else:
+            self.priority = None
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.rng = np.random.default_rng(seed)
+        self.pos = 0
+        self.size = 0
+        self.added = 0
+        self._max_prioridade = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add_many(self, state, action, reward, next_state, done=None):
+        """Anexa um bloco de transições (p.ex. um episódio), dando a volta no anel"""
+        n = len(state)
+        if n > self.capacity:
+            cortar = slice(n - self.capacity, None)
+            state, action, reward, next_state = state[cortar], action[cortar], reward[cortar], next_state[cortar]
+            done = None if done is None else done[cortar]
+            n = self.capacity
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.state[idx] = state
+        self.action[idx] = action
+        self.reward[idx] = reward
+        self.next_state[idx] = next_state
+        self.done[idx] = False if done is None else done
+        if self.prioritized:
+            # transições novas entram com a maior prioridade vista
+            self._definir(idx, self._max_prioridade)
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.added += n
+
+    def add(self, state, action, reward, next_state, done=False):
+        self.add_many([state], [action], [reward], [next_state], [done])
+
+    def sample(self, batch_size):
+        """Índices de um minilote e os pesos de importância (None sem priorização)"""
+        if not self.prioritized:
+            return self.rng.integers(0, self.size, batch_size), None
+        arvore = self._arvore
+        total = arvore[1]
+        # desce a árvore com o lote inteiro: um nível por iteração
+        alvo = self.rng.random(batch_size) * total
+        no = np.ones(batch_size, dtype=np.int64)
+        while no[0] < self._folhas:
+            esquerda = 2 * no
+            direita = alvo >= arvore[esquerda]
+            alvo -= arvore[esquerda] * direita
+            no = esquerda + direita
+        idx = np.minimum(no - self._folhas, self.size - 1)
+        pesos = (self.size * self.priority[idx] / total) ** -self.beta
+        return idx, pesos / pesos.max()
+
+    def _definir(self, idx, prioridade):
+        arvore = self._arvore
+        no = np.asarray(idx) + self._folhas
+        arvore[no] = prioridade
+        while no[0] > 1:
+            # nós repetidos só recebem a mesma soma de novo
+            no = no >> 1
+            arvore[no] = arvore[2 * no] + arvore[2 * no + 1]
+
+    def update_priorities(self, idx, td):
+        if not self.prioritized:
+            return
+        prioridade = (np.abs(td) + self.eps) ** self.alpha
+        self._definir(idx, prioridade)
+        self._max_prioridade = max(self._max_prioridade, float(prioridade.max()))
+
+
+def td_update(q, state, action, reward, next_state, done, alpha, gamma, weights=None):
+    """Atualização de Q-learning de um minilote; devolve os erros TD
+
+    `q` (array denso, `DenseQ` ou `HashQ`) é atualizada no lugar; os estados
+    são índices achatados.
+    """
+    if isinstance(q, np.ndarray):
+        q = DenseQ(q)
+    alvo = reward + gamma * np.where(done, 0.0, q.rows(next_state).max(axis=1))
+    td = alvo - q.rows(state)[np.arange(len(state)), action]
+    passo = td if weights is None else weights * td
+    # k repetições de um par (estado, ação) no lote andam o mesmo que k
+    # atualizações sequenciais em direção ao alvo médio: 1 - (1 - alpha) ** k
+    _, par, repeticoes = np.unique(state * q.n_actions + action, return_inverse=True, return_counts=True)
+    repeticoes = repeticoes[par]
+    q.add_at(state, action, (1 - (1 - alpha) ** repeticoes) / repeticoes * passo)
+    return td
+
+
+def replay_step(agent, buffer, batch_size=64):
+    """Sorteia um minilote de `buffer` e atualiza a Q-table de `agent`"""
+    idx, pesos = buffer.sample(batch_size)
+    td = td_update(agent.q, buffer.state[idx], buffer.action[idx], buffer.reward[idx],
+                   buffer.next_state[idx], buffer.done[idx], agent.alpha, agent.gamma, pesos)
+    buffer.update_priorities(idx, td)
+    return td
@@ -0,0 +1,150 @@
+"""
+Gerador de números aleatórios de uma simulação.
+
+`run_simulation` sorteava tudo nos geradores globais (`random` e o legado
+`np.random`), um valor por chamada e com o estado compartilhado entre
+execuções do mesmo processo. `SimRNG(seed)` é o gerador de uma execução:
+cada parte da simulação consome o seu `Stream` nomeado (`"arrivals"`,
+`"lane_A"`, `"sensor"`, `"detectors"`), derivado da semente por
+`numpy.random.SeedSequence`, então sortear mais numa parte não desloca os
+sorteios das outras.
+
+Um `Stream` sorteia em blocos de `block` valores com um
+`numpy.random.Generator` e os entrega um a um. Ele tem a interface do
+módulo `random` usada pela simulação (`random`, `uniform`, `randint`), então
+vias e controladores aceitam um ou outro em `rng=`.
+
+`getstate()`/`setstate()` (em `Stream` e em `SimRNG`) guardam e retomam o
+ponto exato dos sorteios, para continuar uma execução a partir de um
+snapshot (`src.rollout.IntersectionState`).
+
+Para execuções em paralelo, `SimRNG(seed).spawn(n)` devolve `n` geradores
+independentes e reprodutíveis (o i-ésimo depende só de `seed` e `i`).
+"""
+import itertools
+import operator
+import zlib
+
+import numpy as np
+
+BLOCO = 4096
+
+# Primeiro elemento da `spawn_key` filha: substreams nomeados x execuções
+_CHAVE_STREAM = 0
+_CHAVE_FILHO = 1
+
+
+def _sementes(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+class Stream:
+    """
+    Substream com sorteios pré-gerados em blocos.
+
+    `random()` e os amostradores de `sampler` são o `__next__` de um iterador
+    sobre os blocos, chamado direto em C; só a troca de bloco volta ao Python.
+
+    `getstate()` guarda o estado do gerador e, de cada amostrador, o bloco
+    corrente e o cursor nele. `setstate()` continua dali: `random`, `uniform`,
+    `randint` e `poisson` seguem na hora, e quem guardou um amostrador de
+    `sampler` pede um novo (com o mesmo método e argumentos, na mesma ordem)
+    depois do `setstate`.
+    """
+    def __init__(self, seed=None, block=BLOCO):
+        self.seed_seq = _sementes(seed)
+        self.block = block
+        self.generator = np.random.Generator(np.random.PCG64(self.seed_seq))
+        self._iniciar({})
+
+    def _iniciar(self, pendentes):
+        # amostradores criados, em ordem: [metodo, args, bloco, iterador do bloco]
+        self._amostradores = []
+        # blocos restaurados por `setstate` ainda não retomados, por (metodo, args)
+        self._pendentes = pendentes
+        self._poisson = {}
+        self.random = self.sampler("random")
+
+    def sampler(self, metodo, *args):
+        """Função sem argumentos que devolve um sorteio de `generator.<metodo>(*args)` por chamada"""
+        gerar = getattr(self.generator, metodo)
+        estado = [metodo, args, [], iter(())]
+        self._amostradores.append(estado)
+        fila = self._pendentes.get((metodo, args))
+        retomar = fila.pop(0) if fila else None
+
+        def blocos():
+            if retomar is not None:
+                bloco, cursor = retomar
+                estado[2], estado[3] = bloco, iter(bloco[cursor:])
+                yield estado[3]
+            while True:
+                bloco = gerar(*args, size=self.block).tolist()
+                estado[2], estado[3] = bloco, iter(bloco)
+                yield estado[3]
+        return itertools.chain.from_iterable(blocos()).__next__
+
+    def getstate(self):
+        """Estado copiável: gerador, blocos correntes e cursores"""
+        amostradores = [(metodo, args, bloco, len(bloco) - operator.length_hint(it))
+                        for metodo, args, bloco, it in self._amostradores]
+        return {"block": self.block, "bit_generator": self.generator.bit_generator.state,
+                "samplers": amostradores}
+
+    def setstate(self, state):
+        """Continua do ponto de `getstate` (amostradores antigos de `sampler` ficam inválidos)"""
+        self.block = state["block"]
+        self.generator.bit_generator.state = state["bit_generator"]
+        pendentes = {}
+        for metodo, args, bloco, cursor in state["samplers"]:
+            # blocos nunca são alterados: compartilhar com o estado basta
+            pendentes.setdefault((metodo, args), []).append((bloco, cursor))
+        self._iniciar(pendentes)
+
+    def uniform(self, a, b):
+        # mesma fórmula de `random.uniform`
+        return a + (b - a) * self.random()
+
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    def poisson(self, lam):
+        """Um sorteio de Poisson; cada `lam` distinto mantém o seu bloco"""
+        amostrar = self._poisson.get(lam)
+        if amostrar is None:
+            amostrar = self._poisson[lam] = self.sampler("poisson", lam)
+        return amostrar()
+
+
+class SimRNG:
+    """Semente de uma execução e os seus substreams nomeados"""
+    def __init__(self, seed=None, block=BLOCO):
+        self.seed_seq = _sementes(seed)
+        self.block = block
+        self._streams = {}
+
+    def _filho(self, *chave):
+        return np.random.SeedSequence(self.seed_seq.entropy,
+                                      spawn_key=self.seed_seq.spawn_key + chave)
+
+    def stream(self, nome):
+        """`Stream` do nome dado (o mesmo objeto a cada chamada)"""
+        s = self._streams.get(nome)
+        if s is None:
+            chave = zlib.crc32(nome.encode())
+            s = self._streams[nome] = Stream(self._filho(_CHAVE_STREAM, chave), self.block)
+        return s
+
+    def getstate(self):
+        """Estado de todos os streams já criados (ver `Stream.getstate`)"""
+        return {"streams": {nome: s.getstate() for nome, s in self._streams.items()}}
+
+    def setstate(self, state):
+        for nome, estado in state["streams"].items():
+            self.stream(nome).setstate(estado)
+
+    def spawn(self, n, start=0):
+        """Geradores independentes para as execuções `start .. start + n - 1`"""
+        return [SimRNG(self._filho(_CHAVE_FILHO, i), self.block) for i in range(start, start + n)]
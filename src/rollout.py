@@ -0,0 +1,246 @@
+"""
+Fork do estado de um cruzamento e controle por simulação à frente (rollout).
+
+`IntersectionState.capture(laneA, laneB, controller)` guarda tudo o que o
+próximo tick lê, numa estrutura pequena e copiável: as duas vias como
+`LaneState` (posições, esperas e tipo dos veículos em arrays), os atributos
+do controlador (fase, temporizadores, limites) sem as referências às vias,
+o relógio, o próximo id de veículo e o estado do gerador quando ele o expõe
+(`getstate` de `random.Random`, `src.rng.Stream` ou `src.rng.SimRNG`).
+Com o `SimRNG` de `run_simulation`, `restore()` religa as vias e o
+controlador aos seus streams e a execução continua tick a tick como a
+original; a fonte de chegadas é religada por quem restaura
+(`arrivals.bind(rng.stream("arrivals"))`).
+
+Os arrays de um snapshot nunca são alterados, então `fork()` só copia a
+casca, e `restore()` cria vias e controlador novos, independentes do
+original. A Q-table e os parâmetros do controlador são compartilhados, não
+copiados.
+
+`RolloutController` é um `ActuatedController` que, a cada tick em que pode
+trocar de fase, faz o fork do cruzamento e simula `rollout_horizon`
+segundos à frente para "manter" e para "trocar agora", seguindo a lógica
+atuada depois da primeira ação, e fica com a de menor atraso acumulado
+(veículos parados x segundos). Cada rodada sorteia as mesmas chegadas para
+as duas ações (números aleatórios comuns), então poucas rodadas já separam
+as ações. As rodadas rodam no próprio processo ou num pool de threads ou
+processos e param no fim do orçamento de tempo de cada decisão.
+
+Parâmetros (em `params`):
+    rollout_horizon   segundos simulados à frente (30)
+    rollouts          rodadas por decisão (8)
+    rollout_budget    segundos de relógio por decisão (None: sempre todas
+                      as rodadas, resultado reprodutível)
+    rollout_workers   0 roda no processo; n > 0 usa um pool de n workers
+    rollout_executor  "thread", "process" ou um `concurrent.futures.Executor`
+    rollout_engine    "object" (`Lane`, mais rápido em filas curtas) ou "array"
+"""
+import math
+import random
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from .controllers import ActuatedController
+from .rng import SimRNG, Stream
+from .simulation import ArrayLane, Lane
+
+ACTIONS = ('hold', 'switch')
+ENGINES = {'array': ArrayLane, 'object': Lane}
+
+# Atributos do controlador que não entram no snapshot (vias e gerador são
+# religados em `restore`; o log de verdes do fork começa vazio)
+NAO_COPIAR = frozenset({"laneA", "laneB", "rng", "green_times_log"})
+
+
+class IntersectionState:
+    """Estado completo de um cruzamento: vias, controlador, relógio e gerador"""
+    __slots__ = ("t", "vehicle_id", "lanes", "controller_cls", "controller", "rng_state")
+
+    def __init__(self, t, vehicle_id, lanes, controller_cls, controller, rng_state=None):
+        self.t = t
+        self.vehicle_id = vehicle_id
+        self.lanes = lanes
+        self.controller_cls = controller_cls
+        self.controller = controller
+        self.rng_state = rng_state
+
+    @classmethod
+    def capture(cls, laneA, laneB, controller, t=0, vehicle_id=0, rng=None):
+        """Snapshot das vias e do controlador
+
+        `rng` é o gerador a continuar no fork (p.ex. o `SimRNG` de
+        `run_simulation` ou o `random.Random` das vias); só o seu estado é
+        guardado, e só se ele tiver `getstate` (copiar o estado do Mersenne
+        Twister custa mais que o resto).
+        """
+        extras = getattr(controller, "fork_exclude", ())
+        fora = NAO_COPIAR.union(extras) if extras else NAO_COPIAR
+        estado = {k: v for k, v in vars(controller).items() if k not in fora}
+        rng_state = rng.getstate() if hasattr(rng, "getstate") else None
+        return cls(t, vehicle_id, (laneA.snapshot(), laneB.snapshot()),
+                   type(controller), estado, rng_state)
+
+    def fork(self):
+        """Cópia independente (os arrays das vias são compartilhados, só leitura)"""
+        return IntersectionState(self.t, self.vehicle_id, self.lanes, self.controller_cls,
+                                 dict(self.controller), self.rng_state)
+
+    def restore(self, rng=None, lane_cls=ArrayLane, controller_cls=None):
+        """Vias e controlador novos neste estado: `(laneA, laneB, controller)`
+
+        Sem `rng`, um gerador do tipo capturado continua do estado guardado
+        (sem estado, um `random.Random` com semente do sistema). Com um
+        `SimRNG`, as vias e o controlador usam os streams "lane_A", "lane_B"
+        e "sensor", como em `run_simulation`; para continuar a execução
+        capturada, passe um `SimRNG` com `setstate(state.rng_state)` e religue
+        nele as chegadas e os detectores. `controller_cls` troca a classe do
+        controlador restaurado por uma compatível (p.ex. a política base de
+        um rollout).
+        """
+        if rng is None:
+            rng = _gerador(self.rng_state)
+        if isinstance(rng, SimRNG):
+            rng_a, rng_b, rng_c = rng.stream("lane_A"), rng.stream("lane_B"), rng.stream("sensor")
+        else:
+            rng_a = rng_b = rng_c = rng
+        laneA = lane_cls.from_snapshot(self.lanes[0], rng=rng_a)
+        laneB = lane_cls.from_snapshot(self.lanes[1], rng=rng_b)
+        cls = controller_cls or self.controller_cls
+        c = cls.__new__(cls)
+        vars(c).update(self.controller)
+        c.laneA = laneA
+        c.laneB = laneB
+        c.rng = rng_c
+        c.green_times_log = []
+        return laneA, laneB, c
+
+
+def _gerador(estado):
+    """Gerador novo no estado capturado, do mesmo tipo que o original"""
+    if estado is None:
+        return random.Random()
+    if isinstance(estado, dict):
+        rng = SimRNG() if "streams" in estado else Stream()
+    else:
+        rng = random.Random()
+    rng.setstate(estado)
+    return rng
+
+
+def _poisson(rng, limite):
+    """Um sorteio de Poisson pelo produto de uniformes; `limite` = exp(-lambda)"""
+    k = 0
+    p = rng.random()
+    while p > limite:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def rollout(state, actions, params, horizon=30, seed=0, lane_cls=Lane, policy=ActuatedController):
+    """Atraso acumulado em `horizon` segundos a partir de `state`, um por ação
+
+    A primeira ação é forçada e o resto do horizonte segue `policy`. Todas
+    as ações veem as mesmas chegadas (gerador próprio com `seed`).
+    """
+    dt = params['dt']
+    taxa = params['taxa_escoamento']
+    bus_prob = params.get('prob_prioridade', 0.0)
+    limite_a = math.exp(-params['media_a'] / 60 * dt)
+    limite_b = math.exp(-params['media_b'] / 60 * dt)
+    n = max(1, int(round(horizon / dt)))
+    custos = []
+    for action in actions:
+        chegadas = random.Random(2 * seed)
+        laneA, laneB, c = state.restore(rng=random.Random(2 * seed + 1), lane_cls=lane_cls,
+                                        controller_cls=policy)
+        vehicle_id = state.vehicle_id
+        atraso = 0.0
+        # no tick capturado as chegadas já entraram: começa pela decisão
+        fase = c.apply(action, dt)
+        for tick in range(n):
+            if tick:
+                chegA = _poisson(chegadas, limite_a)
+                chegB = _poisson(chegadas, limite_b)
+                laneA.add_vehicles(chegA, vehicle_id, bus_prob=bus_prob)
+                laneB.add_vehicles(chegB, vehicle_id + chegA, bus_prob=bus_prob)
+                vehicle_id += chegA + chegB
+                fase = c.step(dt)
+            laneA.step_logic(fase == 'A', dt, taxa)
+            laneB.step_logic(fase == 'B', dt, taxa)
+            atraso += (laneA.stopped + laneB.stopped) * dt
+        custos.append(atraso)
+    return custos
+
+
+def _executor(tipo, workers):
+    if tipo == "process":
+        return ProcessPoolExecutor(workers)
+    if tipo == "thread":
+        return ThreadPoolExecutor(workers)
+    raise ValueError(f"rollout_executor desconhecido: {tipo!r} (use 'thread' ou 'process')")
+
+
+class RolloutController(ActuatedController):
+    """Controlador por rollout: simula manter e trocar antes de cada decisão"""
+    fork_exclude = ("executor", "lane_cls", "decisions", "rounds")
+
+    def __init__(self, laneA, laneB, params, rng=random):
+        super().__init__(laneA, laneB, params, rng=rng)
+        # o executor não vai junto para os snapshots enviados aos workers
+        self.params = {k: v for k, v in params.items() if k != 'rollout_executor'}
+        self.horizon = params.get('rollout_horizon', 30)
+        self.n_rollouts = params.get('rollouts', 8)
+        self.budget = params.get('rollout_budget')
+        self.lane_cls = ENGINES[params.get('rollout_engine', 'object')]
+        # sementes das rodadas: reprodutíveis a partir do gerador do controlador
+        self.seed = rng.randint(0, 2**31 - 1)
+        self.decisions = 0
+        self.rounds = 0
+        self.executor = None
+        executor = params.get('rollout_executor', "thread")
+        workers = params.get('rollout_workers', 0)
+        if not isinstance(executor, str):
+            self.executor = executor
+        elif workers:
+            self.executor = _executor(executor, workers)
+            weakref.finalize(self, self.executor.shutdown, wait=False, cancel_futures=True)
+
+    def decide(self, **kwargs):
+        if 'YELLOW' in self.phase or self.phase_time < self.params.get('g_min', 16):
+            return super().decide(**kwargs)
+        if self.phase_time >= self.params.get('g_max', 90):
+            return 'switch'
+        outra = self.laneB if self.phase == 'A' else self.laneA
+        if not outra.queue_length():
+            return 'hold'
+        custos = self.evaluate()
+        # empate mantém a fase
+        return 'switch' if custos[1] < custos[0] else 'hold'
+
+    def evaluate(self, actions=ACTIONS):
+        """Atraso médio previsto de cada ação, na ordem de `actions`"""
+        state = IntersectionState.capture(self.laneA, self.laneB, self)
+        sementes = [self.seed + self.decisions * self.n_rollouts + r for r in range(self.n_rollouts)]
+        self.decisions += 1
+        args = (actions, self.params, self.horizon)
+        if self.executor is None:
+            limite = None if self.budget is None else time.perf_counter() + self.budget
+            resultados = []
+            for s in sementes:
+                resultados.append(rollout(state, *args, seed=s, lane_cls=self.lane_cls))
+                if limite is not None and time.perf_counter() >= limite:
+                    break
+        else:
+            futuros = [self.executor.submit(rollout, state, *args, seed=s, lane_cls=self.lane_cls)
+                       for s in sementes]
+            feitos, pendentes = wait(futuros, timeout=self.budget)
+            if not feitos:
+                # nenhuma rodada no prazo: espera a primeira para poder decidir
+                feitos, pendentes = wait(futuros, return_when=FIRST_COMPLETED)
+            for f in pendentes:
+                f.cancel()
+            resultados = [f.result() for f in feitos]
+        self.rounds += len(resultados)
+        return [sum(r[i] for r in resultados) / len(resultados) for i in range(len(actions))]
@@ -0,0 +1,119 @@
+"""
+Execução das simulações do app fora da thread da interface.
+
+`RunManager` roda cada simulação num pool de processos compartilhado pelo
+servidor e guarda os resultados numa LRU indexada por
+`(controlador, params, semente, impressão digital do modelo)`: a mesma
+consulta feita de novo, por qualquer sessão, reaproveita a execução (pronta
+ou ainda em andamento). Enquanto roda, a simulação envia os snapshots em
+blocos de colunas e `Execucao.parcial` vai crescendo, o que permite desenhar
+o gráfico das filas aos poucos.
+"""
+import hashlib
+import json
+import multiprocessing as mp
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .controllers import ActuatedController, QLearningController
+from .snapshots import Snapshots
+from .utils import run_simulation
+
+CONTROLLERS = {
+    'actuated': ActuatedController,
+    'qlearning': QLearningController,
+}
+
+
+def model_fingerprint(path):
+    """sha256 do arquivo do modelo (None sem modelo)"""
+    if not path:
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def chave_execucao(nome, params, seed, fingerprint=None):
+    """Chave de cache: parâmetros completos, semente e modelo"""
+    return (nome, json.dumps(params, sort_keys=True, default=str), int(seed), fingerprint)
+
+
+def _executar(nome, params, seed, fila, progress_every):
+    """Roda num worker; os snapshots parciais vão para `fila`"""
+    def enviar(novos, t):
+        fila.put(novos)
+    try:
+        return run_simulation(CONTROLLERS[nome], params, seed, detectors=True,
+                              progress=enviar, progress_every=progress_every)
+    finally:
+        fila.put(None)
+
+
+class Execucao:
+    """Uma simulação submetida ao pool; `parcial` junta os snapshots recebidos"""
+    def __init__(self, future, fila):
+        self.future = future
+        self._blocos = []
+        self._leitor = threading.Thread(target=self._ler, args=(fila,), daemon=True)
+        self._leitor.start()
+
+    def _ler(self, fila):
+        while True:
+            novos = fila.get()
+            if novos is None:
+                break
+            self._blocos.append(novos)
+
+    @property
+    def parcial(self):
+        return Snapshots.concat(list(self._blocos))
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class RunManager:
+    """Pool de processos e cache LRU de execuções, um por servidor"""
+    def __init__(self, workers=2, max_entries=64, progress_every=60):
+        ctx = mp.get_context("spawn")
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        self._manager = ctx.Manager()
+        self.max_entries = max_entries
+        self.progress_every = progress_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, nome, params, seed, fingerprint=None):
+        """Devolve a `Execucao` da consulta, reaproveitando a do cache se houver"""
+        chave = chave_execucao(nome, params, seed, fingerprint)
+        with self._lock:
+            execucao = self._entries.get(chave)
+            falhou = execucao is not None and execucao.done() and execucao.future.exception() is not None
+            if execucao is not None and not falhou:
+                self._entries.move_to_end(chave)
+                self.hits += 1
+                return execucao
+            self.misses += 1
+            fila = self._manager.Queue()
+            future = self.pool.submit(_executar, nome, params, seed, fila, self.progress_every)
+            execucao = Execucao(future, fila)
+            self._entries[chave] = execucao
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return execucao
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
@@ -0,0 +1,367 @@
+"""
+Serviço de controle em tempo real: `python -m src.service`.
+
+Fora da simulação, os controladores leem contagens de detectores reais: cada
+cruzamento ganha duas `DetectorLane`, atualizadas pelas mensagens que chegam
+(socket TCP, arquivo acompanhado como `tail -f` ou replay de snapshots
+gravados), e `ControllerService` roda a decisão de todos os cruzamentos num
+único laço asyncio, a cada `cadence` segundos, publicando os comandos de fase.
+
+Cada tick tem um prazo (`deadline`, contado a partir do horário previsto do
+tick). Um cruzamento cuja decisão não começa ou não termina dentro do prazo
+recebe o comando de manter a fase atual, e o estado do controlador volta ao
+de antes da decisão, para não divergir do que foi publicado. A latência
+(horário previsto do tick até o comando), o tempo de cálculo de cada decisão
+e a vazão ficam em `stats()`.
+
+Mensagens de detectores (uma por linha, JSON): {"id": "I0", "A": 12, "B": 3}
+
+Uso:
+    python -m src.service run --intersections I0,I1 --listen 127.0.0.1:9100 --cadence 1
+    python -m src.service run --intersections I0 --tail detectores.jsonl --controller qlearning
+    python -m src.service replay --intersections 1000 --cadence 0.1 --deadline 0.02 --ticks 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .controllers import ActuatedController, QLearningController
+from .simulation import WaitSketch
+from .utils import DEFAULT_PARAMS, converter_valor
+
+
+class DetectorLane:
+    """Via alimentada por contagens de detectores, no lugar de `Lane`"""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.updated = None
+
+    def queue_length(self):
+        return self.count
+
+
+class LiveActuatedController(ActuatedController):
+    """`ActuatedController` sem o ruído de sensor simulado: a contagem já é a medida"""
+    def sense(self):
+        return self.laneA.queue_length(), self.laneB.queue_length()
+
+
+CONTROLLERS = {
+    'actuated': LiveActuatedController,
+    'qlearning': QLearningController,
+}
+
+
+def _manter(controller, dt):
+    """Fallback: a fase atual dura mais um tick"""
+    if getattr(controller, "in_yellow", False):
+        controller.yellow_timer += dt
+    else:
+        controller.phase_time += dt
+
+
+class Intersection:
+    """Um cruzamento do serviço: vias de detector, controlador e último comando"""
+    def __init__(self, id, controller="actuated", params=None):
+        self.id = id
+        self.laneA = DetectorLane("A")
+        self.laneB = DetectorLane("B")
+        self.controller = CONTROLLERS[controller](self.laneA, self.laneB, params or DEFAULT_PARAMS)
+        self.phase = self.controller.phase
+        self.fallbacks = 0
+
+
+class ControllerService:
+    """Decide todos os cruzamentos a cada `cadence` segundos e publica os comandos
+
+    `publish(t, comandos)` recebe, a cada tick, a lista de
+    `(id, fase, fallback)`. `batch` é quantos cruzamentos são decididos entre
+    uma devolução e outra do controle ao laço (para ler detectores).
+    """
+    def __init__(self, intersections, cadence=1.0, deadline=None, publish=None, batch=256):
+        self.intersections = {i.id: i for i in intersections}
+        self.cadence = cadence
+        self.deadline = deadline if deadline is not None else cadence / 2
+        self.publish = publish
+        self.batch = batch
+        self.latency = WaitSketch(resolucao=1e-6, n_bins=4096)
+        self.compute = WaitSketch(resolucao=1e-6, n_bins=256)
+        self.ticks = 0
+        self.decisions = 0
+        self.fallbacks = 0
+        self.messages = 0
+        self.ignored = 0
+        self.busy = 0.0
+        self.wall = 0.0
+
+    def update(self, id, A=None, B=None, t=None):
+        """Aplica uma leitura de detector (contagens ausentes mantêm o valor anterior)"""
+        cruzamento = self.intersections.get(id)
+        self.messages += 1
+        if cruzamento is None:
+            self.ignored += 1
+            return
+        agora = time.monotonic() if t is None else t
+        for lane, valor in ((cruzamento.laneA, A), (cruzamento.laneB, B)):
+            if valor is not None:
+                lane.count = max(0, int(valor))
+                lane.updated = agora
+
+    def handle_line(self, linha):
+        linha = linha.strip()
+        if not linha:
+            return
+        try:
+            self.update(**json.loads(linha))
+        except (ValueError, TypeError):
+            self.ignored += 1
+
+    async def _tick(self, previsto):
+        limite = previsto + self.deadline
+        dt = self.cadence
+        comandos = []
+        inicio = time.monotonic()
+        for k, cruzamento in enumerate(self.intersections.values()):
+            if k and k % self.batch == 0:
+                await asyncio.sleep(0)
+            c = cruzamento.controller
+            antes = time.monotonic()
+            fallback = antes >= limite
+            if not fallback:
+                estado = dict(vars(c))
+                n_log = len(c.green_times_log)
+                c.step(dt)
+                depois = time.monotonic()
+                self.compute.add(depois - antes)
+                if depois > limite:
+                    # terminou fora do prazo: descarta a decisão
+                    vars(c).clear()
+                    vars(c).update(estado)
+                    del c.green_times_log[n_log:]
+                    fallback = True
+            if fallback:
+                _manter(c, dt)
+                cruzamento.fallbacks += 1
+                self.fallbacks += 1
+            cruzamento.phase = c.phase
+            self.decisions += 1
+            self.latency.add(max(0.0, time.monotonic() - previsto))
+            comandos.append((cruzamento.id, c.phase, fallback))
+        self.busy += time.monotonic() - inicio
+        self.ticks += 1
+        if self.publish:
+            self.publish(previsto, comandos)
+
+    async def run(self, feeds=(), ticks=None):
+        """Roda o laço de decisão (para sempre, ou `ticks` ticks) consumindo os `feeds`
+
+        Cada feed é um iterador assíncrono de linhas ou de dicts de leitura.
+        """
+        tarefas = [asyncio.create_task(self._consumir(f)) for f in feeds]
+        inicio = time.monotonic()
+        k = 0
+        try:
+            while ticks is None or k < ticks:
+                previsto = inicio + k * self.cadence
+                espera = previsto - time.monotonic()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                await self._tick(previsto)
+                k += 1
+        finally:
+            self.wall += time.monotonic() - inicio
+            for t in tarefas:
+                t.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+
+    async def _consumir(self, feed):
+        async for msg in feed:
+            if isinstance(msg, dict):
+                self.update(**msg)
+            else:
+                self.handle_line(msg)
+
+    async def serve_detectors(self, host="127.0.0.1", port=9100):
+        """Servidor TCP: cada conexão envia leituras, uma por linha"""
+        async def atender(reader, writer):
+            try:
+                async for linha in reader:
+                    self.handle_line(linha.decode())
+            finally:
+                writer.close()
+        return await asyncio.start_server(atender, host, port)
+
+    def stats(self):
+        return {
+            "intersections": len(self.intersections),
+            "ticks": self.ticks,
+            "decisions": self.decisions,
+            "fallbacks": self.fallbacks,
+            "messages": self.messages,
+            "ignored_messages": self.ignored,
+            "latency_p50_ms": self.latency.quantile(0.50) * 1e3,
+            "latency_p99_ms": self.latency.quantile(0.99) * 1e3,
+            "latency_max_ms": self.latency.max * 1e3,
+            "compute_p50_us": self.compute.quantile(0.50) * 1e6,
+            "compute_p99_us": self.compute.quantile(0.99) * 1e6,
+            "decisions_per_sec": self.decisions / self.busy if self.busy else 0.0,
+            "utilization": self.busy / self.wall if self.wall else 0.0,
+        }
+
+
+async def tail_feed(path, poll=0.1):
+    """Linhas acrescentadas a `path` (como `tail -f`), a partir do fim atual"""
+    with open(path) as f:
+        f.seek(0, os.SEEK_END)
+        parcial = ""
+        while True:
+            linha = f.readline()
+            if not linha:
+                await asyncio.sleep(poll)
+                continue
+            parcial += linha
+            if parcial.endswith("\n"):
+                yield parcial
+                parcial = ""
+
+
+async def replay_feed(recordings, cadence=1.0, speed=1.0, start=None):
+    """Reproduz snapshots gravados como leituras de detector
+
+    `recordings` mapeia o id do cruzamento para um `Snapshots` (ou
+    qualquer coisa com colunas `qA` e `qB`); a linha k de todos é enviada
+    no instante `k * cadence / speed`.
+    """
+    inicio = time.monotonic() if start is None else start
+    passo = cadence / speed
+    n = max(len(s.qA) for s in recordings.values())
+    for k in range(n):
+        espera = inicio + k * passo - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        for id, s in recordings.items():
+            if k < len(s.qA):
+                yield {"id": id, "A": int(s.qA[k]), "B": int(s.qB[k])}
+
+
+def gravacoes(ids, params=None, seeds=4, controller_cls=ActuatedController):
+    """Snapshots simulados para o replay: `seeds` execuções distribuídas entre os `ids`"""
+    from .utils import run_simulation
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    execucoes = [run_simulation(controller_cls, params, seed)["snapshots"] for seed in range(seeds)]
+    return {id: execucoes[i % seeds] for i, id in enumerate(ids)}
+
+
+def run_replay(n_intersections=100, cadence=0.1, deadline=None, ticks=300, controller="actuated",
+               params=None, seeds=4, recordings=None):
+    """Teste de carga: replay de snapshots em `n_intersections` cruzamentos; devolve `stats()`"""
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    ids = [f"I{i}" for i in range(n_intersections)]
+    if recordings is None:
+        recordings = gravacoes(ids, params, seeds)
+    else:
+        recordings = {id: recordings[i % len(recordings)] for i, id in enumerate(ids)}
+    servico = ControllerService([Intersection(id, controller, params) for id in ids],
+                                cadence=cadence, deadline=deadline)
+
+    async def principal():
+        await servico.run([replay_feed(recordings, cadence)], ticks=ticks)
+    asyncio.run(principal())
+    return servico.stats()
+
+
+def _imprimir_comandos(t, comandos):
+    agora = round(time.time(), 3)  # `t` é do relógio monotônico; o comando leva a hora do sistema
+    for id, fase, fallback in comandos:
+        print(json.dumps({"t": agora, "id": id, "phase": fase, "fallback": fallback}))
+    sys.stdout.flush()
+
+
+def _imprimir_stats(stats, file=sys.stderr):
+    print(f"{stats['intersections']} cruzamentos | {stats['ticks']} ticks | {stats['decisions']} decisões "
+          f"({stats['decisions_per_sec']:.0f}/s, uso {stats['utilization']:.0%}) | fallbacks {stats['fallbacks']}",
+          file=file)
+    print(f"latência p50 {stats['latency_p50_ms']:.3f} ms | p99 {stats['latency_p99_ms']:.3f} ms | "
+          f"máx {stats['latency_max_ms']:.3f} ms | cálculo p50 {stats['compute_p50_us']:.1f} µs "
+          f"p99 {stats['compute_p99_us']:.1f} µs", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.service", description="Serviço de controle em tempo real")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument("--controller", default="actuated", choices=list(CONTROLLERS))
+    comum.add_argument("--cadence", type=float, default=1.0, help="intervalo entre decisões (s)")
+    comum.add_argument("--deadline", type=float, help="prazo de cada tick (s); padrão: metade da cadência")
+    comum.add_argument("--set", action="append", default=[], metavar="PARAM=VALOR")
+    comum.add_argument("--model", help="modelo Q-Learning (padrão: o mesmo do app)")
+
+    p_run = sub.add_parser("run", parents=[comum], help="serviço com detectores reais")
+    p_run.add_argument("--intersections", required=True, help="ids separados por vírgula")
+    p_run.add_argument("--listen", metavar="HOST:PORTA", help="recebe leituras por TCP")
+    p_run.add_argument("--tail", metavar="ARQ", help="acompanha leituras acrescentadas ao arquivo")
+    p_run.add_argument("--ticks", type=int, help="para depois de N ticks")
+
+    p_rep = sub.add_parser("replay", parents=[comum], help="teste de carga com snapshots gravados")
+    p_rep.add_argument("--intersections", type=int, default=100)
+    p_rep.add_argument("--ticks", type=int, default=300)
+    p_rep.add_argument("--seeds", type=int, default=4, help="simulações gravadas usadas no replay")
+    p_rep.add_argument("--recording", action="append", default=[],
+                       help="snapshots gravados (diretório .npy ou .parquet de --snapshots-out)")
+    p_rep.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    params = dict(DEFAULT_PARAMS)
+    params.update({k: converter_valor(v) for k, v in (item.split("=", 1) for item in args.set)})
+    if args.controller == "qlearning":
+        from .models import find_model
+        model = args.model or find_model()
+        if model:
+            params.update({"pretrained_path": model, "epsilon": 0.0})
+
+    if args.cmd == "replay":
+        recordings = None
+        if args.recording:
+            from .snapshots import NpySink, ParquetSink
+            recordings = [ParquetSink.load(p) if p.endswith(".parquet") else NpySink.load(p)
+                          for p in args.recording]
+        stats = run_replay(args.intersections, args.cadence, args.deadline, args.ticks, args.controller,
+                           params, args.seeds, recordings)
+        if args.json:
+            json.dump(stats, sys.stdout, indent=2)
+            print()
+        else:
+            _imprimir_stats(stats, sys.stdout)
+        return
+
+    ids = [i for i in args.intersections.split(",") if i]
+    servico = ControllerService([Intersection(id, args.controller, params) for id in ids],
+                                cadence=args.cadence, deadline=args.deadline, publish=_imprimir_comandos)
+
+    async def principal():
+        feeds = []
+        servidor = None
+        if args.listen:
+            host, porta = args.listen.rsplit(":", 1)
+            servidor = await servico.serve_detectors(host, int(porta))
+        if args.tail:
+            feeds.append(tail_feed(args.tail))
+        try:
+            await servico.run(feeds, ticks=args.ticks)
+        finally:
+            if servidor:
+                servidor.close()
+                await servidor.wait_closed()
+    try:
+        asyncio.run(principal())
+    except KeyboardInterrupt:
+        pass
+    _imprimir_stats(servico.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,28 +3,149 @@ import random
 from collections import deque
 
 class Vehicle:
-    def __init__(self, id, is_bus=False):
+    def __init__(self, id, is_bus=False, pos=None):
         self.id = id
         self.is_bus = is_bus
-        self.pos = -random.uniform(5, 25)
+        self.pos = -random.uniform(5, 25) if pos is None else pos
         self.wait_time = 0.0
 
+class WaitSketch:
+    """
+    Histograma de esperas com largura de bin fixa, para percentis em fluxo.
+
+    Com `dt` inteiro as esperas são múltiplos de `resolucao` e os percentis
+    saem exatos (posto mais próximo); em geral o erro é menor que um bin.
+    """
+    def __init__(self, resolucao=1.0, n_bins=256):
+        self.resolucao = resolucao
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _grow(self, idx):
+        if idx >= self.counts.shape[0]:
+            novo = np.zeros(max(2 * self.counts.shape[0], idx + 1), dtype=np.int64)
+            novo[:self.counts.shape[0]] = self.counts
+            self.counts = novo
+
+    def add(self, x):
+        idx = int(x / self.resolucao)
+        self._grow(idx)
+        self.counts[idx] += 1
+        self.n += 1
+        self.total += x
+        if x > self.max:
+            self.max = x
+
+    def add_many(self, xs):
+        if not len(xs):
+            return
+        idx = (np.asarray(xs) / self.resolucao).astype(np.int64)
+        self._grow(int(idx.max()))
+        self.counts[:idx.max() + 1] += np.bincount(idx)
+        self.n += len(xs)
+        for x in np.asarray(xs).tolist():
+            self.total += x
+        self.max = max(self.max, float(np.max(xs)))
+
+    def merge(self, other):
+        """Novo sketch com as amostras dos dois (mesma resolução)"""
+        out = WaitSketch(self.resolucao, max(self.counts.shape[0], other.counts.shape[0]))
+        out.counts[:self.counts.shape[0]] += self.counts
+        out.counts[:other.counts.shape[0]] += other.counts
+        out.n = self.n + other.n
+        out.total = self.total + other.total
+        out.max = max(self.max, other.max)
+        return out
+
+    def mean(self):
+        return self.total / max(1, self.n)
+
+    def quantile(self, q):
+        """Percentil `q` (0-1) pelo posto mais próximo; 0.0 sem amostras"""
+        if not self.n:
+            return 0.0
+        rank = max(1, int(np.ceil(q * self.n)))
+        return float(np.searchsorted(np.cumsum(self.counts), rank)) * self.resolucao
+
+
+class LaneState:
+    """
+    Estado de uma via em arrays contíguos, em ordem de fila (o líder primeiro).
+
+    Sai de `Lane.snapshot()` / `ArrayLane.snapshot()` e volta a ser uma via
+    com `from_snapshot` de qualquer um dos dois motores. Os arrays não são
+    alterados depois de criados, então um fork pode compartilhá-los. O
+    histograma de esperas (`sketch`) fica de fora: a via restaurada começa
+    com um vazio.
+    """
+    __slots__ = ("name", "pos", "wait", "bus", "passed", "wait_max", "wait_sum", "stopped")
+
+    def __init__(self, name, pos, wait, bus, passed=0, wait_max=0.0, wait_sum=0.0, stopped=0):
+        self.name = name
+        self.pos = pos
+        self.wait = wait
+        self.bus = bus
+        self.passed = passed
+        self.wait_max = wait_max
+        self.wait_sum = wait_sum
+        self.stopped = stopped
+
+    def __len__(self):
+        return self.pos.shape[0]
+
+
 class Lane:
-    def __init__(self, name):
+    """
+    Via com um `Vehicle` por veículo.
+
+    `rng` é o gerador dos sorteios da via (tipo de veículo, posição de
+    chegada, vazão do verde): o módulo `random` ou um `src.rng.Stream`.
+    """
+    def __init__(self, name, rng=random):
         self.name = name
+        self.rng = rng
         self.vehicles = deque()
         self.passed = 0
+        # agregados das esperas, atualizados no passo de movimento
+        self.wait_max = 0.0
+        self.wait_sum = 0.0
+        self.stopped = 0
+        self.sketch = WaitSketch()
 
     def add_vehicles(self, n, start_id, bus_prob=0.0):
+        rng = self.rng
         for i in range(n):
-            is_bus = random.random() < bus_prob
-            v = Vehicle(start_id + i, is_bus=is_bus)
+            is_bus = rng.random() < bus_prob
+            v = Vehicle(start_id + i, is_bus=is_bus, pos=-rng.uniform(5, 25))
             self.vehicles.append(v)
         return n
 
     def queue_length(self):
         return len(self.vehicles)
 
+    def snapshot(self):
+        """Estado da via como `LaneState` (os veículos restaurados perdem o id)"""
+        vs = self.vehicles
+        n = len(vs)
+        return LaneState(self.name,
+                         np.fromiter([v.pos for v in vs], float, n),
+                         np.fromiter([v.wait_time for v in vs], float, n),
+                         np.fromiter([v.is_bus for v in vs], bool, n),
+                         self.passed, self.wait_max, self.wait_sum, self.stopped)
+
+    @classmethod
+    def from_snapshot(cls, state, rng=random):
+        lane = cls(state.name, rng=rng)
+        for pos, wait, bus in zip(state.pos.tolist(), state.wait.tolist(), state.bus.tolist()):
+            v = Vehicle(-1, is_bus=bus, pos=pos)
+            v.wait_time = wait
+            lane.vehicles.append(v)
+        lane.passed = state.passed
+        lane.wait_max, lane.wait_sum, lane.stopped = state.wait_max, state.wait_sum, state.stopped
+        return lane
+
     def step_logic(self, is_green, dt, discharge_rate):
         passed_now = 0
         waited_sum = 0.0
@@ -32,7 +153,7 @@ class Lane:
         if is_green:
             expected = discharge_rate * dt
             base = int(np.floor(expected))
-            extra = 1 if random.random() < (expected - base) else 0
+            extra = 1 if self.rng.random() < (expected - base) else 0
             capacity = base + extra
 
             for _ in range(capacity):
@@ -40,9 +161,13 @@ class Lane:
                 if self.vehicles[0].pos > -2: 
                     v = self.vehicles.popleft()
                     waited_sum += v.wait_time
+                    self.sketch.add(v.wait_time)
                     self.passed += 1
                     passed_now += 1
         
+        wait_max = 0.0
+        wait_sum = 0.0
+        stopped = 0
         for i, veh in enumerate(self.vehicles):
             # ...existing movement logic...
             dist_to_next = 100
@@ -63,5 +188,230 @@ class Lane:
             
             if move < 0.1:
                 veh.wait_time += dt
+                stopped += 1
+
+            wait_sum += veh.wait_time
+            if veh.wait_time > wait_max:
+                wait_max = veh.wait_time
 
+        self.wait_max = wait_max
+        self.wait_sum = wait_sum
+        self.stopped = stopped
         return passed_now, waited_sum
+
+    def max_wait(self):
+        """Maior espera acumulada entre os veículos ainda na via (no último passo)"""
+        return self.wait_max
+
+
+def _car_following(pos, is_green, dt, exact=True):
+    """
+    Resolve o passo de movimento de uma ou várias vias de uma vez.
+
+    `pos` tem as posições em ordem de fila no último eixo (o líder primeiro);
+    `is_green` é um bool ou um array broadcastável para `pos[..., 0]`.
+    Retorna `(novas_posicoes, deslocamentos)` com a mesma aritmética de ponto
+    flutuante do laço de `Lane.step_logic`.
+
+    Cada veículo segue o anterior já atualizado, o que é uma recorrência
+    sequencial. Ela é um grampo (clip) em coordenadas deslocadas
+    (z_i = x_i + 2i), e a composição de grampos é outro grampo, então a fila
+    inteira sai de um scan por dobramento em O(log n) passadas vetorizadas.
+    Esse resultado em aritmética real é refinado pela fórmula exata do laço
+    até o ponto fixo; com `exact=False` esse refinamento é pulado e as
+    posições podem diferir do laço em erros de arredondamento.
+    """
+    n = pos.shape[-1]
+    step = 1.5 * dt
+    free = min(step, 5.0)
+    green = np.asarray(is_green, dtype=bool)
+    if green.ndim:
+        green = green[..., None]
+    m = np.where(green, free, step)
+
+    # Scan: x_i = clip(x_{i-1} - 2, p_i, p_i + m)
+    offset = 2.0 * np.arange(n)
+    lo = pos + offset
+    hi = lo + m
+    shift = 1
+    while shift < n:
+        prev_lo = lo[..., :-shift]
+        prev_hi = hi[..., :-shift]
+        cur_lo = lo[..., shift:]
+        cur_hi = hi[..., shift:]
+        new_lo = np.minimum(np.maximum(prev_lo, cur_lo), cur_hi)
+        new_hi = np.minimum(np.maximum(prev_hi, cur_lo), cur_hi)
+        lo[..., shift:] = new_lo
+        hi[..., shift:] = new_hi
+        shift *= 2
+    # Entrada do líder: alvo na linha (vermelho) ou livre (verde)
+    z0 = np.where(green, np.inf, 0.0)
+    x = np.minimum(np.maximum(z0, lo), hi) - offset
+
+    # Líder: fórmula exata do laço
+    head = pos[..., 0]
+    head_move = np.where(
+        green[..., 0] if green.ndim else green,
+        free,
+        np.maximum(0, np.minimum(0 - head, step)),
+    )
+    x[..., 0] = head + head_move
+    if not exact:
+        return x, x - pos
+    move = np.empty_like(pos)
+    move[..., 0] = head_move
+    if n == 1:
+        return x, move
+
+    # Seguidores: itera a fórmula exata com o antecessor já atualizado.
+    # Tudo antes da primeira posição que mudou já é definitivo.
+    start = 0
+    while True:
+        p = pos[..., start + 1:]
+        prev = x[..., start:-1]
+        dist_to_next = (prev - p) - 2
+        dist = (prev - 2) - p
+        red_move = np.maximum(0, np.minimum(dist, step))
+        mv = np.where(green, free, red_move)
+        mv = np.where(mv > dist_to_next, np.maximum(0, dist_to_next), mv)
+        move[..., start + 1:] = mv
+        new = p + mv
+        changed = new != x[..., start + 1:]
+        if changed.ndim > 1:
+            changed = changed.any(axis=tuple(range(changed.ndim - 1)))
+        if not changed.any():
+            break
+        x[..., start + 1:] = new
+        start += int(np.argmax(changed)) + 1
+        if start >= n - 1:
+            break
+    return x, move
+
+
+class ArrayLane:
+    """
+    Via com motor vetorizado: posições e esperas em arrays NumPy contíguos.
+
+    Mesma interface de `Lane` (`add_vehicles`, `queue_length`, `step_logic`),
+    então os controladores rodam sem mudanças, e consome o gerador `rng`
+    na mesma ordem, produzindo as mesmas métricas para uma mesma semente.
+
+    Os veículos ficam em `_pos[_head:_head + _n]`: sair da fila só avança o
+    deslocamento `_head`; quando o fim do buffer é alcançado os dados vivos
+    são compactados para o início (ou o buffer dobra de tamanho).
+    """
+    def __init__(self, name, capacity=64, rng=random):
+        self.name = name
+        self.rng = rng
+        self.passed = 0
+        self._pos = np.zeros(capacity)
+        self._wait = np.zeros(capacity)
+        self._bus = np.zeros(capacity, dtype=bool)
+        self._head = 0
+        self._n = 0
+        self.wait_max = 0.0
+        self.wait_sum = 0.0
+        self.stopped = 0
+        self.sketch = WaitSketch()
+
+    def _reserve(self, extra):
+        cap = self._pos.shape[0]
+        need = self._n + extra
+        if self._head + need <= cap:
+            return
+        if need > cap // 2:
+            cap = max(2 * cap, need)
+        live = slice(self._head, self._head + self._n)
+        for attr in ("_pos", "_wait", "_bus"):
+            old = getattr(self, attr)
+            new = np.zeros(cap, dtype=old.dtype)
+            new[:self._n] = old[live]
+            setattr(self, attr, new)
+        self._head = 0
+
+    def add_vehicles(self, n, start_id, bus_prob=0.0):
+        if n <= 0:
+            return n
+        self._reserve(n)
+        end = self._head + self._n
+        rng = self.rng
+        for i in range(n):
+            # mesma ordem de sorteios de `Lane`: ônibus, depois posição
+            self._bus[end + i] = rng.random() < bus_prob
+            self._pos[end + i] = -rng.uniform(5, 25)
+        self._wait[end:end + n] = 0.0
+        self._n += n
+        return n
+
+    def queue_length(self):
+        return self._n
+
+    def snapshot(self):
+        """Estado da via como `LaneState` (cópia só dos veículos vivos)"""
+        live = slice(self._head, self._head + self._n)
+        return LaneState(self.name, self._pos[live].copy(), self._wait[live].copy(),
+                         self._bus[live].copy(), self.passed, self.wait_max, self.wait_sum, self.stopped)
+
+    @classmethod
+    def from_snapshot(cls, state, rng=random, capacity=64):
+        n = len(state)
+        lane = cls(state.name, capacity=max(capacity, 2 * n), rng=rng)
+        lane._pos[:n] = state.pos
+        lane._wait[:n] = state.wait
+        lane._bus[:n] = state.bus
+        lane._n = n
+        lane.passed = state.passed
+        lane.wait_max, lane.wait_sum, lane.stopped = state.wait_max, state.wait_sum, state.stopped
+        return lane
+
+    def positions(self):
+        """Posições dos veículos em ordem de fila (view)"""
+        return self._pos[self._head:self._head + self._n]
+
+    def wait_times(self):
+        """Esperas acumuladas dos veículos em ordem de fila (view)"""
+        return self._wait[self._head:self._head + self._n]
+
+    def step_logic(self, is_green, dt, discharge_rate):
+        passed_now = 0
+        waited_sum = 0.0
+
+        if is_green:
+            expected = discharge_rate * dt
+            base = int(np.floor(expected))
+            extra = 1 if self.rng.random() < (expected - base) else 0
+            capacity = min(base + extra, self._n)
+
+            if capacity > 0:
+                ready = self._pos[self._head:self._head + capacity] > -2
+                # só sai o prefixo contíguo de veículos na linha de retenção
+                k = capacity if ready.all() else int(np.argmin(ready))
+                if k:
+                    saindo = self._wait[self._head:self._head + k]
+                    for w in saindo.tolist():
+                        waited_sum += w
+                    self.sketch.add_many(saindo)
+                    self._head += k
+                    self._n -= k
+                    self.passed += k
+                    passed_now = k
+
+        if self._n:
+            live = slice(self._head, self._head + self._n)
+            new_pos, move = _car_following(self._pos[live], is_green, dt)
+            self._pos[live] = new_pos
+            parado = move < 0.1
+            wait = self._wait[live]
+            wait += np.where(parado, dt, 0)
+            self.wait_max = float(wait.max())
+            self.wait_sum = float(wait.sum())
+            self.stopped = int(parado.sum())
+        else:
+            self.wait_max = self.wait_sum = 0.0
+            self.stopped = 0
+
+        return passed_now, waited_sum
+
+    def max_wait(self):
+        """Maior espera acumulada entre os veículos ainda na via (no último passo)"""
+        return self.wait_max
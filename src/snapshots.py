@@ -0,0 +1,240 @@
+"""
+Snapshots das filas em colunas.
+
+`run_simulation` registra um snapshot (tempo, fila A, fila B, fase) a cada
+`sample_rate` segundos. Em vez de um dict por snapshot, `SnapshotRecorder`
+escreve em arrays tipados pré-alocados e devolve um `Snapshots`, cujas
+colunas são arrays NumPy usados direto pelos gráficos e pelo pandas
+(`to_pandas` não copia os dados).
+
+Com um `sink` o registrador mantém só um bloco de `chunk_size` linhas e
+descarrega cada bloco cheio no disco, então a memória de uma execução não
+cresce com a duração:
+- `NpySink(diretorio)`: um `.npy` por coluna, lidos com mmap no fim;
+- `ParquetSink(arquivo)`: um row group por bloco (requer pyarrow); lido de
+  uma vez com `load` ou em lotes com `iter_batches`.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Mesmos códigos de fase de `src.batch`
+PHASES = ("A", "B", "YELLOW_A", "YELLOW_B")
+PHASE_CODES = {p: i for i, p in enumerate(PHASES)}
+DTYPES = {"t": np.float64, "qA": np.int32, "qB": np.int32, "phase": np.int8}
+COLUMNS = tuple(DTYPES)
+
+
+class Snapshots:
+    """Colunas `t`, `qA`, `qB` e `phase` (código da fase em `PHASES`) de uma execução"""
+    def __init__(self, t, qA, qB, phase):
+        self.t = t
+        self.qA = qA
+        self.qB = qB
+        self.phase = phase
+
+    @classmethod
+    def empty(cls):
+        return cls(**{c: np.empty(0, dtype) for c, dtype in DTYPES.items()})
+
+    @classmethod
+    def concat(cls, partes):
+        partes = [p for p in partes if len(p)]
+        if not partes:
+            return cls.empty()
+        if len(partes) == 1:
+            return partes[0]
+        return cls(**{c: np.concatenate([p[c] for p in partes]) for c in COLUMNS})
+
+    @classmethod
+    def from_records(cls, records):
+        """Converte a lista de dicts do formato antigo"""
+        return cls(**{
+            c: np.fromiter((PHASE_CODES[r[c]] if c == "phase" else r[c] for r in records), dtype, len(records))
+            for c, dtype in DTYPES.items()
+        })
+
+    def __len__(self):
+        return len(self.t)
+
+    def __getitem__(self, coluna):
+        if coluna not in DTYPES:
+            raise KeyError(coluna)
+        return getattr(self, coluna)
+
+    def copy(self):
+        return Snapshots(**{c: np.array(self[c]) for c in COLUMNS})
+
+    @property
+    def nbytes(self):
+        return sum(self[c].nbytes for c in COLUMNS)
+
+    def phase_names(self):
+        """Fases como texto ('A', 'YELLOW_B', ...)"""
+        return np.asarray(PHASES)[self.phase]
+
+    def to_pandas(self):
+        """DataFrame sobre as mesmas colunas; `phase` vira categoria"""
+        import pandas as pd
+        return pd.DataFrame({
+            "t": self.t,
+            "qA": self.qA,
+            "qB": self.qB,
+            "phase": pd.Categorical.from_codes(self.phase, PHASES),
+        }, copy=False)
+
+    def records(self):
+        """Lista de dicts, no formato antigo de `run_simulation`"""
+        return [{"t": t, "qA": a, "qB": b, "phase": f}
+                for t, a, b, f in zip(self.t.tolist(), self.qA.tolist(), self.qB.tolist(),
+                                      self.phase_names().tolist())]
+
+
+class SnapshotRecorder:
+    """
+    Acumula snapshots em arrays pré-alocados.
+
+    Sem `sink`, os arrays têm `capacity` linhas (dobram se faltar espaço) e
+    `finish` devolve visões deles. Com `sink`, o buffer tem `chunk_size`
+    linhas e cada bloco cheio vai para `sink.write`; `finish` devolve o que
+    `sink.close` devolver.
+    """
+    def __init__(self, capacity=1024, sink=None, chunk_size=4096):
+        self.sink = sink
+        tamanho = chunk_size if sink is not None else max(1, int(capacity))
+        self._alocar(tamanho)
+        self.n = 0  # linhas no buffer
+        self.total = 0
+        self._lido = 0
+        self._atrasados = []  # linhas descarregadas antes de `take`
+
+    def _alocar(self, tamanho, antigo=None):
+        self._cols = {c: np.empty(tamanho, dtype) for c, dtype in DTYPES.items()}
+        if antigo:
+            for c in COLUMNS:
+                self._cols[c][:self.n] = antigo[c][:self.n]
+        self._t, self._qA, self._qB, self._phase = (self._cols[c] for c in COLUMNS)
+        self._capacidade = tamanho
+
+    def _fatia(self, inicio, fim):
+        return Snapshots(**{c: self._cols[c][inicio:fim] for c in COLUMNS})
+
+    def _cheio(self):
+        if self.sink is None:
+            self._alocar(2 * self._capacidade, self._cols)
+            return
+        if self._lido < self.n:
+            self._atrasados.append(self._fatia(self._lido, self.n).copy())
+        self.sink.write(self._fatia(0, self.n))
+        self.n = 0
+        self._lido = 0
+
+    def append(self, t, qA, qB, phase):
+        if self.n == self._capacidade:
+            self._cheio()
+        i = self.n
+        self._t[i] = t
+        self._qA[i] = qA
+        self._qB[i] = qB
+        self._phase[i] = PHASE_CODES[phase]
+        self.n = i + 1
+        self.total += 1
+
+    def take(self):
+        """Cópia das linhas registradas desde a chamada anterior (para `progress`)"""
+        partes = self._atrasados + [self._fatia(self._lido, self.n).copy()]
+        self._atrasados = []
+        self._lido = self.n
+        return Snapshots.concat(partes)
+
+    def finish(self):
+        if self.sink is None:
+            return self._fatia(0, self.n)
+        if self.n:
+            self.sink.write(self._fatia(0, self.n))
+            self.n = 0
+        return self.sink.close()
+
+
+class NpySink:
+    """
+    Um `.npy` por coluna em `path` (um diretório).
+
+    Os blocos são anexados em arquivos brutos; `close` escreve o cabeçalho
+    `.npy` com o total de linhas e devolve as colunas abertas com mmap.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._brutos = {c: open(os.path.join(path, f"{c}.part"), "wb") for c in COLUMNS}
+        self.rows = 0
+
+    def write(self, snaps):
+        for c in COLUMNS:
+            np.ascontiguousarray(snaps[c], DTYPES[c]).tofile(self._brutos[c])
+        self.rows += len(snaps)
+
+    def close(self):
+        for c, bruto in self._brutos.items():
+            bruto.close()
+            parte = bruto.name
+            with open(os.path.join(self.path, f"{c}.npy"), "wb") as f, open(parte, "rb") as origem:
+                np.lib.format.write_array_header_1_0(f, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(DTYPES[c])),
+                    "fortran_order": False,
+                    "shape": (self.rows,),
+                })
+                shutil.copyfileobj(origem, f)
+            os.remove(parte)
+        return self.load(self.path)
+
+    @staticmethod
+    def load(path, mmap=True):
+        modo = "r" if mmap else None
+        return Snapshots(**{c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode=modo) for c in COLUMNS})
+
+
+class ParquetSink:
+    """Arquivo Parquet em `path`, um row group por bloco; `phase` guarda o código"""
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self.path = path
+        schema = pa.schema([(c, pa.from_numpy_dtype(dtype)) for c, dtype in DTYPES.items()],
+                           metadata={"phases": json.dumps(PHASES)})
+        self._writer = pq.ParquetWriter(path, schema)
+        self.rows = 0
+
+    def write(self, snaps):
+        tabela = self._pa.table({c: snaps[c] for c in COLUMNS}, schema=self._writer.schema)
+        self._writer.write_table(tabela)
+        self.rows += len(snaps)
+
+    def close(self):
+        self._writer.close()
+        return self.load(self.path)
+
+    @staticmethod
+    def load(path):
+        """O arquivo inteiro num `Snapshots` (os row groups são concatenados em memória)"""
+        import pyarrow.parquet as pq
+        tabela = pq.read_table(path, memory_map=True)
+        return Snapshots(**{c: tabela.column(c).to_numpy() for c in COLUMNS})
+
+    @staticmethod
+    def iter_batches(path, batch_size=65536):
+        """Um `Snapshots` por lote de até `batch_size` linhas, sem ler o arquivo inteiro"""
+        import pyarrow.parquet as pq
+        arquivo = pq.ParquetFile(path, memory_map=True)
+        for lote in arquivo.iter_batches(batch_size=batch_size, columns=list(COLUMNS)):
+            yield Snapshots(**{c: lote.column(c).to_numpy() for c in COLUMNS})
+
+
+def open_sink(path):
+    """`ParquetSink` para `*.parquet`; `NpySink` (diretório) para o resto"""
+    if path.endswith(".parquet"):
+        return ParquetSink(path)
+    return NpySink(path)
@@ -0,0 +1,318 @@
+"""
+Varredura de parâmetros de `run_simulation` em paralelo.
+
+Cada job é uma combinação (conjunto de parâmetros, repetição, controlador).
+A semente de um job depende só de `(base_seed, param_id, repeticao)`, então
+os resultados são os mesmos com qualquer número de workers, e os dois
+controladores de uma mesma repetição rodam com a mesma semente (comparação
+pareada). Os resultados são gravados em blocos numa tabela CSV ou Parquet
+à medida que chegam, o que permite retomar uma varredura interrompida.
+
+Uso:
+    python -m src.sweep --grid g_min=10,16,24 --grid g_max=60,90 --seeds 20 --out sweep.csv
+    python -m src.sweep --sample 500 --range ciclo=30:120 --range taxa_escoamento=0.3:1.5 --out sweep.parquet
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .controllers import ActuatedController, QLearningController
+from .events import run_event_simulation
+from .simulation import ArrayLane, Lane
+from .utils import DEFAULT_PARAMS, converter_valor, run_simulation
+
+CONTROLLERS = {
+    'actuated': ActuatedController,
+    'qlearning': QLearningController,
+}
+ENGINES = {
+    'object': Lane,
+    'array': ArrayLane,
+    'event': None,  # motor de eventos (`src.events`), sem classe de via
+}
+KEY = ("param_id", "rep", "controller")
+
+
+def hash_parametros(params):
+    """Impressão digital dos parâmetros escalares de um conjunto (os gravados em cada linha)"""
+    escalares = {k: v for k, v in params.items() if np.isscalar(v)}
+    texto = json.dumps(escalares, sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()[:16]
+
+
+def grade_parametros(grid, base=None):
+    """Produto cartesiano de `grid` ({param: [valores]}) sobre `base`"""
+    base = dict(DEFAULT_PARAMS if base is None else base)
+    nomes = list(grid)
+    return [dict(base, **dict(zip(nomes, valores))) for valores in itertools.product(*grid.values())]
+
+
+def amostra_parametros(ranges, n, seed=0, base=None):
+    """Amostra aleatória de `n` conjuntos de parâmetros
+
+    `ranges` mapeia cada parâmetro para uma lista de valores (sorteio
+    uniforme entre eles) ou uma tupla `(min, max)`; inteiros em ambos os
+    extremos geram inteiros.
+    """
+    base = dict(DEFAULT_PARAMS if base is None else base)
+    rng = np.random.default_rng(seed)
+    amostras = []
+    for _ in range(n):
+        p = dict(base)
+        for nome, faixa in ranges.items():
+            if isinstance(faixa, tuple):
+                lo, hi = faixa
+                if isinstance(lo, int) and isinstance(hi, int):
+                    p[nome] = int(rng.integers(lo, hi + 1))
+                else:
+                    p[nome] = float(rng.uniform(lo, hi))
+            else:
+                p[nome] = faixa[rng.integers(len(faixa))]
+        amostras.append(p)
+    return amostras
+
+
+def derivar_semente(base_seed, param_id, rep):
+    """Semente determinística de um job, independente da ordem de execução"""
+    ss = np.random.SeedSequence([base_seed, param_id, rep])
+    return int(ss.generate_state(1)[0])
+
+
+def _jobs(param_sets, controllers, n_seeds, base_seed, feitos):
+    for param_id, params in enumerate(param_sets):
+        for rep in range(n_seeds):
+            seed = derivar_semente(base_seed, param_id, rep)
+            for nome in controllers:
+                if (param_id, rep, nome) not in feitos:
+                    yield (param_id, rep, nome, seed, params)
+
+
+def _run_chunk(chunk, engine):
+    """Executa um bloco de jobs num worker e devolve as linhas da tabela"""
+    lane_cls = ENGINES[engine]
+    linhas = []
+    for param_id, rep, nome, seed, params in chunk:
+        inicio = time.perf_counter()
+        if engine == "event":
+            r = run_event_simulation(CONTROLLERS[nome], params, seed, record_snapshots=False)
+        else:
+            r = run_simulation(CONTROLLERS[nome], params, seed, lane_cls=lane_cls)
+        linha = {"param_id": param_id, "param_hash": hash_parametros(params), "rep": rep,
+                 "controller": nome, "seed": seed}
+        linha.update({k: v for k, v in params.items() if np.isscalar(v)})
+        linha.update({
+            "total_passed": r["total_passed"],
+            "avg_wait": r["avg_wait"],
+            "max_wait": r["max_wait"],
+            "p50_wait": r["p50_wait"],
+            "p95_wait": r["p95_wait"],
+            "p99_wait": r["p99_wait"],
+            "n_green": len(r["green_log"]),
+            "elapsed_sec": time.perf_counter() - inicio,
+        })
+        linhas.append(linha)
+    return linhas
+
+
+class _Saida:
+    """Tabela de resultados gravada em blocos (CSV com append ou Parquet particionado)"""
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith(".parquet")
+        self._parte = 0
+        self._colunas = None
+        if self.parquet:
+            os.makedirs(path, exist_ok=True)
+            self._parte = len([f for f in os.listdir(path) if f.endswith(".parquet")])
+
+    def colunas(self):
+        """Colunas já gravadas em `path` (None se ainda não há nada)"""
+        if self._colunas is None:
+            if self.parquet:
+                partes = sorted(f for f in os.listdir(self.path) if f.endswith(".parquet"))
+                if partes:
+                    import pyarrow.parquet as pq
+                    self._colunas = pq.read_schema(os.path.join(self.path, partes[0])).names
+            elif os.path.exists(self.path):
+                import pandas as pd
+                self._colunas = list(pd.read_csv(self.path, nrows=0).columns)
+        return self._colunas
+
+    def ler(self):
+        import pandas as pd
+        if self.parquet:
+            if not os.path.isdir(self.path) or not os.listdir(self.path):
+                return None
+            return pd.read_parquet(self.path)
+        if not os.path.exists(self.path):
+            return None
+        return pd.read_csv(self.path, dtype={"param_hash": str})
+
+    def gravar(self, linhas):
+        import pandas as pd
+        df = pd.DataFrame(linhas)
+        colunas = self.colunas()
+        if colunas is None:
+            self._colunas = list(df.columns)
+        elif set(colunas) != set(df.columns):
+            # o append posicional do CSV deslocaria os valores entre colunas
+            raise ValueError(f"{self.path} tem as colunas {sorted(colunas)}, mas as linhas novas têm "
+                             f"{sorted(df.columns)}; grave em outro arquivo ou use --no-resume")
+        else:
+            df = df[colunas]
+        if self.parquet:
+            df.to_parquet(os.path.join(self.path, f"part-{self._parte:05d}.parquet"), index=False)
+            self._parte += 1
+        else:
+            novo = not os.path.exists(self.path)
+            df.to_csv(self.path, mode="a", header=novo, index=False)
+
+
+def _conferir_varredura(anterior, param_sets, out):
+    """Falha se as linhas de `out` não vieram destes `param_sets`"""
+    if "param_hash" not in anterior.columns:
+        raise ValueError(f"{out} não tem a coluna param_hash (gravado por uma versão anterior): "
+                         "não dá para conferir se é a mesma varredura; use --no-resume")
+    hashes = [hash_parametros(p) for p in param_sets]
+    gravados = anterior[["param_id", "param_hash"]].drop_duplicates()
+    for param_id, h in zip(gravados["param_id"].tolist(), gravados["param_hash"].tolist()):
+        if param_id >= len(hashes) or hashes[param_id] != h:
+            raise ValueError(f"{out} é de outra varredura (param_id {param_id} com outros parâmetros); "
+                             "grave em outro arquivo ou use --no-resume")
+
+
+def run_sweep(param_sets, out, controllers=("actuated", "qlearning"), n_seeds=10,
+              base_seed=42, workers=None, chunksize=16, engine="object",
+              resume=True, flush_every=256, progress=True):
+    """Executa todos os jobs da varredura e grava os resultados em `out`
+
+    Com `resume=True`, jobs já presentes em `out` (mesmo `param_id`,
+    `rep` e controlador) são pulados. Cada linha guarda o `param_hash` do
+    seu conjunto de parâmetros; se os de `out` não batem com `param_sets`
+    (outra varredura), nada é gravado e sobe `ValueError`. Devolve o número
+    de jobs executados.
+    """
+    saida = _Saida(out)
+    feitos = set()
+    if resume:
+        anterior = saida.ler()
+        if anterior is not None:
+            _conferir_varredura(anterior, param_sets, out)
+            feitos = set(zip(*(anterior[k] for k in KEY)))
+    elif saida.parquet:
+        for f in os.listdir(out):
+            if f.startswith("part-"):
+                os.remove(os.path.join(out, f))
+        saida._parte = 0
+    elif os.path.exists(out):
+        os.remove(out)
+
+    pendentes = list(_jobs(param_sets, controllers, n_seeds, base_seed, feitos))
+    total = len(pendentes)
+    chunks = [pendentes[i:i + chunksize] for i in range(0, total, chunksize)]
+    workers = workers or os.cpu_count()
+
+    buffer = []
+    concluidos = 0
+    inicio = time.perf_counter()
+    ultimo_relatorio = inicio
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            fila = iter(chunks)
+            # mantém poucos blocos em voo para não materializar todos os futures
+            em_voo = {pool.submit(_run_chunk, c, engine) for c in itertools.islice(fila, 2 * workers)}
+            while em_voo:
+                prontos, em_voo = wait(em_voo, return_when=FIRST_COMPLETED)
+                for fut in prontos:
+                    linhas = fut.result()
+                    buffer.extend(linhas)
+                    concluidos += len(linhas)
+                    proximo = next(fila, None)
+                    if proximo is not None:
+                        em_voo.add(pool.submit(_run_chunk, proximo, engine))
+                if len(buffer) >= flush_every:
+                    saida.gravar(buffer)
+                    buffer = []
+                agora = time.perf_counter()
+                if progress and (agora - ultimo_relatorio >= 2 or not em_voo):
+                    ultimo_relatorio = agora
+                    taxa = concluidos / max(agora - inicio, 1e-9)
+                    eta = (total - concluidos) / taxa if taxa else float("inf")
+                    print(f"[sweep] {concluidos}/{total} execuções | {taxa:.1f} exec/s | ETA {eta:.0f}s",
+                          file=sys.stderr)
+    finally:
+        # grava o que já terminou mesmo se a varredura for interrompida
+        if buffer:
+            saida.gravar(buffer)
+    return total
+
+
+def _parse_grid(itens):
+    grid = {}
+    for item in itens:
+        nome, valores = item.split("=", 1)
+        grid[nome] = [converter_valor(v) for v in valores.split(",")]
+    return grid
+
+
+def _parse_ranges(itens):
+    ranges = {}
+    for item in itens:
+        nome, faixa = item.split("=", 1)
+        if ":" in faixa:
+            lo, hi = faixa.split(":")
+            ranges[nome] = (converter_valor(lo), converter_valor(hi))
+        else:
+            ranges[nome] = [converter_valor(v) for v in faixa.split(",")]
+    return ranges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.sweep", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--grid", action="append", default=[], metavar="PARAM=V1,V2,...")
+    parser.add_argument("--sample", type=int, help="número de conjuntos sorteados (usa --range)")
+    parser.add_argument("--range", action="append", default=[], metavar="PARAM=MIN:MAX|V1,V2")
+    parser.add_argument("--set", action="append", default=[], metavar="PARAM=VALOR",
+                        help="sobrescreve um parâmetro base")
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--base-seed", type=int, default=42)
+    parser.add_argument("--controllers", nargs="+", default=list(CONTROLLERS), choices=list(CONTROLLERS))
+    parser.add_argument("--model", help="modelo Q-Learning (padrão: o mesmo do app, `find_model()`)")
+    parser.add_argument("--engine", default="object", choices=list(ENGINES))
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--out", required=True, help="arquivo .csv ou diretório .parquet")
+    parser.add_argument("--no-resume", action="store_true")
+    args = parser.parse_args(argv)
+
+    base = dict(DEFAULT_PARAMS)
+    base.update({k: v for k, v in (item.split("=", 1) for item in args.set)})
+    base = {k: converter_valor(v) if isinstance(v, str) else v for k, v in base.items()}
+    if "qlearning" in args.controllers:
+        from .models import find_model
+        model = args.model or find_model()
+        if not model or not os.path.exists(model):
+            # sem modelo o Q-Learning rodaria com a Q-table vazia
+            parser.error(f"modelo Q-Learning não encontrado ({model or 'nenhum em models/'}); "
+                         "passe --model ou tire qlearning de --controllers")
+        base["pretrained_path"] = os.path.abspath(model)
+
+    if args.sample:
+        param_sets = amostra_parametros(_parse_ranges(args.range), args.sample, seed=args.base_seed, base=base)
+    else:
+        param_sets = grade_parametros(_parse_grid(args.grid), base=base)
+
+    run_sweep(param_sets, args.out, controllers=args.controllers, n_seeds=args.seeds,
+              base_seed=args.base_seed, workers=args.workers, chunksize=args.chunksize,
+              engine=args.engine, resume=not args.no_resume)
+
+
+if __name__ == "__main__":
+    main()
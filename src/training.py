@@ -0,0 +1,506 @@
+"""
+Treinamento do QLearningController sem notebook.
+
+Reaproveita `src.simulation.Lane` e `src.controllers.QLearningController`
+e segue o notebook `02-simulacao-trafego-qlearning.ipynb`: mesma mistura
+ponderada de `TRAINING_SCENARIOS`, episódios de 10 minutos, taxa de
+escoamento 0.5, prioridade 0.1 e recompensa
+`-(espera dos que passaram) - 0.1 * (fila A + fila B)`, para que os modelos
+novos sejam comparáveis a `qlearning_agent_default`.
+
+Com `replay=ReplayBuffer(...)` (`--replay`) as transições de cada episódio
+vão para um buffer de replay e a Q-table é atualizada por minilotes
+sorteados dele (`src.replay`), em vez de uma atualização por tick.
+`--eval-every N --target-wait W` avalia a política gulosa em cenários fixos a
+cada N episódios e para quando a espera avaliada chega a W, medindo quantos
+episódios cada forma de treino precisa.
+
+Uso:
+    python -m src.training --episodes 20000 --checkpoint-every 2000
+    python -m src.training --replay --eval-every 100 --target-wait default
+"""
+import argparse
+import math
+import multiprocessing as mp
+import os
+import queue
+import random
+import time
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .controllers import STATE_SPACES, QLearningController
+from .arrivals import PoissonArrivals
+from .models import MODELS_DIR, default_meta, find_model, save_q_model
+from .replay import ReplayBuffer, replay_step
+from .rng import SimRNG
+from .simulation import ArrayLane, Lane
+from .qstore import DenseQ
+from .utils import DEFAULT_PARAMS, detectar_pedestre, detectar_prioridade
+
+N_EPISODES = 20000
+EPISODE_DURATION = 600  # 10 minutos
+TAXA_ESCOAMENTO = 0.5
+PROB_PRIORIDADE = 0.1
+EVAL_EPISODES = 16
+EVAL_SEED = 10**6
+ESPERA_ATORES = 1.0  # segundos entre verificações dos atores no aprendiz
+
+TRAINING_SCENARIOS = [
+    {"media_A": 3, "media_B": 2, "weight": 0.1},
+    {"media_A": 6, "media_B": 5, "weight": 0.15},
+    {"media_A": 8, "media_B": 6, "weight": 0.25},
+    {"media_A": 10, "media_B": 8, "weight": 0.15},
+    {"media_A": 12, "media_B": 4, "weight": 0.1},
+    {"media_A": 4, "media_B": 12, "weight": 0.1},
+    {"media_A": 15, "media_B": 12, "weight": 0.1},
+    {"media_A": 20, "media_B": 5, "weight": 0.05},
+]
+
+
+def epsilon_schedule(kind="exp", start=1.0, end=0.01, decay=0.995, n_episodes=N_EPISODES):
+    """Devolve `f(episodio) -> epsilon`
+
+    - `exp`: `start * decay**ep` limitado por baixo em `end` (o do notebook);
+    - `linear`: de `start` a `end` ao longo de `n_episodes`;
+    - `const`: sempre `start`.
+    """
+    if kind == "exp":
+        return lambda ep: max(end, start * decay ** ep)
+    if kind == "linear":
+        return lambda ep: max(end, start + (end - start) * ep / max(1, n_episodes - 1))
+    if kind == "const":
+        return lambda ep: start
+    raise ValueError(f"schedule desconhecido: {kind}")
+
+
+def sample_scenarios(n, rng):
+    """Sorteia `n` cenários de `TRAINING_SCENARIOS` respeitando os pesos"""
+    weights = [s["weight"] for s in TRAINING_SCENARIOS]
+    return rng.choices(TRAINING_SCENARIOS, weights=weights, k=n)
+
+
+def _rotulo(scenario):
+    """Rótulo do cenário no histórico: `"mediaA+mediaB"`"""
+    return f"{scenario['media_A']}+{scenario['media_B']}"
+
+
+def run_episode(agent, media_a, media_b, seed, duration=EPISODE_DURATION, lane_cls=Lane, training=True,
+                replay=None):
+    """Roda um episódio atualizando a Q-table do agente
+
+    Com `replay`, as transições vão para o buffer (de uma vez, no fim do
+    episódio) em vez de atualizar a Q-table tick a tick. O fim do episódio é
+    só um corte de tempo, então nenhuma transição é marcada como terminal.
+    Os sorteios vêm de `SimRNG(seed)`, nos mesmos streams nomeados de
+    `run_simulation` (a exploração usa o de "sensor").
+    Devolve `(recompensa total, espera média, veículos atendidos)`.
+    """
+    rng = SimRNG(seed)
+    chegadas = PoissonArrivals(media_a, media_b).bind(rng.stream("arrivals")).counts
+    sorteio_detectores = rng.stream("detectors")
+
+    laneA = lane_cls('A', rng=rng.stream("lane_A"))
+    laneB = lane_cls('B', rng=rng.stream("lane_B"))
+    agent.reset(laneA, laneB, rng=rng.stream("sensor"))
+
+    # referências locais: o laço roda 600 vezes por episódio
+    step = agent.step
+    discretize = agent.discretize_state
+    update_q = agent.update_q
+    add_A, add_B = laneA.add_vehicles, laneB.add_vehicles
+    move_A, move_B = laneA.step_logic, laneB.step_logic
+    len_A, len_B = laneA.queue_length, laneB.queue_length
+    # detectores só são sorteados se o estado do agente os usa (ver `StateSpace`)
+    detectores = {"v2i", "ped"} & set(agent.state_space.features)
+    prob_ped = DEFAULT_PARAMS["prob_pedestre"]
+    prob_v2i = DEFAULT_PARAMS["prob_prioridade"]
+    sinais = {}
+
+    guardar = training and replay is not None
+    if guardar:
+        state_index = agent.state_space.index
+        estados, acoes, recompensas, proximos = [], [], [], []
+        guardar_s, guardar_a, guardar_r, guardar_p = (estados.append, acoes.append,
+                                                      recompensas.append, proximos.append)
+
+    vehicle_id = 0
+    episode_reward = 0.0
+    total_wait = 0.0
+    total_passed = 0
+    for t in range(duration):
+        chegA, chegB = chegadas(t, 1)
+        add_A(chegA, vehicle_id, bus_prob=PROB_PRIORIDADE)
+        vehicle_id += chegA
+        add_B(chegB, vehicle_id, bus_prob=PROB_PRIORIDADE)
+        vehicle_id += chegB
+
+        if detectores:
+            sinais = {"ped_A": detectar_pedestre(prob_ped, sorteio_detectores),
+                      "ped_B": detectar_pedestre(prob_ped, sorteio_detectores),
+                      "v2i_A": detectar_prioridade(prob_v2i, sorteio_detectores),
+                      "v2i_B": detectar_prioridade(prob_v2i, sorteio_detectores)}
+        phase = step(1, training=training, **sinais)
+        state = agent.last_state
+
+        pA, wA = move_A(phase == 'A', 1, TAXA_ESCOAMENTO)
+        pB, wB = move_B(phase == 'B', 1, TAXA_ESCOAMENTO)
+
+        reward = -(wA + wB) - (len_A() + len_B()) * 0.1
+        episode_reward += reward
+        if training and state is not None:
+            if guardar:
+                guardar_s(state_index(state))
+                guardar_a(agent.last_action)
+                guardar_r(reward)
+                guardar_p(state_index(discretize()))
+            else:
+                update_q(state, agent.last_action, reward, discretize())
+
+        total_passed += pA + pB
+        total_wait += wA + wB
+
+    if guardar and estados:
+        replay.add_many(estados, acoes, recompensas, proximos)
+    return episode_reward, total_wait / max(1, total_passed), total_passed
+
+
+def save_checkpoint(agent, path, info):
+    """Grava a Q-table do agente com metadados de procedência"""
+    meta = default_meta(agent.state_space)
+    meta["hyperparams"] = {
+        "alpha": agent.alpha, "gamma": agent.gamma, "epsilon": agent.epsilon,
+        "g_min": agent.g_min, "g_max": agent.g_max, "yellow_time": agent.yellow_time,
+    }
+    meta["provenance"].update(info)
+    save_q_model(path, agent.q, meta)
+    return path
+
+
+def evaluate(agent, n_episodes=EVAL_EPISODES, seed=EVAL_SEED, lane_cls=Lane):
+    """Espera média da política gulosa do agente em `n_episodes` cenários fixos
+
+    Os cenários e sementes dependem só de `seed`, então avaliações do mesmo
+    agente (ou de agentes diferentes) são comparáveis.
+    """
+    scenarios = sample_scenarios(n_episodes, random.Random(seed))
+    esperas = [run_episode(agent, s["media_A"], s["media_B"], seed=seed + i,
+                           lane_cls=lane_cls, training=False)[1]
+               for i, s in enumerate(scenarios)]
+    return float(np.mean(esperas))
+
+
+def default_target_wait(lane_cls=Lane):
+    """Espera de `evaluate` do modelo padrão de `models/` (a qualidade a alcançar)"""
+    path = find_model()
+    if path is None:
+        raise FileNotFoundError("nenhum modelo em models/ para definir a espera alvo")
+    return evaluate(QLearningController(None, None, {"pretrained_path": path}), lane_cls=lane_cls)
+
+
+def train(n_episodes=N_EPISODES, seed=0, schedule=None, agent=None, lane_cls=Lane,
+          checkpoint_every=0, checkpoint_dir=MODELS_DIR, log_every=1000, verbose=True,
+          replay=None, replay_batch=64, replay_ratio=4, eval_every=0, target_wait=None, eval_window=3):
+    """Treina o agente e devolve `(agente, histórico)`
+
+    O histórico tem as listas `rewards`, `avg_wait`, `scenarios` e
+    `episodes_per_sec` (medido a cada `log_every` episódios).
+
+    Com `replay` (um `ReplayBuffer`), cada episódio é seguido de minilotes de
+    `replay_batch` transições, o bastante para que cada transição nova seja
+    revista `replay_ratio` vezes em média. Com `eval_every`, o histórico
+    ganha `eval` (`(episódio, espera)` de `evaluate`) e, com `target_wait`,
+    o treino para quando a média das últimas `eval_window` avaliações chega
+    ao alvo (`history["episodes_to_target"]`, None se não chegou); a janela
+    evita contar uma avaliação boa isolada enquanto a política ainda oscila.
+    """
+    schedule = schedule or epsilon_schedule()
+    agent = agent or QLearningController(None, None, {})
+    rng = random.Random(seed)
+    scenarios = sample_scenarios(n_episodes, rng)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    history = {"rewards": [], "avg_wait": [], "scenarios": [], "episodes_per_sec": []}
+    if eval_every:
+        history["eval"] = []
+        history["episodes_to_target"] = None
+    inicio = bloco = time.perf_counter()
+    for episode, scenario in enumerate(scenarios):
+        agent.epsilon = schedule(episode)
+        novas = replay.added if replay is not None else 0
+        reward, avg_wait, _ = run_episode(agent, scenario["media_A"], scenario["media_B"],
+                                          seed=seed + episode, lane_cls=lane_cls, replay=replay)
+        if replay is not None:
+            for _ in range(math.ceil(replay_ratio * (replay.added - novas) / replay_batch)):
+                replay_step(agent, replay, replay_batch)
+        history["rewards"].append(reward)
+        history["avg_wait"].append(avg_wait)
+        history["scenarios"].append(_rotulo(scenario))
+
+        done = episode + 1
+        if log_every and done % log_every == 0:
+            agora = time.perf_counter()
+            eps_rate = log_every / (agora - bloco)
+            bloco = agora
+            history["episodes_per_sec"].append(eps_rate)
+            if verbose:
+                print(f"Ep {done}/{n_episodes} | ε={agent.epsilon:.3f} | "
+                      f"Espera(média 500): {np.mean(history['avg_wait'][-500:]):.2f}s | "
+                      f"Recompensa(média 500): {np.mean(history['rewards'][-500:]):.1f} | "
+                      f"{eps_rate:.1f} ep/s")
+        if checkpoint_every and done % checkpoint_every == 0:
+            path = os.path.join(checkpoint_dir, f"qlearning_agent_{stamp}_ep{done}.npz")
+            save_checkpoint(agent, path, {"trainer": "src.training", "episodes": done, "seed": seed})
+        if eval_every and done % eval_every == 0:
+            espera = evaluate(agent, lane_cls=lane_cls)
+            history["eval"].append((done, espera))
+            if verbose:
+                print(f"Avaliação ep {done}: espera {espera:.2f}s")
+            janela = [w for _, w in history["eval"][-eval_window:]]
+            if target_wait is not None and len(janela) == eval_window and np.mean(janela) <= target_wait:
+                history["episodes_to_target"] = done
+                n_episodes = done
+                break
+
+    if verbose:
+        total = time.perf_counter() - inicio
+        print(f"Treinamento concluído: {n_episodes} episódios em {total:.1f}s ({n_episodes / total:.1f} ep/s)")
+    return agent, history
+
+
+def worker_epsilon(base, worker_id, n_workers):
+    """Epsilon próprio de cada ator: o worker 0 segue o schedule, os demais são mais gulosos"""
+    return base ** (1 + worker_id / max(1, n_workers - 1))
+
+
+def _actor(worker_id, n_workers, n_episodes, seed, schedule_args, lane_engine,
+           hyperparams, shm_name, lock, results):
+    """Processo ator: roda seus episódios e envia deltas da Q-table ao aprendiz"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        agent = QLearningController(None, None, hyperparams)
+        shared = np.ndarray(agent.q_table.shape, dtype=np.float64, buffer=shm.buf)
+        schedule = epsilon_schedule(*schedule_args)
+        lane_cls = ArrayLane if lane_engine == "array" else Lane
+        # todos os atores sorteiam a mesma lista; cada um pega episódios intercalados
+        scenarios = sample_scenarios(n_episodes, random.Random(seed))
+        for episode in range(worker_id, n_episodes, n_workers):
+            with lock:
+                base = shared.copy()
+            agent.q_table = base.copy()
+            agent.epsilon = worker_epsilon(schedule(episode), worker_id, n_workers)
+            scenario = scenarios[episode]
+            reward, avg_wait, _ = run_episode(agent, scenario["media_A"], scenario["media_B"],
+                                              seed=seed + episode, lane_cls=lane_cls)
+            results.put((episode, reward, avg_wait, agent.q_table - base))
+        results.put(None)
+    except BaseException as e:
+        # o aprendiz relança o erro em vez de contar o ator como concluído
+        results.put(e)
+    finally:
+        shared = None  # libera a view antes de fechar o segmento
+        shm.close()
+
+
+def _conferir_atores(actors):
+    """Falha se um ator morreu sem avisar (sinal, falta de memória); diz se todos já saíram"""
+    for w, p in enumerate(actors):
+        if p.exitcode not in (None, 0):
+            raise RuntimeError(f"ator {w} terminou com código {p.exitcode}")
+    return all(p.exitcode is not None for p in actors)
+
+
+def train_parallel(n_episodes=N_EPISODES, seed=0, n_workers=None, schedule_args=("exp",),
+                   hyperparams=None, lane_engine="object", broadcast_every=None,
+                   checkpoint_every=0, checkpoint_dir=MODELS_DIR, log_every=1000, verbose=True):
+    """Treinamento ator-aprendiz em vários processos
+
+    Cada ator copia a Q-table compartilhada no início de um episódio,
+    treina localmente e devolve o delta da tabela. O aprendiz soma os deltas
+    na tabela mestre e a republica na memória compartilhada a cada
+    `broadcast_every` episódios (padrão: número de atores). Os episódios,
+    cenários e sementes são os mesmos de `train`; só a ordem de fusão
+    depende do escalonamento. Devolve `(agente, histórico)` como `train`.
+
+    Um erro num ator é relançado aqui; um ator que morre sem avisar (sinal,
+    falta de memória) ou episódios faltando viram `RuntimeError`.
+    """
+    n_workers = n_workers or os.cpu_count()
+    broadcast_every = broadcast_every or n_workers
+    hyperparams = dict(hyperparams or {})
+    agent = QLearningController(None, None, hyperparams)
+    if not isinstance(agent.q, DenseQ):
+        raise ValueError("o treinamento paralelo compartilha a Q-table densa; use --q-storage dense ou --workers 1")
+    master = np.zeros(agent.q_table.shape)
+    # a mesma lista dos atores, para rotular cada episódio recebido
+    scenarios = sample_scenarios(n_episodes, random.Random(seed))
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    ctx = mp.get_context()
+    shm = SharedMemory(create=True, size=master.nbytes)
+    shared = np.ndarray(master.shape, dtype=master.dtype, buffer=shm.buf)
+    shared[:] = master
+    lock = ctx.Lock()
+    results = ctx.Queue()
+    actors = [
+        ctx.Process(target=_actor, args=(w, n_workers, n_episodes, seed, tuple(schedule_args),
+                                         lane_engine, hyperparams, shm.name, lock, results))
+        for w in range(n_workers)
+    ]
+    history = {"rewards": [], "avg_wait": [], "scenarios": [], "episode": [], "episodes_per_sec": []}
+    inicio = bloco = time.perf_counter()
+    try:
+        for p in actors:
+            p.start()
+        ativos = n_workers
+        ociosos = 0
+        while ativos:
+            try:
+                msg = results.get(timeout=ESPERA_ATORES)
+            except queue.Empty:
+                # quem sai já deixou as mensagens no pipe: duas esperas vazias
+                # depois de todos saírem significam que alguma se perdeu
+                ociosos = ociosos + 1 if _conferir_atores(actors) else 0
+                if ociosos > 1:
+                    raise RuntimeError("os atores terminaram sem concluir os episódios")
+                continue
+            ociosos = 0
+            if msg is None:
+                ativos -= 1
+                continue
+            if isinstance(msg, BaseException):
+                raise msg
+            episode, reward, avg_wait, delta = msg
+            master += delta
+            history["episode"].append(episode)
+            history["rewards"].append(reward)
+            history["avg_wait"].append(avg_wait)
+            history["scenarios"].append(_rotulo(scenarios[episode]))
+
+            done = len(history["rewards"])
+            if done % broadcast_every == 0:
+                with lock:
+                    shared[:] = master
+            if log_every and done % log_every == 0:
+                agora = time.perf_counter()
+                eps_rate = log_every / (agora - bloco)
+                bloco = agora
+                history["episodes_per_sec"].append(eps_rate)
+                if verbose:
+                    print(f"Ep {done}/{n_episodes} | {n_workers} atores | "
+                          f"Espera(média 500): {np.mean(history['avg_wait'][-500:]):.2f}s | "
+                          f"Recompensa(média 500): {np.mean(history['rewards'][-500:]):.1f} | "
+                          f"{eps_rate:.1f} ep/s")
+            if checkpoint_every and done % checkpoint_every == 0:
+                agent.q_table = master.copy()
+                path = os.path.join(checkpoint_dir, f"qlearning_agent_{stamp}_ep{done}.npz")
+                save_checkpoint(agent, path, {"trainer": "src.training/parallel", "episodes": done,
+                                              "seed": seed, "workers": n_workers})
+        for p in actors:
+            p.join()
+    finally:
+        for p in actors:
+            if p.is_alive():
+                p.terminate()
+        shared = None
+        shm.close()
+        shm.unlink()
+    if len(history["rewards"]) != n_episodes:
+        raise RuntimeError(f"treinamento paralelo incompleto: {len(history['rewards'])} de {n_episodes} episódios")
+
+    agent.q_table = master
+    if verbose:
+        total = time.perf_counter() - inicio
+        print(f"Treinamento concluído: {n_episodes} episódios em {total:.1f}s "
+              f"({n_episodes / total:.1f} ep/s com {n_workers} atores)")
+    return agent, history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.training", description="Treina o QLearningController")
+    parser.add_argument("--episodes", type=int, default=N_EPISODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--schedule", default="exp", choices=("exp", "linear", "const"))
+    parser.add_argument("--epsilon-start", type=float, default=1.0)
+    parser.add_argument("--epsilon-end", type=float, default=0.01)
+    parser.add_argument("--epsilon-decay", type=float, default=0.995)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--gamma", type=float, default=0.95)
+    parser.add_argument("--engine", default="object", choices=("object", "array"))
+    parser.add_argument("--state-space", default="default", choices=list(STATE_SPACES),
+                        help="bins e features do estado (ver `StateSpace`)")
+    parser.add_argument("--q-storage", default="auto", choices=("auto", "dense", "hash"),
+                        help="Q-table densa ou em hash (auto: densa se couber)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="número de processos atores (>1 usa o treinamento ator-aprendiz)")
+    parser.add_argument("--replay", action="store_true",
+                        help="atualiza a Q-table por minilotes de um buffer de replay")
+    parser.add_argument("--replay-capacity", type=int, default=100_000)
+    parser.add_argument("--replay-batch", type=int, default=64)
+    parser.add_argument("--replay-ratio", type=float, default=4,
+                        help="vezes que cada transição é revista, em média")
+    parser.add_argument("--prioritized", action="store_true", help="replay priorizado pelo erro TD")
+    parser.add_argument("--eval-every", type=int, default=0,
+                        help="avalia a política gulosa em cenários fixos a cada N episódios")
+    parser.add_argument("--target-wait",
+                        help="para quando a espera avaliada chega a este valor ('default': a do modelo padrão)")
+    parser.add_argument("--eval-window", type=int, default=3,
+                        help="avaliações consecutivas cuja média é comparada ao alvo")
+    parser.add_argument("--checkpoint-every", type=int, default=0)
+    parser.add_argument("--log-every", type=int, default=1000)
+    parser.add_argument("--out", help="caminho do modelo final (.npz); padrão models/qlearning_agent_<data>.npz")
+    args = parser.parse_args(argv)
+
+    schedule_args = (args.schedule, args.epsilon_start, args.epsilon_end, args.epsilon_decay, args.episodes)
+    hyperparams = {"alpha": args.alpha, "gamma": args.gamma,
+                   "state_space": args.state_space, "q_storage": args.q_storage}
+    if args.workers > 1 and (args.replay or args.eval_every):
+        parser.error("--replay e --eval-every usam o treinamento de um processo (--workers 1)")
+    lane_cls = ArrayLane if args.engine == "array" else Lane
+    target_wait = None
+    if args.target_wait == "default":
+        target_wait = default_target_wait(lane_cls)
+        print(f"Espera alvo (modelo padrão): {target_wait:.2f}s")
+    elif args.target_wait is not None:
+        target_wait = float(args.target_wait)
+
+    if args.workers > 1:
+        agent, history = train_parallel(args.episodes, seed=args.seed, n_workers=args.workers,
+                                        schedule_args=schedule_args, hyperparams=hyperparams,
+                                        lane_engine=args.engine, checkpoint_every=args.checkpoint_every,
+                                        log_every=args.log_every)
+    else:
+        agent = QLearningController(None, None, hyperparams)
+        replay = None
+        if args.replay:
+            replay = ReplayBuffer(args.replay_capacity, prioritized=args.prioritized, seed=args.seed)
+        agent, history = train(args.episodes, seed=args.seed, schedule=epsilon_schedule(*schedule_args),
+                               agent=agent, lane_cls=lane_cls,
+                               checkpoint_every=args.checkpoint_every, log_every=args.log_every,
+                               replay=replay, replay_batch=args.replay_batch, replay_ratio=args.replay_ratio,
+                               eval_every=args.eval_every, target_wait=target_wait,
+                               eval_window=args.eval_window)
+        if args.eval_every and target_wait is not None:
+            alcancou = history["episodes_to_target"]
+            print(f"Episódios até a espera alvo: {alcancou if alcancou is not None else 'não alcançou'}")
+
+    out = args.out or os.path.join(MODELS_DIR, f"qlearning_agent_{datetime.now():%Y%m%d_%H%M%S}.npz")
+    save_checkpoint(agent, out, {
+        "trainer": "src.training",
+        "episodes": len(history["rewards"]),
+        "episodes_to_target": history.get("episodes_to_target"),
+        "seed": args.seed,
+        "schedule": args.schedule,
+        "workers": args.workers,
+        "state_space": args.state_space,
+        "replay": args.replay,
+        "prioritized": args.prioritized,
+        "final_avg_wait_last_1000": float(np.mean(history["avg_wait"][-1000:])),
+    })
+    print(f"Modelo salvo em {out}")
+
+
+if __name__ == "__main__":
+    main()
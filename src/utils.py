@@ -1,46 +1,184 @@
 import numpy as np
+import math
 import random
+import time
 
-def ruido_sensor(valor_real, erro_max=0.15):
+# Parâmetros padrão da simulação (mesmos valores iniciais dos sliders do app)
+DEFAULT_PARAMS = {
+    'duracao_sec': 600,
+    'media_a': 20,
+    'media_b': 10,
+    'prob_pedestre': 0.3,
+    'prob_prioridade': 0.05,
+    'dt': 1,
+    'sample_rate': 1,
+    'g_min': 16,
+    'g_max': 90,
+    'ciclo': 60,
+    'yellow_time': 3,
+    'taxa_escoamento': 0.6,
+}
+
+def converter_valor(texto):
+    """Converte um valor passado na linha de comando para int, float ou str"""
+    for conv in (int, float):
+        try:
+            return conv(texto)
+        except ValueError:
+            pass
+    return texto
+
+def ruido_sensor(valor_real, erro_max=0.15, rng=random):
     """Simula erro de leitura do sensor"""
     if valor_real <= 0: return 0
-    fator = 1 + random.uniform(-erro_max, erro_max)
+    fator = 1 + rng.uniform(-erro_max, erro_max)
     return max(0, int(valor_real * fator))
 
-def gerar_fluxo_carros(taxa_media_minuto, tempo_decorrido_sec):
-    """Gera chegadas baseado em Poisson"""
+def detectar_prioridade(probabilidade, rng=random):
+    """Sorteia a detecção de um veículo prioritário (V2I) no tick"""
+    return rng.random() < probabilidade
+
+def detectar_pedestre(probabilidade, rng=random):
+    """Sorteia a detecção de um pedestre no tick"""
+    return rng.random() < probabilidade
+
+def gerar_fluxo_carros(taxa_media_minuto, tempo_decorrido_sec, size=None, rng=None):
+    """Gera chegadas baseado em Poisson
+
+    Com `size` devolve um vetor de sorteios (um por réplica/via); `rng`
+    aceita um `numpy.random.Generator` no lugar do gerador global.
+    """
     lambda_poisson = (taxa_media_minuto / 60) * tempo_decorrido_sec
-    return np.random.poisson(lambda_poisson)
+    return (rng or np.random).poisson(lambda_poisson, size)
+
+PERCENTIS = (50, 95, 99)
+
+def resumo_esperas(lanes, max_wait_por_via):
+    """Percentis de espera dos veículos que passaram, no total e por via
+
+    Lê os sketches que as vias alimentam na descarga, sem percorrer filas.
+    """
+    total = lanes[0].sketch
+    for lane in lanes[1:]:
+        total = total.merge(lane.sketch)
+    resumo = {f"p{p}_wait": total.quantile(p / 100) for p in PERCENTIS}
+    resumo["lanes"] = {}
+    for lane in lanes:
+        sk = lane.sketch
+        por_via = {
+            "passed": lane.passed,
+            "avg_wait": sk.mean(),
+            "max_wait": max_wait_por_via[lane.name],
+        }
+        por_via.update({f"p{p}_wait": sk.quantile(p / 100) for p in PERCENTIS})
+        resumo["lanes"][lane.name] = por_via
+    return resumo
+
+def run_simulation(controller_cls, params, seed=42, lane_cls=None, detectors=False,
+                   progress=None, progress_every=60, instrument=None, snapshot_sink=None,
+                   arrivals=None, rng=None):
+    """Executa uma simulação completa
+
+    `lane_cls` escolhe o motor das vias (`Lane` por padrão, ou `ArrayLane`
+    para o motor vetorizado, indicado para filas longas).
+
+    Os sorteios vêm de `rng` (`src.rng.SimRNG`, padrão `SimRNG(seed)`), um
+    substream por parte da simulação; os geradores globais `random` e
+    `np.random` não são usados nem alterados.
 
-def run_simulation(controller_cls, params, seed=42):
-    """Executa uma simulação completa"""
+    Com `detectors=True` cada tick também sorteia pedestres e veículos
+    prioritários (V2I), repassados ao controlador, como faz o app; eles têm
+    substream próprio, então as chegadas e as vias não mudam.
+
+    Os snapshots das filas voltam em `result["snapshots"]` como
+    `src.snapshots.Snapshots` (colunas `t`, `qA`, `qB`, `phase`). Com
+    `snapshot_sink` (`NpySink`, `ParquetSink`) eles são gravados em blocos e
+    a memória não cresce com a duração.
+
+    `progress(novos_snapshots, t)` é chamado a cada `progress_every`
+    segundos simulados com os snapshots gerados desde a chamada anterior.
+
+    `arrivals` é a fonte das chegadas (`src.arrivals`): perfil horário de
+    demanda ou replay de um log gravado. O padrão é Poisson com as taxas
+    constantes `media_a`/`media_b`.
+
+    `instrument` recebe uma `src.profiling.Instrumentation`, que registra o
+    tempo de cada etapa do tick e contadores de veículos.
+    """
+    from .rng import SimRNG
     from .simulation import Lane
-    
-    random.seed(seed)
-    np.random.seed(seed)
+    from .snapshots import SnapshotRecorder
+
+    rng = rng or SimRNG(seed)
+    if arrivals is None:
+        from .arrivals import PoissonArrivals
+        arrivals = PoissonArrivals(params['media_a'], params['media_b'])
+    arrivals.bind(rng.stream("arrivals"))
+    chegadas = arrivals.counts
+    sorteio_detectores = rng.stream("detectors")
 
-    laneA = Lane("A")
-    laneB = Lane("B")
-    controller = controller_cls(laneA, laneB, params)
+    inst = instrument
+    perf = time.perf_counter
+
+    lane_cls = lane_cls or Lane
+    laneA = lane_cls("A", rng=rng.stream("lane_A"))
+    laneB = lane_cls("B", rng=rng.stream("lane_B"))
+    controller = controller_cls(laneA, laneB, params, rng=rng.stream("sensor"))
 
     t = 0
     vehicle_id = 0
-    snapshots = []
+    sample_rate = params.get('sample_rate', 1)
+    capacidade = math.ceil(params['duracao_sec'] / max(params['dt'], sample_rate)) + 1
+    snapshots = SnapshotRecorder(capacidade, sink=snapshot_sink)
     total_passed = 0
     total_wait_passed = 0.0
-    max_wait_seen = 0.0
+    max_wait_seen = {laneA.name: 0.0, laneB.name: 0.0}
+    priority_events = 0
+    proximo_progresso = progress_every
+    if inst:
+        inst.start()
 
     while t < params['duracao_sec']:
+        if inst:
+            t0 = perf()
         # Gera chegadas
-        chegA = gerar_fluxo_carros(params['media_a'], params['dt'])
-        chegB = gerar_fluxo_carros(params['media_b'], params['dt'])
+        chegA, chegB = chegadas(t, params['dt'])
         laneA.add_vehicles(chegA, vehicle_id, bus_prob=params.get('prob_prioridade', 0.0))
         vehicle_id += chegA
         laneB.add_vehicles(chegB, vehicle_id, bus_prob=params.get('prob_prioridade', 0.0))
         vehicle_id += chegB
+        if inst:
+            t1 = perf()
+            inst.record("arrivals", t1 - t0)
+            inst.count("vehicles_added", chegA + chegB)
+            t0 = t1
 
         # Controlador decide
-        current_phase = controller.step(params['dt'])
+        if detectors:
+            ped_A = detectar_pedestre(params['prob_pedestre'] * params['dt'], sorteio_detectores)
+            ped_B = detectar_pedestre(params['prob_pedestre'] * params['dt'], sorteio_detectores)
+            v2i_A = detectar_prioridade(params['prob_prioridade'] * params['dt'], sorteio_detectores)
+            v2i_B = detectar_prioridade(params['prob_prioridade'] * params['dt'], sorteio_detectores)
+            if v2i_A or v2i_B:
+                priority_events += 1
+            if inst:
+                t1 = perf()
+                inst.record("detectors", t1 - t0)
+                t0 = t1
+            current_phase = controller.step(
+                params['dt'],
+                ped_A=ped_A,
+                ped_B=ped_B,
+                v2i_A=v2i_A,
+                v2i_B=v2i_B,
+                training=False,
+            )
+        else:
+            current_phase = controller.step(params['dt'])
+        if inst:
+            t1 = perf()
+            inst.record("controller", t1 - t0)
+            t0 = t1
 
         # Processa movimento
         green_A = (current_phase == 'A')
@@ -49,26 +187,54 @@ def run_simulation(controller_cls, params, seed=42):
         pA, wA = laneA.step_logic(green_A, params['dt'], params['taxa_escoamento'])
         pB, wB = laneB.step_logic(green_B, params['dt'], params['taxa_escoamento'])
 
+        if inst:
+            t1 = perf()
+            inst.record("lanes", t1 - t0)
+            inst.count("vehicles_passed", pA + pB)
+            inst.count("vehicles_moved", laneA.queue_length() + laneB.queue_length())
+            t0 = t1
+
         total_passed += pA + pB
         total_wait_passed += wA + wB
         
-        wait_times = [v.wait_time for v in laneA.vehicles] + [v.wait_time for v in laneB.vehicles]
-        if wait_times:
-            max_wait_seen = max(max_wait_seen, max(wait_times))
-
-        if t % params.get('sample_rate', 1) == 0:
-            snapshots.append({
-                "t": t,
-                "qA": laneA.queue_length(),
-                "qB": laneB.queue_length(),
-                "phase": current_phase,
-            })
+        max_wait_seen[laneA.name] = max(max_wait_seen[laneA.name], laneA.max_wait())
+        max_wait_seen[laneB.name] = max(max_wait_seen[laneB.name], laneB.max_wait())
+        if inst:
+            t1 = perf()
+            inst.record("wait_stats", t1 - t0)
+            t0 = t1
+
+        if t % sample_rate == 0:
+            snapshots.append(t, laneA.queue_length(), laneB.queue_length(), current_phase)
+            if inst:
+                inst.count("snapshots")
         t += params['dt']
+        if inst:
+            t1 = perf()
+            inst.record("snapshots", t1 - t0)
+            inst.count("ticks")
+            t0 = t1
+
+        if progress and t >= proximo_progresso:
+            progress(snapshots.take(), t)
+            proximo_progresso += progress_every
+            if inst:
+                inst.record("progress", perf() - t0)
+
+    if inst:
+        inst.stop()
+    if progress:
+        novos = snapshots.take()
+        if len(novos):
+            progress(novos, t)
 
-    return {
+    result = {
         "total_passed": total_passed,
         "avg_wait": total_wait_passed / max(1, total_passed),
-        "max_wait": max_wait_seen,
-        "snapshots": snapshots,
+        "max_wait": max(max_wait_seen.values()),
+        "priority_events": priority_events,
+        "snapshots": snapshots.finish(),
         "green_log": controller.green_times_log,
     }
+    result.update(resumo_esperas([laneA, laneB], max_wait_seen))
+    return result
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import src.controllers
+from src.controllers import ActuatedController, QLearningController
+from src.events import EventSimulation, run_event_simulation
+from src.models import find_model
+from src.utils import DEFAULT_PARAMS, run_simulation
+
+PARAMS = {**DEFAULT_PARAMS, 'pretrained_path': find_model()}
+CONTROLADORES = [ActuatedController, QLearningController]
+
+
+@pytest.mark.parametrize("controller_cls", CONTROLADORES)
+def test_close_to_tick_engine(controller_cls):
+    ticks = [run_simulation(controller_cls, PARAMS, seed=s) for s in range(8)]
+    eventos = [run_event_simulation(controller_cls, PARAMS, seed=s, record_snapshots=False) for s in range(8)]
+
+    def media(rs, k):
+        return np.mean([r[k] for r in rs])
+
+    # a espera parada na fila em movimento de `Lane` fica de fora (ver `EventLane`)
+    assert media(eventos, "avg_wait") == pytest.approx(media(ticks, "avg_wait"), rel=0.25)
+    assert media(eventos, "max_wait") == pytest.approx(media(ticks, "max_wait"), rel=0.1)
+    assert media(eventos, "total_passed") == pytest.approx(media(ticks, "total_passed"), rel=0.03)
+
+
+@pytest.mark.parametrize("dt", [1.0, 0.5])
+@pytest.mark.parametrize("controller_cls", CONTROLADORES)
+def test_skipping_matches_every_tick(controller_cls, dt, monkeypatch):
+    # pular ticks muda quantas leituras ruidosas o atuado faz: sensor sem ruído
+    monkeypatch.setattr(src.controllers, "ruido_sensor", lambda v, erro_max=0.15, rng=None: max(0, int(v)))
+    params = {**PARAMS, 'dt': dt}
+    for seed in range(4):
+        pulando = EventSimulation(controller_cls, params, seed)
+        tick_a_tick = EventSimulation(controller_cls, params, seed)
+        tick_a_tick.horizonte = tick_a_tick.pular = None
+        r, esperado = pulando.run(), tick_a_tick.run()
+        assert r["n_decisions"] < esperado["n_decisions"]
+        for k in ("total_passed", "avg_wait", "max_wait", "green_log"):
+            assert r[k] == esperado[k]
@@ -0,0 +1,18 @@
+import pytest
+
+from src.controllers import ActuatedController
+from src.simulation import ArrayLane, Lane
+from src.utils import DEFAULT_PARAMS, run_simulation
+
+CHAVES = ("total_passed", "avg_wait", "max_wait")
+
+
+@pytest.mark.parametrize("media_a, media_b", [(3, 2), (10, 8), (20, 15), (40, 30)])
+@pytest.mark.parametrize("seed", [0, 42, 1234])
+@pytest.mark.parametrize("dt", [1.0, 0.5, 0.25])
+def test_array_lane_matches_lane(media_a, media_b, seed, dt):
+    params = {**DEFAULT_PARAMS, 'media_a': media_a, 'media_b': media_b, 'dt': dt, 'duracao_sec': 900}
+    r_obj = run_simulation(ActuatedController, params, seed=seed, lane_cls=Lane)
+    r_arr = run_simulation(ActuatedController, params, seed=seed, lane_cls=ArrayLane)
+    assert {k: r_arr[k] for k in CHAVES} == {k: r_obj[k] for k in CHAVES}
+    assert r_arr["snapshots"].records() == r_obj["snapshots"].records()
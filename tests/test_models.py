@@ -0,0 +1,90 @@
+import datetime
+import io
+import os
+import pickle
+import sys
+
+import numpy as np
+import pytest
+
+from src.controllers import N_ACTIONS, STATE_SPACES
+from src.models import (_LegacyUnpickler, convert_pickle, default_meta, load_legacy_pickle, load_q_model,
+                        save_q_model)
+
+SHAPE = STATE_SPACES["default"].shape + (N_ACTIONS,)
+
+
+@pytest.fixture
+def q():
+    return np.random.default_rng(0).normal(size=SHAPE)
+
+
+def test_npz_round_trip(tmp_path, q):
+    path = str(tmp_path / "modelo.npz")
+    meta = default_meta(hyperparams={"alpha": 0.1})
+    save_q_model(path, q, meta)
+    lido, meta_lido = load_q_model(path)
+    assert np.array_equal(lido, q)
+    assert lido.dtype == np.float64
+    assert meta_lido == meta
+
+
+def test_npz_mmap(tmp_path, q):
+    path = str(tmp_path / "modelo.npz")
+    save_q_model(path, q)
+    lido, _ = load_q_model(path, mmap=True)
+    assert isinstance(lido, np.memmap)
+    assert not lido.flags.writeable
+    assert np.array_equal(lido, q)
+
+
+def test_save_rejects_wrong_shape(tmp_path):
+    with pytest.raises(ValueError):
+        save_q_model(str(tmp_path / "modelo.npz"), np.zeros((2, 2, N_ACTIONS)))
+
+
+class QLearningController:
+    """Imita o agente do notebook, gravado como `__main__.QLearningController`"""
+    def __init__(self, q_table):
+        self.q_table = q_table
+        self.alpha = 0.1
+        self.gamma = 0.95
+
+
+@pytest.fixture
+def legado(tmp_path, q, monkeypatch):
+    """`.pkl` no formato antigo: o agente inteiro com a Q-table num dict"""
+    monkeypatch.setattr(QLearningController, "__module__", "__main__")
+    monkeypatch.setattr(sys.modules["__main__"], "QLearningController", QLearningController, raising=False)
+    estados = [idx for idx in np.ndindex(SHAPE[:-1]) if sum(idx) % 7 == 0]
+    agente = QLearningController({estado: q[estado].copy() for estado in estados})
+    path = str(tmp_path / "qlearning_agent_antigo.pkl")
+    with open(path, "wb") as f:
+        pickle.dump(agente, f)
+    esperado = np.zeros(SHAPE)
+    for estado in estados:
+        esperado[estado] = q[estado]
+    return path, esperado, len(estados)
+
+
+def test_convert_pickle(legado):
+    path, esperado, n_estados = legado
+    out = convert_pickle(path)
+    assert out == os.path.splitext(path)[0] + ".npz"
+    convertido, meta = load_q_model(out)
+    assert np.array_equal(convertido, esperado)
+    assert np.array_equal(load_legacy_pickle(path)[0], esperado)
+    assert meta["hyperparams"] == {"alpha": 0.1, "gamma": 0.95}
+    assert meta["provenance"]["converted_from"] == "pickle"
+    assert meta["provenance"]["states_visited"] == n_estados
+
+
+class _Malicioso:
+    def __reduce__(self):
+        return (os.getcwd, ())
+
+
+@pytest.mark.parametrize("obj", [_Malicioso(), {"q": datetime.date(2025, 1, 1)}, [print]])
+def test_legacy_unpickler_rejects_other_globals(obj):
+    with pytest.raises(pickle.UnpicklingError, match="não permitido"):
+        _LegacyUnpickler(io.BytesIO(pickle.dumps(obj))).load()
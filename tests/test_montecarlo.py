@@ -0,0 +1,29 @@
+import pytest
+
+from src.controllers import ActuatedController, QLearningController
+from src.models import find_model
+from src.montecarlo import MonteCarlo
+from src.utils import DEFAULT_PARAMS
+
+PARAMS = {**DEFAULT_PARAMS, 'duracao_sec': 300}
+CONTROLADORES = {
+    "actuated": (ActuatedController, PARAMS),
+    "qlearning": (QLearningController, {**PARAMS, 'pretrained_path': find_model(), 'epsilon': 0.0}),
+}
+
+
+def test_stop_point_independent_of_workers():
+    resultados = []
+    for workers in (1, 2, 3):
+        mc = MonteCarlo(CONTROLADORES, seeds=40, ci_target=2.0, min_seeds=5, workers=workers)
+        resultados.append((mc.run(), mc.history))
+    resumo, history = resultados[0]
+    assert resumo["stopped_early"] and resumo["n"] < 40
+    for outro, outro_history in resultados[1:]:
+        assert outro == resumo
+        assert outro_history == history
+
+
+def test_rejects_no_seeds():
+    with pytest.raises(ValueError, match="seeds"):
+        MonteCarlo(CONTROLADORES, seeds=0)
@@ -0,0 +1,31 @@
+import pytest
+
+from src.network import corridor, grid, run_network, run_network_parallel
+
+# chaves que só o resultado particionado tem
+EXTRAS = ("n_regions", "sync_ticks")
+
+REDES = {
+    "grid6x6": grid(6, 6, demand_interior=2, params={'duracao_sec': 600}),
+    "corridor_dt05": corridor(8, params={'dt': 0.5, 'duracao_sec': 600}),
+}
+
+
+@pytest.fixture(scope="module", params=sorted(REDES))
+def rede(request):
+    cfg = REDES[request.param]
+    return cfg, run_network(cfg, seed=3)
+
+
+@pytest.mark.parametrize("workers", [2, 3, 4])
+def test_parallel_matches_serial(rede, workers):
+    cfg, serial = rede
+    paralelo = run_network_parallel(cfg, seed=3, workers=workers)
+    assert paralelo["n_regions"] == workers
+    assert {k: v for k, v in paralelo.items() if k not in EXTRAS} == serial
+
+
+def test_vehicles_conserved(rede):
+    _, r = rede
+    assert r["vehicles_in"] > 0
+    assert r["vehicles_in"] == r["vehicles_out"] + r["in_network"]
@@ -0,0 +1,72 @@
+import pytest
+
+from src.arrivals import PoissonArrivals
+from src.controllers import ActuatedController
+from src.rng import SimRNG, Stream
+from src.rollout import IntersectionState
+from src.simulation import ArrayLane, Lane
+from src.utils import DEFAULT_PARAMS, detectar_pedestre, detectar_prioridade
+
+
+def _ligar(rng, params):
+    chegadas = PoissonArrivals(params['media_a'], params['media_b']).bind(rng.stream("arrivals"))
+    return chegadas, rng.stream("detectors")
+
+
+def _ticks(n, t, vehicle_id, laneA, laneB, c, chegadas, detectores, params):
+    """O corpo do laço de `run_simulation` (com detectores); devolve o traço"""
+    dt = params['dt']
+    traco = []
+    for _ in range(n):
+        chegA, chegB = chegadas.counts(t, dt)
+        laneA.add_vehicles(chegA, vehicle_id, bus_prob=params['prob_prioridade'])
+        vehicle_id += chegA
+        laneB.add_vehicles(chegB, vehicle_id, bus_prob=params['prob_prioridade'])
+        vehicle_id += chegB
+        sinais = {"ped_A": detectar_pedestre(params['prob_pedestre'] * dt, detectores),
+                  "ped_B": detectar_pedestre(params['prob_pedestre'] * dt, detectores),
+                  "v2i_A": detectar_prioridade(params['prob_prioridade'] * dt, detectores),
+                  "v2i_B": detectar_prioridade(params['prob_prioridade'] * dt, detectores)}
+        fase = c.step(dt, training=False, **sinais)
+        pA, wA = laneA.step_logic(fase == 'A', dt, params['taxa_escoamento'])
+        pB, wB = laneB.step_logic(fase == 'B', dt, params['taxa_escoamento'])
+        traco.append((fase, laneA.queue_length(), laneB.queue_length(), pA, pB, wA, wB, laneA.max_wait()))
+        t += dt
+    return traco, t, vehicle_id
+
+
+@pytest.mark.parametrize("lane_cls", [Lane, ArrayLane])
+@pytest.mark.parametrize("dt", [1.0, 0.5])
+def test_restore_resumes_run_tick_for_tick(lane_cls, dt):
+    params = {**DEFAULT_PARAMS, 'dt': dt, 'media_a': 14, 'media_b': 9}
+    rng = SimRNG(7, block=64)  # blocos curtos: a captura cai no meio e na troca de bloco
+    chegadas, detectores = _ligar(rng, params)
+    laneA = lane_cls("A", rng=rng.stream("lane_A"))
+    laneB = lane_cls("B", rng=rng.stream("lane_B"))
+    c = ActuatedController(laneA, laneB, params, rng=rng.stream("sensor"))
+    _, t, vehicle_id = _ticks(150, 0, 0, laneA, laneB, c, chegadas, detectores, params)
+
+    state = IntersectionState.capture(laneA, laneB, c, t, vehicle_id, rng=rng)
+    esperado, _, _ = _ticks(300, t, vehicle_id, laneA, laneB, c, chegadas, detectores, params)
+
+    for _ in range(2):  # o snapshot não é consumido pela restauração
+        novo = SimRNG(block=64)
+        novo.setstate(state.rng_state)
+        rA, rB, rc = state.restore(rng=novo, lane_cls=lane_cls)
+        ch, det = _ligar(novo, params)
+        obtido, _, _ = _ticks(300, state.t, state.vehicle_id, rA, rB, rc, ch, det, params)
+        assert obtido == esperado
+
+
+def test_stream_state_round_trip():
+    s = Stream(3, block=16)
+    extra = s.sampler("exponential", 2.0)
+    for _ in range(21):
+        s.random(), s.poisson(1.5), extra()
+    estado = s.getstate()
+    esperado = [(s.random(), s.uniform(1, 2), s.poisson(1.5), extra()) for _ in range(40)]
+
+    for r in (Stream(block=16), s):  # num stream novo e no próprio (rebobinando)
+        r.setstate(estado)
+        extra = r.sampler("exponential", 2.0)
+        assert [(r.random(), r.uniform(1, 2), r.poisson(1.5), extra()) for _ in range(40)] == esperado
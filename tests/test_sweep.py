@@ -0,0 +1,38 @@
+import pytest
+
+from src.models import find_model
+from src.sweep import KEY, _Saida, grade_parametros, run_sweep
+from src.utils import DEFAULT_PARAMS
+
+BASE = {**DEFAULT_PARAMS, 'duracao_sec': 300, 'pretrained_path': find_model()}
+PARAM_SETS = grade_parametros({'g_min': [10, 16], 'media_a': [8, 20]}, base=BASE)
+N_JOBS = len(PARAM_SETS) * 3 * 2
+
+
+def _linhas(path):
+    df = _Saida(path).ler().drop(columns="elapsed_sec")
+    return df.sort_values(list(KEY)).reset_index(drop=True)
+
+
+@pytest.fixture(scope="module", params=["csv", "parquet"])
+def serial(request, tmp_path_factory):
+    out = str(tmp_path_factory.mktemp("sweep") / f"serial.{request.param}")
+    assert run_sweep(PARAM_SETS, out, n_seeds=3, workers=1, chunksize=2, progress=False) == N_JOBS
+    return out, _linhas(out)
+
+
+def test_workers_do_not_change_rows(serial, tmp_path):
+    path, esperado = serial
+    out = str(tmp_path / f"paralelo.{path.rsplit('.', 1)[1]}")
+    run_sweep(PARAM_SETS, out, n_seeds=3, workers=2, chunksize=2, progress=False)
+    assert _linhas(out).equals(esperado)
+
+
+def test_resume_runs_only_missing_jobs(serial, tmp_path):
+    path, esperado = serial
+    out = str(tmp_path / f"retomada.{path.rsplit('.', 1)[1]}")
+    # uma varredura interrompida: só parte das linhas chegou ao disco
+    _Saida(out).gravar(_Saida(path).ler().iloc[:7].to_dict("records"))
+    assert run_sweep(PARAM_SETS, out, n_seeds=3, workers=2, chunksize=2, progress=False) == N_JOBS - 7
+    assert _linhas(out).equals(esperado)
+    assert run_sweep(PARAM_SETS, out, n_seeds=3, workers=2, progress=False) == 0
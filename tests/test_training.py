@@ -0,0 +1,15 @@
+import pytest
+
+from src.training import train, train_parallel
+
+
+def test_parallel_trains_every_episode():
+    _, h = train(12, seed=3, verbose=False, log_every=0)
+    _, hp = train_parallel(12, seed=3, n_workers=2, verbose=False, log_every=0)
+    assert sorted(hp["episode"]) == list(range(12))
+    assert hp["scenarios"] == [h["scenarios"][e] for e in hp["episode"]]
+
+
+def test_parallel_reraises_actor_errors():
+    with pytest.raises(ValueError, match="schedule desconhecido"):
+        train_parallel(4, n_workers=2, schedule_args=("nenhum",), verbose=False)